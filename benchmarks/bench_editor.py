@@ -0,0 +1,291 @@
+"""
+Offscreen benchmarks of editor latency and render throughput.
+
+Runs StyleBuilderMainWidget without a display and writes the results as
+json, so that runs on different commits can be compared:
+
+    python benchmarks/bench_editor.py -o before.json
+    python benchmarks/bench_editor.py -o after.json --compare before.json
+
+All latencies are in seconds. The preview cache is disabled and every
+edited param is one the sample preview reads, so that edits are actually
+rendered rather than skipped as not affecting the preview (see
+rc_tracing); renders skipped anyway are counted separately.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import subprocess
+
+import matplotlib as mpl
+from matplotlib.backends.qt_compat import QtWidgets
+
+from mpl_style_builder.main import StyleBuilderMainWidget
+from mpl_style_builder.samples import default_sample_plot
+from mpl_style_builder.style_index import StyleIndex
+from mpl_style_builder.stylefile import convert_value
+from mpl_style_builder.param_model import format_value
+
+# Param edited per widget type, and the values cycled through
+EDITS = [
+    ('SliderParam', 'lines.linewidth', [0.5, 1.0, 2.5, 4.0]),
+    ('ComboboxParam', 'axes.grid', [True, False]),
+    ('TextParam', 'axes.formatter.limits', [[-5, 6], [-7, 7]]),
+    ('ColorParam', 'axes.facecolor', ['#eeeeee', '#ffffff', '#ddeeff']),
+]
+FILTER_QUERIES = ['l', 'li', 'lin', 'line', 'lines', 'lines.', 'lines.w',
+                  'lines.wi', 'x', 'xt', 'xti', 'xtick', 'xtick ma',
+                  'xtick maj', 'xtick major']
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    count = len(samples)
+    return {
+        'n': count,
+        'min': samples[0],
+        'median': samples[count // 2],
+        'mean': sum(samples) / count,
+        'p95': samples[min(count - 1, int(round(count * 0.95)))],
+        'max': samples[-1],
+    }
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def make_widget():
+    widget = StyleBuilderMainWidget(default_sample_plot, min_frame_interval=0,
+                                    preview_cache_bytes=0)
+    widget.build_tree()
+    return widget
+
+
+def settle(app, widget):
+    """Process events and finish any pending render"""
+    app.processEvents()
+    widget.render_scheduler.flush()
+    app.processEvents()
+
+
+def bench_first_preview(app):
+    started = time.time()
+    widget = make_widget()
+    settle(app, widget)
+    return widget, time.time() - started
+
+
+def bench_edits(app, widget, n_edits):
+    results = {}
+    for widget_type, param, values in EDITS:
+        editor = widget.construct_widget(param, widget.params[param])
+        editor.sig_param_updated.connect(widget.value_updated)
+        latencies = []
+        skipped_before = widget.skipped_render_count
+        for idx in range(n_edits):
+            editor.blockSignals(True)
+            editor.set_value(values[idx % len(values)])
+            editor.blockSignals(False)
+            started = time.time()
+            editor.emit_update()
+            settle(app, widget)
+            latencies.append(time.time() - started)
+        skipped = widget.skipped_render_count - skipped_before
+        editor.deleteLater()
+        widget.reset_param(param)
+        settle(app, widget)
+        results[widget_type] = dict(summarize(latencies), param=param,
+                                    skipped=skipped)
+    return results
+
+
+def bench_slider_drag(app, widget, steps=100):
+    """A burst of slider steps, as while dragging, then one settle"""
+    param = 'lines.linewidth'
+    editor = widget.construct_widget(param, widget.params[param])
+    editor.sig_param_updated.connect(widget.value_updated)
+    rendered_before = widget.render_scheduler.rendered_count
+    skipped_before = widget.skipped_render_count
+    started = time.time()
+    for step in range(steps):
+        editor.set_value(0.5 + step / 100)
+    settle(app, widget)
+    elapsed = time.time() - started
+    skipped = widget.skipped_render_count - skipped_before
+    editor.deleteLater()
+    widget.reset_param(param)
+    settle(app, widget)
+    return {
+        'steps': steps,
+        'seconds': elapsed,
+        # The scheduler counts the renders it requested, skipped or not
+        'renders': widget.render_scheduler.rendered_count - rendered_before -
+        skipped,
+        'skipped': skipped,
+    }
+
+
+def write_large_style(directory, params):
+    """A style setting every param that survives validation to its default"""
+    lines = []
+    for param in sorted(params):
+        if param not in mpl.rcParamsDefault:
+            continue
+        text = format_value(mpl.rcParamsDefault[param])
+        if not text or '\n' in text or '#' in text:
+            continue
+        try:
+            convert_value(param, text)
+        except ValueError:
+            continue
+        lines.append('{}: {}'.format(param, text))
+    with open(os.path.join(directory, 'bench_large.mplstyle'), 'w') as fh:
+        fh.write('\n'.join(lines))
+    return len(lines)
+
+
+def bench_load_style(app, widget, repeat):
+    tmpdir = tempfile.mkdtemp(prefix='mpl_style_bench_')
+    try:
+        n_params = write_large_style(tmpdir, widget.params)
+        widget.style_index = StyleIndex(
+            dirs=[tmpdir], index_path=os.path.join(tmpdir, 'index.json')
+        )
+        widget.style_index.refresh()
+        latencies = []
+        for _ in range(repeat):
+            started = time.time()
+            widget.load_mplstyle('bench_large')
+            settle(app, widget)
+            latencies.append(time.time() - started)
+            widget.reset_all()
+            settle(app, widget)
+    finally:
+        shutil.rmtree(tmpdir)
+    return dict(summarize(latencies), params=n_params)
+
+
+def bench_filter(app, widget, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for query in FILTER_QUERIES:
+            started = time.time()
+            widget.filtration_changed(query)
+            app.processEvents()
+            latencies.append(time.time() - started)
+    widget.filtration_changed('')
+    return dict(summarize(latencies), params=len(widget.params))
+
+
+def bench_memory(app, widget, n_edits):
+    """
+    RSS over many edits that each rebuild the preview figure; the growth
+    per edit should be about zero once warmed up.
+    """
+    tracker = widget.memory_tracker
+    tracker.samples.clear()
+    param = 'axes.grid'  # not restylable in place
+    for idx in range(n_edits):
+        widget.value_updated(param, bool(idx % 2))
+        settle(app, widget)
+    widget.reset_param(param)
+    settle(app, widget)
+    report = tracker.report()
+    # Skip the warm-up, where caches fill up
+    report['growth_per_edit'] = tracker.growth_per_count(
+        last=len(tracker.samples) // 2
+    )
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(n_edits, repeat, memory_edits=2000):
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    widget, first_preview = bench_first_preview(app)
+    results = {
+        'time_to_first_preview': first_preview,
+        'edit_latency': bench_edits(app, widget, n_edits),
+        'slider_drag': bench_slider_drag(app, widget),
+        'load_mplstyle': bench_load_style(app, widget, repeat),
+        'filtration_changed': bench_filter(app, widget, repeat),
+        'memory': bench_memory(app, widget, memory_edits),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'edits': n_edits * len(EDITS),
+    }
+    widget.close()
+    return {
+        'meta': {
+            'timestamp': time.time(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'matplotlib': mpl.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def flatten(results, prefix=''):
+    for key, value in sorted(results.items()):
+        if isinstance(value, dict):
+            for item in flatten(value, prefix + key + '.'):
+                yield item
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix + key, value
+
+
+def compare(baseline, current, file=sys.stdout):
+    before = dict(flatten(baseline['results']))
+    for key, value in flatten(current['results']):
+        if key in before and before[key]:
+            print('{:45s} {:12.4g} {:12.4g} {:7.2f}x'.format(
+                key, before[key], value, value / before[key]), file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--edits', type=int, default=20,
+                        help='edits per widget type')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-m', '--memory-edits', type=int, default=2000,
+                        help='edits of the memory benchmark')
+    parser.add_argument('-o', '--output', help='json file, default stdout')
+    parser.add_argument('--compare', metavar='BASELINE_JSON',
+                        help='print ratios against an earlier run')
+    args = parser.parse_args(argv)
+    report = run(args.edits, args.repeat, args.memory_edits)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=1, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print()
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(json.load(fh), report, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
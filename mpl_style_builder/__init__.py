@@ -1 +1,9 @@
-from mpl_style_builder.main import MplStyleBuilder
\ No newline at end of file
+def __getattr__(name):
+    # Imported lazily, so that the Qt-free modules of this package can be
+    # used without importing Qt
+    if name == 'MplStyleBuilder':
+        from mpl_style_builder.main import MplStyleBuilder
+        return MplStyleBuilder
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name)
+    )
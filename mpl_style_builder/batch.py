@@ -0,0 +1,227 @@
+"""
+Headless batch rendering of every style against every sample plot, e.g. to
+build a style gallery:
+
+    mpl-style-gallery mystyle.mplstyle ggplot -c default -c mymod:myplot \\
+        -f png -f svg -o gallery
+
+Outputs are named after a hash of everything that affects them (the
+style's params, the callback and its source, format, dpi and matplotlib
+version), so pairs that did not change since the last run are skipped.
+Style files and 'module:function' callbacks are told apart by a short hash
+of their path and spec, as their names may clash.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import sys
+import glob
+import time
+import inspect
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+import matplotlib as mpl
+import matplotlib.style
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from mpl_style_builder.samples import resolve_callback, callback_name
+from mpl_style_builder.preview_cache import callback_identity, canonical_rc
+
+import logging
+logger = logging.getLogger('batch')
+
+
+def load_style(spec):
+    """
+    :param spec: str, path to a .mplstyle file or name of a style in the
+        matplotlib style library
+    :returns: (name, {param: value})
+    """
+    if os.path.exists(spec):
+        name = os.path.splitext(os.path.basename(spec))[0]
+        rc = mpl.rc_params_from_file(spec, use_default_template=False)
+    elif spec in mpl.style.library:
+        name, rc = spec, mpl.style.library[spec]
+    else:
+        raise ValueError('No such style file or library style: %s' % spec)
+    return name, dict(rc)
+
+
+def _callback_source(callback):
+    try:
+        return inspect.getsource(callback)
+    except (IOError, OSError, TypeError):
+        return ''
+
+
+def content_hash(rc, callback_spec, fmt, dpi):
+    callback = resolve_callback(callback_spec)
+    hasher = hashlib.sha1()
+    for part in (mpl.__version__, canonical_rc(rc),
+                 callback_identity(callback), _callback_source(callback),
+                 fmt, repr(dpi)):
+        hasher.update(part.encode('utf8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()[:16]
+
+
+def render_to_file(rc, callback_spec, path, fmt, dpi=None):
+    """
+    Worker job: render one style/callback pair into ``path``.
+
+    :returns: float, seconds spent
+    """
+    started = time.time()
+    callback = resolve_callback(callback_spec)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with matplotlib.rc_context(rc):
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        callback(fig)
+        fig.savefig(tmp_path, format=fmt, dpi=dpi)
+    os.replace(tmp_path, path)
+    return time.time() - started
+
+
+def _short_hash(text):
+    return hashlib.sha1(text.encode('utf8')).hexdigest()[:8]
+
+
+def _output_path(outdir, style_spec, style_name, callback_spec, digest, fmt):
+    """
+    outdir/style/callback.digest.fmt, where two dark.mplstyle files in
+    different directories or pkg_a:plot and pkg_b:plot get different style
+    directories and callback stems
+    """
+    style_dir = style_name
+    if os.path.exists(style_spec):
+        style_dir = '{}-{}'.format(
+            style_name, _short_hash(os.path.abspath(style_spec))
+        )
+    stem = callback_name(callback_spec)
+    if stem != callback_spec:
+        stem = '{}-{}'.format(stem, _short_hash(callback_spec))
+    return os.path.join(outdir, style_dir,
+                        '{}.{}.{}'.format(stem, digest, fmt))
+
+
+def _remove_stale(path):
+    """Remove outputs of earlier runs for the same style/callback/format"""
+    directory, filename = os.path.split(path)
+    stem, digest, fmt = filename.rsplit('.', 2)
+    for other in glob.glob(os.path.join(directory,
+                                        '{}.*.{}'.format(stem, fmt))):
+        if other != path:
+            os.remove(other)
+
+
+def render_gallery(styles, callbacks=('default',), outdir='gallery',
+                   formats=('png',), dpi=None, max_workers=None,
+                   force=False):
+    """
+    Render every style with every callback in every format.
+
+    :param styles: [str], style file paths or library style names
+    :param callbacks: [str], sample names or 'module:function' specs
+    :returns: [dict], one entry per output with keys
+        style, callback, format, path, status ('rendered', 'skipped' or
+        'failed') and seconds
+    """
+    report = []
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for style_spec in styles:
+            try:
+                style_name, rc = load_style(style_spec)
+            except Exception as exc:
+                logger.error('Could not load style %s: %s', style_spec, exc)
+                report.append({'style': style_spec, 'callback': None,
+                               'format': None, 'path': None,
+                               'status': 'failed', 'seconds': 0.0})
+                continue
+            for callback_spec in callbacks:
+                for fmt in formats:
+                    digest = content_hash(rc, callback_spec, fmt, dpi)
+                    path = _output_path(outdir, style_spec, style_name,
+                                        callback_spec, digest, fmt)
+                    entry = {'style': style_name, 'callback': callback_spec,
+                             'format': fmt, 'path': path,
+                             'status': 'skipped', 'seconds': 0.0}
+                    report.append(entry)
+                    if os.path.exists(path) and not force:
+                        continue
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                    future = executor.submit(render_to_file, rc,
+                                             callback_spec, path, fmt, dpi)
+                    jobs[future] = entry
+        for future in as_completed(jobs):
+            entry = jobs[future]
+            try:
+                entry['seconds'] = future.result()
+                entry['status'] = 'rendered'
+                _remove_stale(entry['path'])
+            except Exception:
+                logger.exception('Rendering %s with %s failed',
+                                 entry['style'], entry['callback'])
+                entry['status'] = 'failed'
+    return report
+
+
+def print_report(report, wall_seconds, file=sys.stdout, slowest=5):
+    counts = dict((status, 0) for status in ('rendered', 'skipped',
+                                             'failed'))
+    for entry in report:
+        counts[entry['status']] += 1
+    render_seconds = sum(entry['seconds'] for entry in report)
+    print('{rendered} rendered, {skipped} skipped, {failed} failed'
+          .format(**counts), file=file)
+    print('wall time {:.2f}s, render time {:.2f}s'.format(
+        wall_seconds, render_seconds), file=file)
+    rendered = sorted((entry for entry in report
+                       if entry['status'] == 'rendered'),
+                      key=lambda entry: -entry['seconds'])
+    for entry in rendered[:slowest]:
+        print('  {seconds:7.2f}s  {style} / {callback} ({format})'
+              .format(**entry), file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Render styles against sample plots without a GUI'
+    )
+    parser.add_argument('styles', nargs='+',
+                        help='.mplstyle files or library style names')
+    parser.add_argument('-c', '--callback', action='append', dest='callbacks',
+                        help="sample name or 'module:function' "
+                             "(repeatable, default: default)")
+    parser.add_argument('-f', '--format', action='append', dest='formats',
+                        help='output format, e.g. png or svg '
+                             '(repeatable, default: png)')
+    parser.add_argument('-o', '--outdir', default='gallery')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--dpi', type=float, default=None)
+    parser.add_argument('--force', action='store_true',
+                        help='re-render also unchanged pairs')
+    args = parser.parse_args(argv)
+    started = time.time()
+    report = render_gallery(
+        args.styles,
+        callbacks=args.callbacks or ['default'],
+        outdir=args.outdir,
+        formats=args.formats or ['png'],
+        dpi=args.dpi,
+        max_workers=args.jobs,
+        force=args.force,
+    )
+    print_report(report, time.time() - started)
+    return 1 if any(entry['status'] == 'failed' for entry in report) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Audit of how the colors of a style work together:
+
+- WCAG contrast ratios of foreground colors (text, ticks, grid, the prop
+  cycle) against the background they are drawn on
+- distinguishability of the prop cycle colors, as CIE76 color differences
+  for normal vision and simulated protanopia, deuteranopia and tritanopia
+  (Machado et al. 2009, full severity)
+
+The colors of all audited styles are gathered into arrays first, so a
+whole style library is audited with a handful of vectorized operations:
+
+    mpl-style-audit              # the whole style library
+    mpl-style-audit ggplot dark_background --json
+"""
+from __future__ import print_function, division, unicode_literals
+
+import sys
+import json
+import time
+import argparse
+from collections import namedtuple
+
+import numpy as np
+import matplotlib as mpl
+from matplotlib.colors import to_rgba
+
+from mpl_style_builder.stylefile import convert_value, rc_validator
+
+import logging
+logger = logging.getLogger('color_audit')
+
+Issue = namedtuple('Issue', 'style kind first second value threshold')
+
+PROP_CYCLE = 'axes.prop_cycle'
+
+# (background, foregrounds, minimum contrast ratio): 4.5 is WCAG AA for
+# text, 3 for graphical objects; grid lines are meant to be subtle and only
+# need to be visible
+CONTRAST_RULES = [
+    ('figure.facecolor', ('text.color', 'axes.labelcolor', 'axes.titlecolor',
+                          'xtick.color', 'ytick.color', 'xtick.labelcolor',
+                          'ytick.labelcolor'), 4.5),
+    ('axes.facecolor', ('text.color',), 4.5),
+    ('axes.facecolor', ('axes.edgecolor', PROP_CYCLE), 3.0),
+    ('axes.facecolor', ('grid.color',), 1.5),
+    ('legend.facecolor', ('text.color',), 4.5),
+]
+MIN_DELTA_E = 10.0
+
+CVD_MATRICES = {
+    'normal vision': np.eye(3),
+    'protanopia': np.array([[0.152286, 1.052583, -0.204868],
+                            [0.114503, 0.786281, 0.099216],
+                            [-0.003882, -0.048116, 1.051998]]),
+    'deuteranopia': np.array([[0.367322, 0.860646, -0.227968],
+                              [0.280085, 0.672501, 0.047413],
+                              [-0.011820, 0.042940, 0.968881]]),
+    'tritanopia': np.array([[1.255528, -0.076749, -0.178779],
+                            [-0.078411, 0.930809, 0.147602],
+                            [0.004733, 0.691367, 0.303900]]),
+}
+RGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                       [0.2126729, 0.7151522, 0.0721750],
+                       [0.0193339, 0.1191920, 0.9503041]])
+D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def srgb_to_linear(rgb):
+    rgb = np.asarray(rgb, dtype=float)
+    return np.where(rgb <= 0.04045, rgb / 12.92,
+                    ((rgb + 0.055) / 1.055) ** 2.4)
+
+
+def relative_luminance(rgb):
+    return srgb_to_linear(rgb).dot([0.2126, 0.7152, 0.0722])
+
+
+def contrast_ratio(rgb1, rgb2):
+    """WCAG contrast ratios of two (n, 3) arrays of sRGB colors"""
+    lum1, lum2 = relative_luminance(rgb1), relative_luminance(rgb2)
+    return (np.maximum(lum1, lum2) + 0.05) / (np.minimum(lum1, lum2) + 0.05)
+
+
+def linear_to_lab(linear):
+    xyz = linear.dot(RGB_TO_XYZ.T) / D65_WHITE
+    delta = 6 / 29
+    f = np.where(xyz > delta ** 3, np.cbrt(xyz),
+                 xyz / (3 * delta ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16,
+                     500 * (f[..., 0] - f[..., 1]),
+                     200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def simulated_delta_e(rgb1, rgb2):
+    """
+    :returns: {vision: (n,) CIE76 color differences} of two (n, 3) arrays
+        of sRGB colors as seen with each of CVD_MATRICES
+    """
+    linear1, linear2 = srgb_to_linear(rgb1), srgb_to_linear(rgb2)
+    differences = {}
+    for vision, matrix in CVD_MATRICES.items():
+        lab1 = linear_to_lab(np.clip(linear1.dot(matrix.T), 0, 1))
+        lab2 = linear_to_lab(np.clip(linear2.dot(matrix.T), 0, 1))
+        differences[vision] = np.linalg.norm(lab1 - lab2, axis=-1)
+    return differences
+
+
+class ColorResolver(object):
+    """Converts rc color values to sRGB, caching by value"""
+    def __init__(self):
+        self._cache = {}
+
+    def rgb(self, value):
+        """:returns: (r, g, b) or None for 'none', 'auto', 'inherit' etc."""
+        key = value if isinstance(value, str) else repr(value)
+        if key not in self._cache:
+            self._cache[key] = self._convert(value)
+        return self._cache[key]
+
+    def _convert(self, value):
+        if isinstance(value, str) and len(value) in (6, 8) and \
+                all(char in '0123456789abcdefABCDEF' for char in value):
+            value = '#' + value  # as in .mplstyle files
+        try:
+            rgba = to_rgba(value)
+        except (ValueError, TypeError):
+            return None
+        return rgba[:3] if rgba[3] > 0 else None
+
+
+def style_colors(rc, color_params, resolver):
+    """
+    :param rc: {param: value}, raw or converted; params it lacks are taken
+        from matplotlib's defaults
+    :returns: ({param: rgb}, [rgb of the prop cycle colors])
+    """
+    def value(param):
+        if param in rc:
+            return rc[param]
+        return mpl.rcParamsDefault.get(param)
+
+    colors = {}
+    for param in color_params:
+        raw = value(param)
+        if raw is None:
+            continue
+        rgb = resolver.rgb(raw)
+        if rgb is not None:
+            colors[param] = rgb
+    cycle = value(PROP_CYCLE)
+    if isinstance(cycle, str):
+        try:
+            cycle = convert_value(PROP_CYCLE, cycle)
+        except ValueError:
+            cycle = None
+    cycle_colors = []
+    if cycle is not None and 'color' in cycle.keys:
+        cycle_colors = [rgb for rgb in map(resolver.rgb,
+                                           cycle.by_key()['color'])
+                        if rgb is not None]
+    return colors, cycle_colors
+
+
+def color_params_of(params):
+    """
+    Names of the colorstring params of a schema, and of the params
+    matplotlib validates as colors, which older schemas may lack
+    """
+    names = set(name for name, prop in params.items()
+                if prop.get('type') == 'colorstring')
+    for name in mpl.rcParams:
+        validator_name = getattr(rc_validator(name), '__name__', '')
+        if 'color' in validator_name and name != PROP_CYCLE:
+            names.add(name)
+    return sorted(names)
+
+
+def audit_styles(styles, color_params, min_delta_e=MIN_DELTA_E):
+    """
+    :param styles: {style name: {param: value}}
+    :param color_params: [str], see color_params_of
+    :returns: [Issue], kind is 'contrast' (value is the contrast ratio) or
+        the vision under which two prop cycle colors are hard to tell
+        apart (value is their color difference)
+    """
+    resolver = ColorResolver()
+    contrast_rows, contrast_bg, contrast_fg = [], [], []
+    cycle_rows, cycle_first, cycle_second = [], [], []
+    for name, rc in styles.items():
+        colors, cycle_colors = style_colors(rc, color_params, resolver)
+        for background, foregrounds, minimum in CONTRAST_RULES:
+            if background not in colors:
+                continue
+            for foreground in foregrounds:
+                if foreground == PROP_CYCLE:
+                    labelled = [('{}[{}]'.format(PROP_CYCLE, idx), rgb)
+                                for idx, rgb in enumerate(cycle_colors)]
+                else:
+                    labelled = [(foreground, colors[foreground])] \
+                        if foreground in colors else []
+                for label, rgb in labelled:
+                    contrast_rows.append((name, background, label, minimum))
+                    contrast_bg.append(colors[background])
+                    contrast_fg.append(rgb)
+        for first in range(len(cycle_colors)):
+            for second in range(first + 1, len(cycle_colors)):
+                cycle_rows.append((name, first, second))
+                cycle_first.append(cycle_colors[first])
+                cycle_second.append(cycle_colors[second])
+
+    issues = []
+    if contrast_rows:
+        ratios = contrast_ratio(np.array(contrast_bg), np.array(contrast_fg))
+        minimums = np.array([row[3] for row in contrast_rows])
+        for idx in np.flatnonzero(ratios < minimums):
+            name, background, label, minimum = contrast_rows[idx]
+            issues.append(Issue(name, 'contrast', label, background,
+                                float(ratios[idx]), minimum))
+    if cycle_rows:
+        differences = simulated_delta_e(np.array(cycle_first),
+                                        np.array(cycle_second))
+        visions = sorted(differences)
+        stacked = np.stack([differences[vision] for vision in visions])
+        worst = stacked.argmin(axis=0)
+        lowest = stacked.min(axis=0)
+        for idx in np.flatnonzero(lowest < min_delta_e):
+            name, first, second = cycle_rows[idx]
+            issues.append(Issue(
+                name, visions[worst[idx]],
+                '{}[{}]'.format(PROP_CYCLE, first),
+                '{}[{}]'.format(PROP_CYCLE, second),
+                float(lowest[idx]), min_delta_e
+            ))
+    return issues
+
+
+def audit_style(rc, color_params, name=None):
+    return audit_styles({name: rc}, color_params)
+
+
+def format_issue(issue):
+    if issue.kind == 'contrast':
+        text = '{} on {}: contrast {:.2f} < {:.1f}'.format(
+            issue.first, issue.second, issue.value, issue.threshold
+        )
+    else:
+        text = '{} and {} hard to tell apart with {}: delta E {:.1f}'.format(
+            issue.first, issue.second, issue.kind, issue.value
+        )
+    return '{}: {}'.format(issue.style, text) if issue.style else text
+
+
+def issues_by_param(issues):
+    """:returns: {param: [message]}, prop cycle entries under PROP_CYCLE"""
+    by_param = {}
+    for issue in issues:
+        message = format_issue(issue._replace(style=None))
+        for label in (issue.first, issue.second):
+            param = label.split('[', 1)[0]
+            messages = by_param.setdefault(param, [])
+            if message not in messages:
+                messages.append(message)
+    return by_param
+
+
+def main(argv=None):
+    from mpl_style_builder.schema import load_schema
+    from mpl_style_builder.style_index import StyleIndex
+
+    parser = argparse.ArgumentParser(
+        description='Audit contrast and colorblind safety of styles'
+    )
+    parser.add_argument('styles', nargs='*',
+                        help='library style names (default: all)')
+    parser.add_argument('--min-delta-e', type=float, default=MIN_DELTA_E)
+    parser.add_argument('--json', action='store_true',
+                        help='print issues as json')
+    args = parser.parse_args(argv)
+    _categorized, params = load_schema()
+    index = StyleIndex()
+    index.refresh()
+    names = args.styles or index.available
+    styles = {}
+    for name in names:
+        raw = index.raw_params(name)
+        if raw is None:
+            parser.error('No such style: %s' % name)
+        styles[name] = raw
+    started = time.time()
+    issues = audit_styles(styles, color_params_of(params), args.min_delta_e)
+    elapsed = time.time() - started
+    if args.json:
+        json.dump([issue._asdict() for issue in issues], sys.stdout,
+                  indent=1)
+        print()
+    else:
+        for issue in sorted(issues):
+            print(format_issue(issue))
+    print('{} issues in {} styles, audited in {:.0f} ms'.format(
+        len(issues), len(styles), elapsed * 1000), file=sys.stderr)
+    return 1 if issues else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
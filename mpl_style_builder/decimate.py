@@ -0,0 +1,212 @@
+"""
+Preview-only decimation of large plotted arrays.
+
+While a plot callback runs inside decimated_plotting(), Axes.plot and
+Axes.scatter reduce arrays much longer than the axes is wide in pixels:
+
+- 'minmax' keeps, per pixel column, the first, last, minimum and maximum
+  point, which draws the same envelope as the full line
+- 'lttb' keeps the points of Largest-Triangle-Three-Buckets downsampling
+- scatter keeps one point per occupied pixel cell
+
+Only the preview is affected; exports render the callback as is.
+"""
+from __future__ import print_function, division, unicode_literals
+
+from contextlib import contextmanager
+
+import numpy as np
+from matplotlib.axes import Axes
+
+import logging
+logger = logging.getLogger('decimate')
+
+METHODS = ('minmax', 'lttb')
+
+
+def _segment_starts(x, n_bins):
+    """Start indices of the non-empty segments of sorted x in n_bins bins"""
+    edges = np.linspace(x[0], x[-1], n_bins + 1)
+    starts = np.searchsorted(x, edges[:-1], side='left')
+    return np.unique(starts)
+
+
+def minmax_indices(x, y, n_bins):
+    """
+    Indices of the first, last, min and max point of every bin of sorted x.
+    """
+    starts = _segment_starts(x, n_bins)
+    lengths = np.diff(np.append(starts, len(y)))
+    segment_of = np.repeat(np.arange(len(starts)), lengths)
+    picks = [starts, starts + lengths - 1]
+    for reduce_ in (np.minimum, np.maximum):
+        extreme = np.repeat(reduce_.reduceat(y, starts), lengths)
+        hits = np.flatnonzero(y == extreme)
+        # First hit per segment
+        first = np.unique(segment_of[hits], return_index=True)[1]
+        picks.append(hits[first])
+    return np.unique(np.concatenate(picks))
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: per bucket, the point spanning the
+    largest triangle with the previously chosen point and the mean of the
+    next bucket. Vectorized within buckets.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    bounds = np.linspace(1, n - 1, n_out - 1).astype(int)
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    prev = 0
+    for bucket in range(n_out - 2):
+        lo, hi = bounds[bucket], bounds[bucket + 1]
+        next_hi = bounds[bucket + 2] if bucket + 2 < len(bounds) else n
+        next_x = x[hi:next_hi].mean()
+        next_y = y[hi:next_hi].mean()
+        areas = np.abs(
+            (x[prev] - next_x) * (y[lo:hi] - y[prev]) -
+            (x[prev] - x[lo:hi]) * (next_y - y[prev])
+        )
+        prev = lo + int(np.argmax(areas))
+        picked[bucket + 1] = prev
+    return picked
+
+
+def grid_indices(x, y, width, height):
+    """One point index per occupied cell of a width x height pixel grid"""
+    def cells(values, count):
+        span = values.max() - values.min()
+        if span == 0:
+            return np.zeros(len(values), dtype=np.int64)
+        scaled = (values - values.min()) / span * (count - 1)
+        return scaled.astype(np.int64)
+    cell = cells(x, width) * height + cells(y, height)
+    return np.sort(np.unique(cell, return_index=True)[1])
+
+
+def _is_pandas(values):
+    return type(values).__module__.partition('.')[0] == 'pandas'
+
+
+def _as_numeric(values):
+    if _is_pandas(values):  # plotted against their index, left alone
+        return None
+    array = np.asarray(values)
+    if array.ndim != 1 or array.dtype.kind not in 'biufM':
+        return None
+    return array
+
+
+def _binnable(array):
+    """datetime64 arrays as int64, for arithmetic and float conversion"""
+    return array.view(np.int64) if array.dtype.kind == 'M' else array
+
+
+def _axes_pixels(ax):
+    bbox = ax.get_window_extent()
+    return max(int(bbox.width), 1), max(int(bbox.height), 1)
+
+
+def decimate_line(ax, args, method, factor):
+    """
+    :returns: args with x and y reduced, or the original args if they are
+        not a single simple (x, y[, fmt]) or (y[, fmt]) group or are small
+    """
+    fmt = ()
+    if args and isinstance(args[-1], str):
+        args, fmt = args[:-1], args[-1:]
+    if len(args) == 1:
+        y = _as_numeric(args[0])
+        x = None if y is None else np.arange(len(y))
+    elif len(args) == 2:
+        x, y = _as_numeric(args[0]), _as_numeric(args[1])
+    else:
+        return None
+    width, _height = _axes_pixels(ax)
+    if x is None or y is None or len(x) != len(y) or \
+            len(y) <= factor * width:
+        return None
+    if y.dtype.kind == 'f' and np.isnan(y).any():
+        return None  # gaps would be bridged
+    # Binned and compared as numbers; np.linspace rejects datetime64
+    bin_x, bin_y = _binnable(x), _binnable(y)
+    if len(x) > 1 and not (np.diff(bin_x) >= 0).all():
+        return None
+    if method == 'lttb':
+        keep = lttb_indices(bin_x.astype(float), bin_y.astype(float),
+                            2 * width)
+    else:
+        keep = minmax_indices(bin_x, bin_y, width)
+    logger.debug('Decimated line from %d to %d points', len(y), len(keep))
+    return (x[keep], y[keep]) + tuple(fmt)
+
+
+def decimate_scatter(ax, x, y, kwargs, factor):
+    if any(np.ndim(kwargs.get(key)) > 0 for key in ('s', 'c', 'color')):
+        return None  # per-point sizes or colors
+    x, y = _as_numeric(x), _as_numeric(y)
+    width, height = _axes_pixels(ax)
+    if x is None or y is None or len(x) != len(y) or \
+            len(x) <= factor * width:
+        return None
+    if x.dtype.kind == 'M' or y.dtype.kind == 'M':
+        return None
+    keep = grid_indices(x.astype(float), y.astype(float), width, height)
+    logger.debug('Decimated scatter from %d to %d points', len(x), len(keep))
+    return x[keep], y[keep]
+
+
+@contextmanager
+def decimated_plotting(method='minmax', factor=4):
+    """
+    :param method: 'minmax' or 'lttb', for lines
+    :param factor: only arrays longer than factor x axes width in pixels
+        are decimated
+    """
+    if method not in METHODS:
+        raise ValueError('Unknown decimation method: %s' % method)
+    original_plot = Axes.plot
+    original_scatter = Axes.scatter
+
+    def plot(self, *args, **kwargs):
+        if 'data' not in kwargs:
+            args = decimate_line(self, args, method, factor) or args
+        return original_plot(self, *args, **kwargs)
+
+    def scatter(self, x, y, *args, **kwargs):
+        if not args and 'data' not in kwargs:
+            reduced = decimate_scatter(self, x, y, kwargs, factor)
+            if reduced is not None:
+                x, y = reduced
+        return original_scatter(self, x, y, *args, **kwargs)
+
+    Axes.plot, Axes.scatter = plot, scatter
+    try:
+        yield
+    finally:
+        Axes.plot, Axes.scatter = original_plot, original_scatter
+
+
+class DecimatingCallback(object):
+    """
+    Picklable wrapper running a plot callback within decimated_plotting,
+    usable wherever a plot callback is, including render workers.
+    """
+    def __init__(self, plot_callback, method='minmax', factor=4):
+        self.plot_callback = plot_callback
+        self.method = method
+        self.factor = factor
+        # Identity as used for cache keys
+        self.__module__ = getattr(plot_callback, '__module__', None)
+        self.__qualname__ = 'decimated[{}]({})'.format(
+            method,
+            getattr(plot_callback, '__qualname__',
+                    getattr(plot_callback, '__name__', repr(plot_callback)))
+        )
+
+    def __call__(self, fig):
+        with decimated_plotting(self.method, self.factor):
+            return self.plot_callback(fig)
@@ -0,0 +1,113 @@
+from __future__ import print_function, division, unicode_literals
+
+import math
+from collections import OrderedDict
+
+from matplotlib.backends.qt_compat import QtWidgets, QtGui, is_pyqt5
+
+import logging
+logger = logging.getLogger('frame_view')
+
+if is_pyqt5():
+    from PyQt5.QtCore import pyqtSignal
+else:
+    from PyQt4.QtCore import pyqtSignal
+
+
+def frame_to_qimage(frame):
+    """
+    Wrap the frame's RGBA buffer in a QImage. The QImage does not own the
+    pixels: the frame must outlive it.
+    """
+    if hasattr(QtGui.QImage, 'Format_RGBA8888'):
+        return QtGui.QImage(frame.buffer, frame.width, frame.height,
+                            frame.width * 4, QtGui.QImage.Format_RGBA8888)
+    # Qt4 has no RGBA format, swapping channels of ARGB copies the pixels
+    return QtGui.QImage(frame.buffer, frame.width, frame.height,
+                        frame.width * 4, QtGui.QImage.Format_ARGB32) \
+        .rgbSwapped()
+
+
+class FrameView(QtWidgets.QWidget):
+    """
+    Displays RenderedFrames, scaled to the widget if their size differs,
+    as for low resolution drafts. The previously displayed frame is
+    released when a new one is set.
+    """
+    sig_resized = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(FrameView, self).__init__(parent)
+        self.frame = None
+        self._qimage = None
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding,
+                           QtWidgets.QSizePolicy.Expanding)
+
+    def figsize(self, dpi):
+        return (max(self.width(), 1) / dpi, max(self.height(), 1) / dpi)
+
+    def set_frame(self, frame):
+        previous = self.frame
+        self.frame = frame
+        self._qimage = frame_to_qimage(frame)
+        if previous is not None and previous is not frame:
+            previous.release()
+        self.update()
+
+    def clear(self):
+        previous, self.frame, self._qimage = self.frame, None, None
+        if previous is not None:
+            previous.release()
+        self.update()
+
+    def paintEvent(self, event):
+        if self._qimage is None:
+            return
+        painter = QtGui.QPainter(self)
+        if (self.frame.width, self.frame.height) == \
+                (self.width(), self.height()):
+            painter.drawImage(0, 0, self._qimage)
+        else:
+            painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+            painter.drawImage(self.rect(), self._qimage)
+        painter.end()
+
+    def resizeEvent(self, event):
+        super(FrameView, self).resizeEvent(event)
+        self.sig_resized.emit()
+
+
+class GalleryView(QtWidgets.QWidget):
+    """
+    A grid of FrameViews, one per named tile, each displaying its own
+    frames independently of the others.
+    """
+    sig_resized = pyqtSignal()
+
+    def __init__(self, names, columns=None, parent=None):
+        super(GalleryView, self).__init__(parent)
+        layout = QtWidgets.QGridLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(2)
+        self.setLayout(layout)
+        columns = columns or int(math.ceil(math.sqrt(len(names))))
+        self.views = OrderedDict()
+        for idx, name in enumerate(names):
+            view = FrameView()
+            view.setToolTip(name)
+            layout.addWidget(view, idx // columns, idx % columns)
+            self.views[name] = view
+
+    def figsize(self, name, dpi):
+        return self.views[name].figsize(dpi)
+
+    def set_frame(self, name, frame):
+        self.views[name].set_frame(frame)
+
+    def clear(self):
+        for view in self.views.values():
+            view.clear()
+
+    def resizeEvent(self, event):
+        super(GalleryView, self).resizeEvent(event)
+        self.sig_resized.emit()
@@ -0,0 +1,172 @@
+"""
+Rendered preview frames: raw RGBA pixel buffers plus the information needed
+to display them, without any dependency on Qt.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from mpl_style_builder.rc_tracing import recording_rc_reads
+from mpl_style_builder.restyle import known_rc
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+import logging
+logger = logging.getLogger('frames')
+
+# rc overrides making draft renders cheaper
+DRAFT_RC = {
+    'text.usetex': False,
+    'lines.antialiased': False,
+    'patch.antialiased': False,
+    'text.antialiased': False,
+    'path.simplify': True,
+}
+
+
+class RenderedFrame(object):
+    """
+    An RGBA8888 (not premultiplied) image of width x height pixels.
+
+    ``buffer`` is any object supporting the buffer protocol. Frames coming
+    from a render worker are backed by a shared memory block which is
+    mapped, not copied, into this process; such frames must be release()d
+    when no longer displayed.
+
+    ``rc_reads`` is the frozenset of rcParams read by the render, if traced.
+    """
+    def __init__(self, width, height, buffer, dpi=None, kind='final',
+                 job_id=None, owner=None, shm=None, rc_reads=None):
+        self.width = width
+        self.height = height
+        self.buffer = buffer
+        self.dpi = dpi
+        self.kind = kind
+        self.job_id = job_id
+        self.rc_reads = rc_reads
+        self._owner = owner  # keeps e.g. the Agg canvas owning buffer alive
+        self._shm = shm
+
+    def __repr__(self):
+        return '<RenderedFrame %dx%d %s%s>' % (
+            self.width, self.height, self.kind,
+            ' (shared)' if self._shm is not None else ''
+        )
+
+    @property
+    def nbytes(self):
+        return self.width * self.height * 4
+
+    @property
+    def is_shared(self):
+        return self._shm is not None
+
+    @classmethod
+    def from_shared_memory(cls, name, width, height, **kwargs):
+        shm = shared_memory.SharedMemory(name=name)
+        buffer = shm.buf[:width * height * 4]
+        return cls(width, height, buffer, shm=shm, **kwargs)
+
+    def to_bytes(self):
+        return bytes(self.buffer)
+
+    def detached(self):
+        """Copy of this frame which does not depend on any shared memory."""
+        if self._shm is None:
+            return self
+        return RenderedFrame(self.width, self.height, self.to_bytes(),
+                             dpi=self.dpi, kind=self.kind,
+                             job_id=self.job_id, rc_reads=self.rc_reads)
+
+    def release(self):
+        if self._shm is None:
+            return
+        self.buffer.release()
+        self.buffer = None
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+
+
+def draft_rc(changed):
+    """``changed`` with the DRAFT_RC overrides this matplotlib knows"""
+    rc = dict(changed)
+    rc.update((param, value) for param, value in DRAFT_RC.items()
+              if param in matplotlib.rcParams)
+    return rc
+
+
+def draw_figure(changed, plot_callback, figsize=None, dpi=None,
+                reads=None):
+    """
+    Draw ``plot_callback`` with the ``changed`` rc overrides on an Agg
+    canvas.
+
+    :param reads: set to add the rcParams read while drawing to, see
+        rc_tracing
+    :returns: the drawn FigureCanvasAgg
+    """
+    with matplotlib.rc_context(known_rc(changed)):
+        if reads is None:
+            return _draw(plot_callback, figsize, dpi)
+        with recording_rc_reads(reads):
+            return _draw(plot_callback, figsize, dpi)
+
+
+def _draw(plot_callback, figsize, dpi):
+    fig = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    plot_callback(fig)
+    canvas.draw()
+    return canvas
+
+
+def render_frame(changed, plot_callback, figsize=None, dpi=None,
+                 kind='final'):
+    """
+    Render into a frame that shares the buffer of its Agg canvas.
+    """
+    canvas = draw_figure(changed, plot_callback, figsize, dpi)
+    width, height = map(int, canvas.get_width_height())
+    return RenderedFrame(width, height, memoryview(canvas.buffer_rgba()),
+                         dpi=canvas.figure.dpi, kind=kind, owner=canvas)
+
+
+def _create_untracked_shared_memory(size):
+    """
+    A new shared memory block the resource tracker does not unlink when
+    the creating worker exits, since the receiving process owns it.
+    """
+    try:
+        return shared_memory.SharedMemory(create=True, size=size,
+                                          track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def render_to_shared_memory(changed, plot_callback, figsize=None, dpi=None):
+    """
+    Worker side of a render job: render and leave the pixels in a new
+    shared memory block, which the receiving process takes ownership of.
+
+    :returns: (shm name, width, height, dpi, frozenset of rcParams read)
+    """
+    reads = set()
+    canvas = draw_figure(changed, plot_callback, figsize, dpi, reads)
+    width, height = map(int, canvas.get_width_height())
+    pixels = memoryview(canvas.buffer_rgba()).cast('B')
+    shm = _create_untracked_shared_memory(pixels.nbytes)
+    shm.buf[:pixels.nbytes] = pixels
+    name = shm.name
+    shm.close()
+    return name, width, height, canvas.figure.dpi, frozenset(reads)
@@ -0,0 +1,353 @@
+"""
+Undo/redo history of a StyleSession's changed params.
+
+Every history entry is a snapshot of ``changed`` as a PersistentMap, a
+hash array mapped trie: updating a param copies only the path of nodes
+leading to it and shares everything else with the previous snapshot, so
+an entry costs well under a kilobyte however many params are changed.
+Unchanged subtrees are shared by identity, which also makes finding the
+params that differ between two entries cheap.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import time
+
+import logging
+logger = logging.getLogger('history')
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+_HASH_MASK = (1 << 64) - 1
+_MISSING = object()
+
+
+def _hash(key):
+    return hash(key) & _HASH_MASK
+
+
+def _popcount(bits):
+    return bin(bits).count('1')
+
+
+class _Node(object):
+    """
+    Trie node. ``entries`` holds, in slot order, a child for each bit set
+    in ``bitmap``: a _Node, a _Bucket or a (key, value) leaf.
+    """
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+    def child(self, slot):
+        bit = 1 << slot
+        if not self.bitmap & bit:
+            return None
+        return self.entries[_popcount(self.bitmap & (bit - 1))]
+
+
+class _Bucket(object):
+    """Leaves of keys with equal hashes"""
+    __slots__ = ('hash', 'leaves')
+
+    def __init__(self, key_hash, leaves):
+        self.hash = key_hash
+        self.leaves = leaves
+
+
+def _leaf_hash(child):
+    return child.hash if isinstance(child, _Bucket) else _hash(child[0])
+
+
+def _join(first, first_hash, second, second_hash, shift):
+    """Node holding two leaves or buckets which share a slot at ``shift``"""
+    if first_hash == second_hash:
+        leaves = first.leaves if isinstance(first, _Bucket) else (first,)
+        return _Bucket(first_hash, leaves + (second,))
+    first_slot = (first_hash >> shift) & _MASK
+    second_slot = (second_hash >> shift) & _MASK
+    if first_slot == second_slot:
+        return _Node(1 << first_slot, (
+            _join(first, first_hash, second, second_hash, shift + _BITS),
+        ))
+    if first_slot > second_slot:
+        first, second = second, first
+    return _Node((1 << first_slot) | (1 << second_slot), (first, second))
+
+
+def _set(node, shift, key_hash, key, value):
+    """:returns: (new node, whether the key was added)"""
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    idx = _popcount(node.bitmap & (bit - 1))
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, node.entries[:idx] +
+                     ((key, value),) + node.entries[idx:]), True
+    child = node.entries[idx]
+    added = False
+    if isinstance(child, _Node):
+        new_child, added = _set(child, shift + _BITS, key_hash, key, value)
+    elif isinstance(child, _Bucket) and child.hash == key_hash:
+        leaves = tuple(leaf for leaf in child.leaves if leaf[0] != key)
+        added = len(leaves) == len(child.leaves)
+        new_child = _Bucket(key_hash, leaves + ((key, value),))
+    elif not isinstance(child, _Bucket) and child[0] == key:
+        if child[1] is value or child[1] == value:
+            return node, False
+        new_child = (key, value)
+    else:
+        new_child = _join(child, _leaf_hash(child), (key, value), key_hash,
+                          shift + _BITS)
+        added = True
+    if new_child is child:
+        return node, False
+    return _Node(node.bitmap, node.entries[:idx] + (new_child,) +
+                 node.entries[idx + 1:]), added
+
+
+def _delete(node, shift, key_hash, key):
+    """:returns: new node, ``node`` if key is absent, None if empty"""
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    idx = _popcount(node.bitmap & (bit - 1))
+    child = node.entries[idx]
+    if isinstance(child, _Node):
+        new_child = _delete(child, shift + _BITS, key_hash, key)
+    elif isinstance(child, _Bucket):
+        leaves = tuple(leaf for leaf in child.leaves if leaf[0] != key)
+        if len(leaves) == len(child.leaves):
+            return node
+        new_child = leaves[0] if len(leaves) == 1 else \
+            _Bucket(child.hash, leaves)
+    elif child[0] == key:
+        new_child = None
+    else:
+        return node
+    if new_child is child:
+        return node
+    if new_child is None:
+        if node.bitmap == bit:
+            return None
+        return _Node(node.bitmap & ~bit,
+                     node.entries[:idx] + node.entries[idx + 1:])
+    return _Node(node.bitmap, node.entries[:idx] + (new_child,) +
+                 node.entries[idx + 1:])
+
+
+def _get(node, key_hash, key, default):
+    shift = 0
+    while True:
+        child = node.child((key_hash >> shift) & _MASK)
+        if child is None:
+            return default
+        if isinstance(child, _Node):
+            node, shift = child, shift + _BITS
+            continue
+        leaves = child.leaves if isinstance(child, _Bucket) else (child,)
+        for leaf_key, value in leaves:
+            if leaf_key == key:
+                return value
+        return default
+
+
+def _items(child):
+    if child is None:
+        return
+    if isinstance(child, _Node):
+        for entry in child.entries:
+            for item in _items(entry):
+                yield item
+    elif isinstance(child, _Bucket):
+        for leaf in child.leaves:
+            yield leaf
+    else:
+        yield child
+
+
+def _diff(first, second, keys):
+    """Add the keys whose values differ between two subtrees to ``keys``"""
+    if first is second:
+        return
+    if isinstance(first, _Node) and isinstance(second, _Node):
+        for slot in range(_WIDTH):
+            _diff(first.child(slot), second.child(slot), keys)
+        return
+    first_items, second_items = dict(_items(first)), dict(_items(second))
+    keys.update(key for key in set(first_items) | set(second_items)
+                if first_items.get(key, _MISSING) !=
+                second_items.get(key, _MISSING))
+
+
+class PersistentMap(object):
+    """
+    Immutable mapping; set() and delete() return new maps sharing all
+    untouched structure with this one.
+    """
+    __slots__ = ('_root', '_length')
+
+    def __init__(self, root=None, length=0):
+        self._root = root if root is not None else _Node(0, ())
+        self._length = length
+
+    @classmethod
+    def from_dict(cls, mapping):
+        result = cls()
+        for key, value in mapping.items():
+            result = result.set(key, value)
+        return result
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, key):
+        return _get(self._root, _hash(key), key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key):
+        value = _get(self._root, _hash(key), key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        return _get(self._root, _hash(key), key, default)
+
+    def __iter__(self):
+        for key, _value in _items(self._root):
+            yield key
+
+    def items(self):
+        return _items(self._root)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def set(self, key, value):
+        root, added = _set(self._root, 0, _hash(key), key, value)
+        if root is self._root:
+            return self
+        return PersistentMap(root, self._length + added)
+
+    def delete(self, key):
+        root = _delete(self._root, 0, _hash(key), key)
+        if root is self._root:
+            return self
+        return PersistentMap(root, self._length - 1)
+
+    def diff(self, other):
+        """:returns: set of the keys whose values differ from ``other``"""
+        keys = set()
+        _diff(self._root, other._root, keys)
+        return keys
+
+
+class HistoryEntry(object):
+    """
+    :ivar state: PersistentMap, the changed params
+    :ivar preview_key: preview cache key of the preview rendered for this
+        state, if any
+    """
+    __slots__ = ('state', 'label', 'timestamp', 'preview_key')
+
+    def __init__(self, state, label, timestamp=None, preview_key=None):
+        self.state = state
+        self.label = label
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.preview_key = preview_key
+
+    def __repr__(self):
+        return '<HistoryEntry {} ({} params)>'.format(self.label,
+                                                      len(self.state))
+
+
+class StyleHistory(object):
+    """
+    Unlimited linear undo/redo over a StyleSession, recording every change
+    applied to it. Consecutive changes of the same param within
+    ``merge_seconds``, like the steps of a slider drag, make one entry.
+    Stepping through the history applies the differing params to the
+    session in one transaction, updating ``changed`` in place.
+    """
+    def __init__(self, session, merge_seconds=1.0):
+        self.session = session
+        self.merge_seconds = merge_seconds
+        self.entries = [HistoryEntry(PersistentMap.from_dict(session.changed),
+                                     'start')]
+        self.position = 0
+        self._last_recorded = None  # the entry changes may be merged into
+        self._restoring = False
+        session.listeners.append(self._record)
+
+    @property
+    def current(self):
+        return self.entries[self.position]
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.entries) - 1
+
+    def _record(self, touched):
+        if self._restoring:
+            return
+        changed = self.session.changed
+        state = self.current.state
+        for param in touched:
+            if param in changed:
+                state = state.set(param, changed[param])
+            else:
+                state = state.delete(param)
+        if state is self.current.state:
+            return
+        label = touched[0] if len(touched) == 1 else \
+            '{} params'.format(len(touched))
+        now = time.time()
+        del self.entries[self.position + 1:]
+        last = self._last_recorded
+        if last is self.current and len(touched) == 1 and \
+                last.label == label and \
+                now - last.timestamp < self.merge_seconds:
+            last.state, last.timestamp, last.preview_key = state, now, None
+            return
+        self._last_recorded = HistoryEntry(state, label, now)
+        self.entries.append(self._last_recorded)
+        self.position += 1
+
+    def undo(self):
+        """:returns: the entry restored, or None at the start"""
+        return self.go_to(self.position - 1)
+
+    def redo(self):
+        """:returns: the entry restored, or None at the end"""
+        return self.go_to(self.position + 1)
+
+    def go_to(self, position):
+        """
+        Restore the state of the entry at ``position``.
+
+        :returns: the entry, or None if ``position`` is out of range
+        """
+        if not 0 <= position < len(self.entries):
+            return None
+        target = self.entries[position]
+        params = self.current.state.diff(target.state)
+        self.position = position
+        self._last_recorded = None
+        self._restoring = True
+        try:
+            with self.session.transaction() as batch:
+                for param in sorted(params):
+                    if param in target.state:
+                        batch.set(param, target.state[param])
+                    else:
+                        batch.reset(param)
+        finally:
+            self._restoring = False
+        logger.debug('Restored history entry %d: %s', position, target.label)
+        return target
+
+    def link_preview(self, key):
+        """Link the current entry to the cached preview of its state"""
+        self.current.preview_key = key
@@ -0,0 +1,431 @@
+"""
+Perceptual comparison of rendered frames, to check which sample figures a
+style change actually affects, and where:
+
+    mpl-style-diff house.mplstyle house-new.mplstyle -c default -c bars
+    mpl-style-diff house.mplstyle house-new.mplstyle --heatmaps diff
+
+Every style is rendered with every sample, in worker processes as by the
+batch renderer, and compared to the baseline style's rendering of the
+same sample by
+
+- the mean SSIM of their luminance, over 7x7 windows, computed around the
+  pixels that differ only
+- per pixel CIE76 color differences (delta E) of the frames composited on
+  white; pixels differing by more than ``threshold`` (default 2.3, about
+  one just noticeable difference) count as changed, and blocks of changed
+  pixels are merged into changed regions
+
+Frames of equal size are stacked and compared in chunks with a few
+vectorized operations each.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mpl_style_builder.frames import RenderedFrame, draw_figure
+from mpl_style_builder.samples import SAMPLES, resolve_callback, callback_name
+from mpl_style_builder.color_audit import srgb_to_linear, linear_to_lab
+
+import logging
+logger = logging.getLogger('image_diff')
+
+Comparison = namedtuple(
+    'Comparison',
+    'style callback changed ssim mean_delta_e max_delta_e changed_fraction '
+    'regions heatmap'
+)
+
+JND_DELTA_E = 2.3
+SSIM_WINDOW = 7
+BLOCK_SIZE = 16
+CHUNK_SIZE = 16  # frame pairs compared at once, bounds memory use
+
+SRGB_TO_LINEAR = srgb_to_linear(np.arange(256) / 255).astype(np.float32)
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def frame_array(frame):
+    """:returns: (height, width, 4) uint8 view of a RenderedFrame's pixels"""
+    return np.frombuffer(frame.buffer, dtype=np.uint8).reshape(
+        frame.height, frame.width, 4
+    )
+
+
+def composite_on_white(rgba):
+    """:returns: uint8 sRGB of uint8 RGBA pixels over white"""
+    if rgba[..., 3].min(initial=255) == 255:
+        return rgba[..., :3]
+    alpha = rgba[..., 3:].astype(np.uint16)
+    return ((rgba[..., :3] * alpha + 255 * (255 - alpha) + 127) // 255) \
+        .astype(np.uint8)
+
+
+def luminance(rgb):
+    """Luma in [0, 255] of uint8 sRGB pixels"""
+    return rgb.dot(LUMA_WEIGHTS)
+
+
+def _lab(rgb):
+    """
+    CIE Lab colors of (..., 3) uint8 sRGB colors. Plots have few distinct
+    colors, so each is converted once.
+    """
+    rgb = rgb.astype(np.uint32)
+    codes = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+    distinct, inverse = np.unique(codes, return_inverse=True)
+    distinct_rgb = np.stack([distinct >> 16, (distinct >> 8) & 255,
+                             distinct & 255], axis=-1)
+    lab = linear_to_lab(SRGB_TO_LINEAR[distinct_rgb]).astype(np.float32)
+    return lab[inverse.reshape(codes.shape)]
+
+
+def delta_e_map(rgb1, rgb2):
+    """CIE76 color differences of two (..., 3) arrays of uint8 sRGB colors"""
+    return np.linalg.norm(_lab(rgb1) - _lab(rgb2), axis=-1)
+
+
+def _box_mean(values, size):
+    """Means over size x size windows of the last two axes, valid mode"""
+    sums = values.cumsum(axis=-2).cumsum(axis=-1)
+    sums = np.pad(sums, [(0, 0)] * (sums.ndim - 2) + [(1, 0), (1, 0)],
+                  mode='constant')
+    return (sums[..., size:, size:] - sums[..., :-size, size:] -
+            sums[..., size:, :-size] + sums[..., :-size, :-size]) / size ** 2
+
+
+def ssim_map(gray1, gray2, window=SSIM_WINDOW):
+    """
+    Structural similarity indices of (..., height, width) arrays of
+    luminances in [0, 255] over uniform windows, 1 where identical.
+
+    :returns: (..., height - window + 1, width - window + 1) array
+    """
+    gray1 = gray1.astype(np.float64)
+    gray2 = gray2.astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mean1, mean2 = _box_mean(gray1, window), _box_mean(gray2, window)
+    var1 = _box_mean(gray1 * gray1, window) - mean1 * mean1
+    var2 = _box_mean(gray2 * gray2, window) - mean2 * mean2
+    covariance = _box_mean(gray1 * gray2, window) - mean1 * mean2
+    return ((2 * mean1 * mean2 + c1) * (2 * covariance + c2) /
+            ((mean1 ** 2 + mean2 ** 2 + c1) * (var1 + var2 + c2)))
+
+
+def ssim(gray1, gray2, window=SSIM_WINDOW):
+    """:returns: (...) array of mean SSIMs, see ssim_map"""
+    return ssim_map(gray1, gray2, window).mean(axis=(-2, -1))
+
+
+def changed_blocks(delta_e, threshold=JND_DELTA_E, block=BLOCK_SIZE):
+    """
+    :param delta_e: (..., height, width) array
+    :returns: (..., ceil(height / block), ceil(width / block)) bool array,
+        whether any pixel of each block differs by more than ``threshold``
+    """
+    height, width = delta_e.shape[-2:]
+    padded = np.pad(delta_e, [(0, 0)] * (delta_e.ndim - 2) +
+                    [(0, -height % block), (0, -width % block)],
+                    mode='constant')
+    rows, columns = padded.shape[-2] // block, padded.shape[-1] // block
+    blocks = padded.reshape(padded.shape[:-2] +
+                            (rows, block, columns, block))
+    return blocks.max(axis=(-3, -1)) > threshold
+
+
+def block_regions(blocks, block=BLOCK_SIZE, shape=None):
+    """
+    Bounding boxes of the connected groups of changed blocks.
+
+    :param blocks: 2d bool array, see changed_blocks
+    :param shape: (height, width) of the image, to clip the boxes to
+    :returns: [(x0, y0, x1, y1)] in pixels, x1 and y1 exclusive
+    """
+    height, width = shape or (blocks.shape[0] * block,
+                              blocks.shape[1] * block)
+    seen = np.zeros_like(blocks)
+    regions = []
+    for row, column in zip(*np.nonzero(blocks)):
+        if seen[row, column]:
+            continue
+        seen[row, column] = True
+        stack = [(row, column)]
+        top, left, bottom, right = row, column, row, column
+        while stack:
+            r, c = stack.pop()
+            top, bottom = min(top, r), max(bottom, r)
+            left, right = min(left, c), max(right, c)
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < blocks.shape[0] and \
+                        0 <= nc < blocks.shape[1] and \
+                        blocks[nr, nc] and not seen[nr, nc]:
+                    seen[nr, nc] = True
+                    stack.append((nr, nc))
+        regions.append((int(left * block), int(top * block),
+                        int(min((right + 1) * block, width)),
+                        int(min((bottom + 1) * block, height))))
+    return regions
+
+
+def _mean_ssim(first, second, differs, window):
+    """
+    Mean SSIM of two (height, width, 4) frames, computed only around the
+    pixels that differ: windows of identical pixels have an index of 1.
+    """
+    rows, columns = np.nonzero(differs.any(axis=1))[0], \
+        np.nonzero(differs.any(axis=0))[0]
+    height, width = differs.shape
+    windows = (height - window + 1) * (width - window + 1)
+    if not len(rows) or windows <= 0:
+        return 1.0
+    top, bottom = max(rows[0] - window + 1, 0), min(rows[-1] + window, height)
+    left, right = max(columns[0] - window + 1, 0), \
+        min(columns[-1] + window, width)
+    crop1 = luminance(composite_on_white(first[top:bottom, left:right]))
+    crop2 = luminance(composite_on_white(second[top:bottom, left:right]))
+    index = ssim_map(crop1, crop2, window)
+    return float((index.sum() + windows - index.size) / windows)
+
+
+def _compare_stack(first, second, threshold, block, window, keep_heatmaps):
+    """
+    :param first, second: (n, height, width, 4) uint8 arrays
+    :returns: [dict] of Comparison fields, one per pair
+    """
+    # Style changes tend to leave most pixels alone; colors are only
+    # converted where they differ
+    differs = (first != second).any(axis=-1)
+    delta_e = np.zeros(differs.shape, dtype=np.float32)
+    delta_e[differs] = delta_e_map(composite_on_white(first[differs]),
+                                   composite_on_white(second[differs]))
+    blocks = changed_blocks(delta_e, threshold, block)
+    above = (delta_e > threshold).mean(axis=(-2, -1))
+    results = []
+    for idx in range(len(first)):
+        max_delta_e = float(delta_e[idx].max())
+        results.append({
+            'changed': max_delta_e > threshold,
+            'ssim': _mean_ssim(first[idx], second[idx], differs[idx],
+                               window),
+            'mean_delta_e': float(delta_e[idx].mean()),
+            'max_delta_e': max_delta_e,
+            'changed_fraction': float(above[idx]),
+            'regions': block_regions(blocks[idx], block,
+                                     delta_e.shape[-2:]),
+            'heatmap': delta_e[idx] if keep_heatmaps else None,
+        })
+    return results
+
+
+def _unchanged(shape, keep_heatmaps):
+    return {'changed': False, 'ssim': 1.0, 'mean_delta_e': 0.0,
+            'max_delta_e': 0.0, 'changed_fraction': 0.0, 'regions': [],
+            'heatmap': np.zeros(shape, np.float32) if keep_heatmaps
+                       else None}
+
+
+def _resized(shape1, shape2):
+    height, width = max(shape1[0], shape2[0]), max(shape1[1], shape2[1])
+    return {'changed': True, 'ssim': 0.0, 'mean_delta_e': float('nan'),
+            'max_delta_e': float('nan'), 'changed_fraction': 1.0,
+            'regions': [(0, 0, width, height)], 'heatmap': None}
+
+
+def compare_frames(pairs, threshold=JND_DELTA_E, block=BLOCK_SIZE,
+                   window=SSIM_WINDOW, keep_heatmaps=False,
+                   chunk_size=CHUNK_SIZE):
+    """
+    Compare many pairs of frames at once.
+
+    :param pairs: [(baseline RenderedFrame, RenderedFrame)]
+    :param keep_heatmaps: bool, include the (height, width) delta E arrays
+    :returns: [dict] of the Comparison fields besides style and callback,
+        in the order of ``pairs``. Pairs of frames of different size are
+        changed throughout.
+    """
+    results = [None] * len(pairs)
+    by_shape = {}
+    for idx, (first, second) in enumerate(pairs):
+        shape1 = (first.height, first.width)
+        shape2 = (second.height, second.width)
+        if shape1 != shape2:
+            results[idx] = _resized(shape1, shape2)
+        elif bytes(first.buffer) == bytes(second.buffer):
+            results[idx] = _unchanged(shape1, keep_heatmaps)
+        else:
+            by_shape.setdefault(shape1, []).append(idx)
+    for indices in by_shape.values():
+        for start in range(0, len(indices), chunk_size):
+            chunk = indices[start:start + chunk_size]
+            first = np.stack([frame_array(pairs[idx][0]) for idx in chunk])
+            second = np.stack([frame_array(pairs[idx][1]) for idx in chunk])
+            compared = _compare_stack(first, second, threshold, block,
+                                      window, keep_heatmaps)
+            for idx, result in zip(chunk, compared):
+                results[idx] = result
+    return results
+
+
+def render_pixels(rc, callback_spec, figsize=None, dpi=None):
+    """
+    Worker job.
+
+    :returns: (RGBA bytes, width, height, dpi)
+    """
+    canvas = draw_figure(rc, resolve_callback(callback_spec), figsize, dpi)
+    width, height = map(int, canvas.get_width_height())
+    return bytes(canvas.buffer_rgba()), width, height, canvas.figure.dpi
+
+
+def render_frames(jobs, figsize=None, dpi=None, max_workers=None):
+    """
+    :param jobs: [(rc, callback spec)]
+    :returns: [RenderedFrame] in the order of ``jobs``
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(render_pixels, rc, callback_spec,
+                                   figsize, dpi)
+                   for rc, callback_spec in jobs]
+        frames = []
+        for future in futures:
+            pixels, width, height, frame_dpi = future.result()
+            frames.append(RenderedFrame(width, height, pixels,
+                                        dpi=frame_dpi))
+    return frames
+
+
+def compare_styles(baseline, styles, callbacks=None, figsize=None, dpi=None,
+                   threshold=JND_DELTA_E, block=BLOCK_SIZE,
+                   keep_heatmaps=False, max_workers=None):
+    """
+    Compare styles to a baseline style with every sample callback.
+
+    :param baseline: {param: value}
+    :param styles: {style name: {param: value}}
+    :param callbacks: [str], sample names or 'module:function' specs
+        (default: all samples)
+    :returns: [Comparison], by style and then callback
+    """
+    callbacks = list(callbacks or SAMPLES)
+    names = sorted(styles)
+    jobs = [(baseline, callback_spec) for callback_spec in callbacks]
+    jobs.extend((styles[name], callback_spec)
+                for name in names for callback_spec in callbacks)
+    frames = render_frames(jobs, figsize, dpi, max_workers)
+    baseline_frames = frames[:len(callbacks)]
+    pairs, labels = [], []
+    for style_idx, name in enumerate(names):
+        offset = len(callbacks) * (style_idx + 1)
+        for callback_idx, callback_spec in enumerate(callbacks):
+            pairs.append((baseline_frames[callback_idx],
+                          frames[offset + callback_idx]))
+            labels.append((name, callback_spec))
+    results = compare_frames(pairs, threshold, block,
+                             keep_heatmaps=keep_heatmaps)
+    return [Comparison(style=name, callback=callback_spec, **result)
+            for (name, callback_spec), result in zip(labels, results)]
+
+
+def format_comparison(comparison):
+    if not comparison.changed:
+        return '{} / {}: unchanged'.format(comparison.style,
+                                           comparison.callback)
+    return ('{} / {}: changed, SSIM {:.4f}, delta E mean {:.2f} max {:.1f}, '
+            '{:.1%} of pixels in {} regions').format(
+        comparison.style, comparison.callback, comparison.ssim,
+        comparison.mean_delta_e, comparison.max_delta_e,
+        comparison.changed_fraction, len(comparison.regions)
+    )
+
+
+def comparison_json(comparison):
+    """
+    :returns: dict of a comparison's fields besides the heatmap, with the
+        undefined (NaN) delta Es of frames of different size as None
+    """
+    fields = comparison._replace(heatmap=None)._asdict()
+    for name, value in fields.items():
+        if isinstance(value, float) and math.isnan(value):
+            fields[name] = None
+    return fields
+
+
+def save_heatmap(comparison, path, threshold=JND_DELTA_E):
+    """Write the delta E heatmap of a comparison as an image"""
+    import matplotlib.image
+    heatmap = comparison.heatmap
+    matplotlib.image.imsave(path, heatmap, cmap='inferno', vmin=0,
+                            vmax=max(float(heatmap.max()), threshold))
+
+
+def main(argv=None):
+    from mpl_style_builder.batch import load_style
+
+    parser = argparse.ArgumentParser(
+        description='Compare the sample plots of styles to a baseline style'
+    )
+    parser.add_argument('baseline',
+                        help='.mplstyle file or library style name')
+    parser.add_argument('styles', nargs='+',
+                        help='.mplstyle files or library style names')
+    parser.add_argument('-c', '--callback', action='append', dest='callbacks',
+                        help="sample name or 'module:function' "
+                             "(repeatable, default: all samples)")
+    parser.add_argument('--dpi', type=float, default=None)
+    parser.add_argument('-t', '--threshold', type=float, default=JND_DELTA_E,
+                        help='delta E above which a pixel counts as changed')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--heatmaps', metavar='DIR',
+                        help='write delta E heatmaps of changed pairs here')
+    parser.add_argument('--json', action='store_true',
+                        help='print comparisons as json')
+    args = parser.parse_args(argv)
+    try:
+        _name, baseline = load_style(args.baseline)
+        styles = dict(load_style(spec) for spec in args.styles)
+    except ValueError as exc:
+        parser.error(str(exc))
+    started = time.time()
+    comparisons = compare_styles(baseline, styles, args.callbacks,
+                                 dpi=args.dpi, threshold=args.threshold,
+                                 keep_heatmaps=bool(args.heatmaps),
+                                 max_workers=args.jobs)
+    elapsed = time.time() - started
+    if args.heatmaps:
+        for comparison in comparisons:
+            if not comparison.changed or comparison.heatmap is None:
+                continue
+            directory = os.path.join(args.heatmaps, comparison.style)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            save_heatmap(comparison, os.path.join(
+                directory, callback_name(comparison.callback) + '.png'
+            ), args.threshold)
+    if args.json:
+        json.dump([comparison_json(comparison) for comparison in comparisons],
+                  sys.stdout, indent=1, allow_nan=False)
+        print()
+    else:
+        for comparison in comparisons:
+            print(format_comparison(comparison))
+            for region in comparison.regions:
+                print('    x {}-{}, y {}-{}'.format(region[0], region[2],
+                                                   region[1], region[3]))
+    changed = sum(comparison.changed for comparison in comparisons)
+    print('{} of {} pairs changed, rendered and compared in {:.1f}s'.format(
+        changed, len(comparisons), elapsed), file=sys.stderr)
+    return 1 if changed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Timing of render stages and detection of GUI event loop stalls.
+
+Spans and events are kept in a bounded buffer and can be exported in the
+Chrome trace event format, viewable in chrome://tracing or Perfetto.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from matplotlib.backends.qt_compat import QtCore, is_pyqt5
+
+import logging
+logger = logging.getLogger('instrumentation')
+
+if is_pyqt5():
+    from PyQt5.QtCore import pyqtSignal
+else:
+    from PyQt4.QtCore import pyqtSignal
+
+
+class Tracer(object):
+    def __init__(self, max_events=20000):
+        self.events = deque(maxlen=max_events)
+        self.last_durations = {}  # span name -> seconds, latest occurrence
+        self._pid = os.getpid()
+
+    def _timestamp_us(self, seconds):
+        return int(seconds * 1e6)
+
+    @contextmanager
+    def span(self, name, **args):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, started, time.time() - started, **args)
+
+    def add_span(self, name, started, duration, **args):
+        """Record a span measured elsewhere, e.g. in a render worker"""
+        self.last_durations[name] = duration
+        self.events.append({
+            'name': name,
+            'ph': 'X',
+            'ts': self._timestamp_us(started),
+            'dur': self._timestamp_us(duration),
+            'pid': self._pid,
+            'tid': threading.current_thread().ident,
+            'args': args,
+        })
+
+    def forget_durations(self, prefix):
+        for name in list(self.last_durations):
+            if name.startswith(prefix):
+                del self.last_durations[name]
+
+    def instant(self, name, **args):
+        self.events.append({
+            'name': name,
+            'ph': 'i',
+            's': 'p',
+            'ts': self._timestamp_us(time.time()),
+            'pid': self._pid,
+            'tid': threading.current_thread().ident,
+            'args': args,
+        })
+
+    def export(self, path):
+        with open(path, 'w') as fh:
+            json.dump({'traceEvents': list(self.events),
+                       'displayTimeUnit': 'ms'}, fh)
+        logger.info('Exported %d trace events to %s', len(self.events), path)
+
+
+class StallMonitor(QtCore.QObject):
+    """
+    Watchdog of the event loop: a timer ticking every ``interval_ms``
+    which, when it fires more than ``threshold_ms`` late, records a stall
+    and blames the latest param change noted, if any. A change is blamed
+    until the tick after render_done(), as the render of a change is
+    coalesced and may start well after it.
+    """
+    sig_stall = pyqtSignal(float, object)  # seconds, param or None
+
+    def __init__(self, tracer, threshold_ms=200, interval_ms=50, parent=None,
+                 max_stalls=1000):
+        super(StallMonitor, self).__init__(parent)
+        self.tracer = tracer
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.stalls = deque(maxlen=max_stalls)  # (timestamp, seconds, param)
+        self._pending_change = None
+        self._change_rendered = False
+        self._last_tick = None
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        self._last_tick = time.time()
+        self._timer.start(self.interval_ms)
+
+    def stop(self):
+        self._timer.stop()
+
+    def note_change(self, param):
+        self._pending_change = param
+        self._change_rendered = False
+
+    def render_done(self):
+        """
+        The render of the noted change finished; stalls it caused are only
+        detected by the next tick, which is the last to blame it.
+        """
+        self._change_rendered = True
+
+    def _tick(self):
+        now = time.time()
+        late_s = now - self._last_tick - self.interval_ms / 1000
+        self._last_tick = now
+        cause = self._pending_change
+        if self._change_rendered:
+            self._pending_change, self._change_rendered = None, False
+        if late_s * 1000 < self.threshold_ms:
+            return
+        self.stalls.append((now, late_s, cause))
+        self.tracer.add_span('stall', now - late_s, late_s, param=cause)
+        logger.debug('Event loop stalled %.0f ms (after change of %s)',
+                     late_s * 1000, cause)
+        self.sig_stall.emit(late_s, cause)
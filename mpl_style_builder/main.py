@@ -1,21 +1,23 @@
 from __future__ import print_function, division, unicode_literals
 
+import time
+_import_started = time.time()  # for the time-to-first-window metric
+
 import os
 import sys
 import re
+import json
+import itertools
+import threading
 
 from collections import OrderedDict
 from operator import itemgetter
-from itertools import chain
-
-# 3rd-party library imports
-import yaml
+from concurrent.futures import ThreadPoolExecutor
 
 
 # Matplotlib and Qt imports
 import matplotlib
 import matplotlib as mpl
-import matplotlib.pyplot
 
 from matplotlib.figure import Figure
 from matplotlib.backend_bases import key_press_handler
@@ -42,6 +44,39 @@ from mpl_style_builder.param_widgets import (
     SliderParam,
     ColorParam,
 )
+from mpl_style_builder.param_model import (
+    ParamTableModel,
+    ParamDelegate,
+    ParamTableView,
+)
+from mpl_style_builder.render_scheduler import RenderScheduler
+from mpl_style_builder.search_index import ParamSearchIndex
+from mpl_style_builder.restyle import (
+    restyle_figure,
+    reset_figure,
+    can_restyle,
+    changed_keys,
+    known_rc,
+)
+from mpl_style_builder.frame_view import FrameView, GalleryView
+from mpl_style_builder.frames import RenderedFrame, render_frame, draft_rc
+from mpl_style_builder.preview_cache import PreviewCache, cache_key
+from mpl_style_builder.rc_tracing import (
+    RcTraces,
+    recording_rc_reads,
+    differing_params,
+)
+from mpl_style_builder.session import StyleSession
+from mpl_style_builder.history import StyleHistory
+from mpl_style_builder.samples import (
+    SAMPLES,
+    default_sample_plot,
+    may_read,
+)
+from mpl_style_builder.style_index import StyleIndex
+from mpl_style_builder.instrumentation import Tracer, StallMonitor
+from mpl_style_builder.memory import MemoryTracker
+from mpl_style_builder.stylefile import write_text_atomic
 
 
 # Logging
@@ -65,26 +100,6 @@ linestyle_dict =  OrderedDict([
     ('draw nothing', 'None'),
 ])
 
-from datetime import datetime
-
-def default_sample_plot(fig):
-    yvals = [0, 100,  10, 100,  10,  10]
-    xvals = list(map(
-        datetime.utcfromtimestamp,
-        [ 0,  30,  31,  45,  46, 300]
-    ))
-    ax = fig.add_subplot(121)
-    ax2 = fig.add_subplot(122)
-    ret = ax.plot([y**2 for y in range(9)],
-                  label='myline')
-    ax=fig.axes[0]
-#     ax.grid(True)
-    ax.legend()
-    ax.set_title('The graph title')
-    ax.set_xlabel('the xlabel')
-    ax2.plot(xvals, yvals)
-
-
 def QString2pyunicode(qs):
     if not isinstance(qs, str):
         return str(qs.toAscii()).decode('utf8')
@@ -93,8 +108,18 @@ def QString2pyunicode(qs):
 
 
 class StyleBuilderMainWidget(QtWidgets.QWidget):
-    def __init__(self, plot_callback=None):
+    sig_frame_ready = pyqtSignal(object, object, int)  # key, frame, serial
+    sig_tile_ready = pyqtSignal(object, object, object)  # name, key, frame
+    sig_stylelist_changed = pyqtSignal()
+
+    def __init__(self, plot_callback=None, min_frame_interval=40,
+                 background_render=False, preview_dpi=100,
+                 preview_cache_bytes=128 * 2**20, preview_cache_dir=None,
+                 stall_threshold_ms=200, preview_decimation=None,
+                 settle_ms=None, draft_dpi=50, render_server=None,
+                 gallery=None):
         super(StyleBuilderMainWidget, self).__init__()
+        self.tracer = Tracer()
         self.setMinimumSize(600, 400)
         self.setLayout(QtWidgets.QVBoxLayout())
 
@@ -124,7 +149,21 @@ class StyleBuilderMainWidget(QtWidgets.QWidget):
                 str(self.mplstyle_combobox.currentText())
             )
         )
+        # Style files are indexed, and saved, on a background thread; the
+        # combobox is populated from the persisted index right away
+        self.style_index = StyleIndex()
+        # Queried with '?' in the filter box, e.g. '?font.size>12'; opened
+        # on first use, see style_store
+        self._style_store = None
+        self._style_store_lock = threading.Lock()
+        self._style_filter = None  # style names matching the query, if any
+        self._style_io = ThreadPoolExecutor(max_workers=1)
+        self.style_watcher = QtCore.QFileSystemWatcher(self)
+        self.style_watcher.directoryChanged.connect(self.refresh_style_index)
+        self.style_watcher.fileChanged.connect(self.refresh_style_index)
+        self.sig_stylelist_changed.connect(self.repopulate_stylelist)
         self.repopulate_stylelist()
+        self.refresh_style_index()
 
         self.save_button = QtWidgets.QPushButton('Save new')
         self.top.layout().addWidget(self.save_button)
@@ -144,28 +183,157 @@ class StyleBuilderMainWidget(QtWidgets.QWidget):
         self.fig_widget.setLayout(QtWidgets.QVBoxLayout())
         self.fig_widget.show()
 
-        self.prop_frame = QtWidgets.QFrame()
-        self.prop_frame.setLayout( QtWidgets.QVBoxLayout() )
-        self.prop_frame.layout().addStretch()
-
-        self.scroll_area = QtWidgets.QScrollArea()
-        self.scroll_area.setWidget(self.prop_frame)
-        self.scroll_area.setWidgetResizable(True)
-        self.lower_frame.layout().addWidget(self.scroll_area, stretch=10)
-
         self.plot_callback = plot_callback
-        self.prop_widgets = {}
-        self.prevent_figure_update = False
-        rc_yaml_path = os.path.join(os.path.dirname(__file__), 'rcParams.yaml')
-        with open(rc_yaml_path) as fh:
-            self.categorized_params = yaml.safe_load(fh)
-        self.params = dict(chain.from_iterable(
-            [subdict.items() for subdict in self.categorized_params.values()]
-        ))
+        # Large arrays are reduced for the preview only, see decimate.py;
+        # export_figure() renders plot_callback at full fidelity
+        self.preview_callback = plot_callback
+        if preview_decimation:
+            from mpl_style_builder.decimate import DecimatingCallback
+            self.preview_callback = DecimatingCallback(plot_callback,
+                                                       preview_decimation)
+        # A single figure and canvas are reused for all inline previews,
+        # only replaced when figure.dpi changes
+        self.fig = None
+        self.fig_canvas = None
+        self._fig_dpi = None  # figure.dpi self.fig was created with
+        self._fig_changed = {}  # the changed-state self.fig was drawn with
+        self._fig_reads = frozenset()  # rcParams read building self.fig
+        self.memory_tracker = MemoryTracker()
+        self.preview_dpi = preview_dpi
+        self.draft_dpi = draft_dpi
+        # Every render gets a serial; drafts older than the latest final
+        # frame shown are dropped when they arrive
+        self._render_serials = itertools.count(1)
+        self._shown_final_serial = 0
+        self.preview_cache = PreviewCache(max_bytes=preview_cache_bytes,
+                                          disk_dir=preview_cache_dir)
+        # The rcParams read by each render; edits to params the shown frame
+        # did not read are not rendered, see rc_tracing
+        self.rc_traces = RcTraces()
+        self._shown_key = None  # key of the final frame shown, if any
+        self.skipped_render_count = 0
+        self.frame_view = FrameView()
+        self.fig_widget.layout().addWidget(self.frame_view)
+        self.render_pool = None
+        if render_server:
+            from mpl_style_builder.render_pool import RemoteRenderPool
+            self.render_pool = RemoteRenderPool(render_server)
+        elif background_render:
+            from mpl_style_builder.render_pool import RenderWorkerPool
+            self.render_pool = RenderWorkerPool()
+        # With a gallery, the preview is a grid of samples (names from
+        # samples.SAMPLES) rendered concurrently, each on its own; an edit
+        # only re-renders the samples which read the params it changed
+        self.gallery = OrderedDict((name, SAMPLES[name])
+                                   for name in gallery or ())
+        self._tile_keys = {}  # tile name -> key of its latest render
+        # tile name -> (key, changed, extra) of its latest render if that
+        # was not traced, e.g. by a render server not reporting reads
+        self._untraced_tiles = {}
+        self.gallery_view = None
+        if self.gallery:
+            if self.render_pool is None:
+                from mpl_style_builder.render_pool import RenderWorkerPool
+                self.render_pool = RenderWorkerPool()
+            self.frame_view.hide()
+            self.gallery_view = GalleryView(list(self.gallery))
+            self.fig_widget.layout().addWidget(self.gallery_view)
+            self.gallery_view.sig_resized.connect(self.plot_with_changed)
+            self.sig_tile_ready.connect(self._tile_rendered)
+        elif self.render_pool is not None:
+            self.frame_view.sig_resized.connect(self.plot_with_changed)
+            self.sig_frame_ready.connect(self._frame_rendered)
+        else:
+            self.frame_view.hide()
+        # With settle_ms, edits in quick succession, like slider drags, are
+        # previewed by low resolution drafts until input has been idle for
+        # settle_ms
+        self.render_scheduler = RenderScheduler(
+            self._render_changed,
+            min_interval_ms=min_frame_interval,
+            parent=self,
+            draft_func=self._render_draft if settle_ms is not None else None,
+            settle_ms=settle_ms,
+        )
+        # The widget is a view over the session, which owns the schema and
+        # the changed params
+        self.session = StyleSession()
+        self.session.listeners.append(self._session_changed)
+        self.categorized_params = self.session.categorized_params
+        self.params = self.session.params
+        self.changed = self.session.changed
+        # Ctrl+Z / Ctrl+Shift+Z step through every state of the session
+        self.history = StyleHistory(self.session)
+        self.search_index = ParamSearchIndex(self.params)
         self.currently_displayed = []
-        self.changed = {}
 
+        self.param_model = ParamTableModel(self.params, self.changed)
+        self.param_model.sig_param_updated.connect(self.value_updated)
+        self.param_model.sig_reset_requested.connect(self.reset_param)
+        self.param_view = ParamTableView(
+            self.param_model,
+            ParamDelegate(self.construct_widget)
+        )
+        self.lower_frame.layout().addWidget(self.param_view, stretch=10)
+        # The color audit imports numpy, so it first runs once the event
+        # loop is up
+        self.color_params = None
+        QtCore.QTimer.singleShot(0, self.audit_colors)
+
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.setToolTip('Render timings and event loop stalls. '
+                                     'Ctrl+Shift+T exports a trace.')
+        self.layout().addWidget(self.status_label)
+        self.stall_monitor = StallMonitor(self.tracer,
+                                          threshold_ms=stall_threshold_ms,
+                                          parent=self)
+        self.stall_monitor.sig_stall.connect(self.update_status)
+        # Drafts are followed by the final render of the same change
+        self.render_scheduler.sig_rendered.connect(
+            lambda draft: draft or self.stall_monitor.render_done()
+        )
+        self.stall_monitor.start()
+        self.export_trace_shortcut = QtWidgets.QShortcut(
+            QtGui.QKeySequence('Ctrl+Shift+T'), self
+        )
+        self.export_trace_shortcut.activated.connect(self.export_trace)
+        self.undo_shortcut = QtWidgets.QShortcut(
+            QtGui.QKeySequence('Ctrl+Z'), self
+        )
+        self.undo_shortcut.activated.connect(self.undo)
+        self.redo_shortcut = QtWidgets.QShortcut(
+            QtGui.QKeySequence('Ctrl+Shift+Z'), self
+        )
+        self.redo_shortcut.activated.connect(self.redo)
+
+        self.startup_metrics = {}
         self.show()
+        # Runs once the event loop has processed the show
+        QtCore.QTimer.singleShot(
+            0, lambda: self._record_startup_metric('time_to_first_window')
+        )
+
+    def _record_startup_metric(self, name):
+        """
+        Seconds since this module was imported, logged and, if the
+        environment variable MPL_STYLE_BUILDER_METRICS names a file,
+        appended to it as a json line.
+        """
+        if name in self.startup_metrics:
+            return
+        seconds = time.time() - _import_started
+        self.startup_metrics[name] = seconds
+        self.tracer.instant(name, seconds=seconds)
+        logger.info('%s: %.3fs', name, seconds)
+        metrics_path = os.environ.get('MPL_STYLE_BUILDER_METRICS')
+        if metrics_path:
+            with open(metrics_path, 'a') as fh:
+                fh.write(json.dumps({
+                    'metric': name,
+                    'seconds': seconds,
+                    'timestamp': time.time(),
+                    'matplotlib': mpl.__version__,
+                }) + '\n')
 
     def build_tree(self):
         for category, pdict in sorted(self.categorized_params.items()):
@@ -179,50 +347,96 @@ class StyleBuilderMainWidget(QtWidgets.QWidget):
         self.plot_with_changed()
 
     def filtration_changed(self, text):
-        spaced_separated = QString2pyunicode(text).split(' ')
-        if not spaced_separated:
-            return
-        matching_first = self.params_matching(substr=spaced_separated[0])
-        filtered_final = []
-        for item in matching_first:
-            if all(tok in item for tok in spaced_separated[1:]):
-                filtered_final.append(item)
-            else:
-                continue
-        self.display_list(
-            sorted(filtered_final)
-        )
+        text = QString2pyunicode(text)
+        if text.startswith('?'):
+            return self.query_styles(text[1:])
+        if self._style_filter is not None:
+            self._style_filter = None
+            self.repopulate_stylelist()
+        self.display_list(self.search_index.search(text))
+
+    def query_styles(self, query):
+        """
+        Limit the style combobox to the styles matching a StyleStore query
+        and list the queried params.
+        """
+        from mpl_style_builder.style_store import parse_query
+        try:
+            conditions = parse_query(query)
+        except ValueError:
+            return  # incomplete while typing
+        matches = self.style_store.query(conditions)
+        self._style_filter = set(name for name, _path in matches)
+        self.repopulate_stylelist()
+        self.display_list([condition.param for condition in conditions
+                           if condition.param in self.params])
+        self.status_label.setText('{} styles match {}'.format(
+            len(self._style_filter), query.strip()
+        ))
+
+    @property
+    def style_store(self):
+        """The StyleStore, opened on first use from either thread"""
+        with self._style_store_lock:
+            if self._style_store is None:
+                from mpl_style_builder.style_store import StyleStore
+                self._style_store = StyleStore()
+            return self._style_store
+
+    def refresh_style_index(self, _changed_path=None):
+        self._in_style_io(self._refresh_style_library)
+
+    def _refresh_style_library(self):
+        changed = self.style_index.refresh()
+        self.style_store.refresh()
+        return changed
+
+    def _in_style_io(self, func, *args):
+        """Run func in the style io thread, repopulate if it returns True"""
+        def done(future):
+            try:
+                if future.result():
+                    # Queued to the GUI thread
+                    self.sig_stylelist_changed.emit()
+            except Exception:
+                logger.exception('Style library update failed')
+        self._style_io.submit(func, *args).add_done_callback(done)
+
+    def _watch_style_files(self):
+        paths = [directory for directory in self.style_index.dirs
+                 if os.path.isdir(directory)]
+        paths.extend(self.style_index.style_files())
+        watched = set(self.style_watcher.directories()) | \
+            set(self.style_watcher.files())
+        new_paths = [path for path in paths if path not in watched]
+        if new_paths:
+            self.style_watcher.addPaths(new_paths)
 
     def repopulate_stylelist(self):
         current_choice = self.mplstyle_combobox.currentText()
-        self.mplstyle_combobox.clear()
-        mpl.pyplot.style.reload_library()
-        items = ['<Load mplstyle>'] + mpl.pyplot.style.available
+        available = self.style_index.available
+        if self._style_filter is not None:
+            available = [name for name in available
+                         if name in self._style_filter]
+        items = ['<Load mplstyle>'] + available
         try:
             current_idx = items.index(str(current_choice))
         except ValueError:
             current_idx = 0
+        # Repopulating must not (re)load the current choice
+        self.mplstyle_combobox.blockSignals(True)
+        self.mplstyle_combobox.clear()
         self.mplstyle_combobox.addItems(items)
         self.mplstyle_combobox.setCurrentIndex(current_idx)
+        self.mplstyle_combobox.blockSignals(False)
+        self._watch_style_files()
 
     def load_mplstyle(self, name):
-        rcparams = mpl.pyplot.style.library.get(name)
+        rcparams = self.style_index.get(name)
         if rcparams is None:
             logger.debug('mplstyle not found %s', name)
             return
-        any_unrecognized = set(rcparams) - set(self.params)
-        if any_unrecognized:
-            logger.error('Unrecognized params in mplstyle %s: %s',
-                          name,
-                          any_unrecognized)
-            return
-        self.display_list(list(rcparams))
-        self.prevent_figure_update = True  # FIXME this should be a lock
-        for param, value in rcparams.items():
-            logger.debug('Loaded from style %s: (%s: %s)', name, param, value)
-            self.prop_widgets[param].set_value(value)
-        self.prevent_figure_update = False
-        self.plot_with_changed()
+        self.display_list(self.session.load_style(rcparams, name))
 
     def params_matching(self, substr=None, regex=None):
         if regex is None:
@@ -235,26 +449,11 @@ class StyleBuilderMainWidget(QtWidgets.QWidget):
         return matching
 
     def display_list(self, params):
-        self.hide_all_current_params()
         logger.debug('Displaying %s', params)
-        for param in params[::-1]:  # Reverse because inserting at top
-            assert param in self.params
-            if param not in self.prop_widgets:
-                self.prop_widgets[param] = self.widget_from_prop(
-                    param,
-                    self.params[param]
-                )
-            # Inserting to keep spacer at bottom
-            self.prop_frame.layout().insertWidget(0, self.prop_widgets[param])
-            self.prop_widgets[param].show()
-        self.currently_displayed = [self.prop_widgets[x] for x in params]
-
-    def hide_all_current_params(self):
-        # TODO should probably use a formlayout and properly remove / add
-        # widgets in order to have control of order
-        for idx in range(self.prop_frame.layout().count() - 1): # sub -1 b/c spacer
-            child = self.prop_frame.layout().takeAt(0)
-            child.widget().hide()
+        assert all(param in self.params for param in params)
+        with self.tracer.span('display_list', params=len(params)):
+            self.param_model.set_rows(params)
+        self.currently_displayed = list(params)
 
     def tree_item_selected(self):
         selected = self.tw.selectedItems()
@@ -271,20 +470,397 @@ class StyleBuilderMainWidget(QtWidgets.QWidget):
             self.display_list(matching)
 
     def plot_with_changed(self):
-        if self.prevent_figure_update:  # FIXME this should be a lock
+        # Coalesced: renders the latest self.changed once the event loop
+        # gets to it, see RenderScheduler
+        self.render_scheduler.request()
+
+    def _preview_key(self):
+        return cache_key(self.changed, self.preview_callback,
+                         *self._preview_extra())
+
+    def _preview_extra(self):
+        """What the preview depends on besides the rc overrides"""
+        return (self.fig_widget.width(), self.fig_widget.height(),
+                self.preview_dpi)
+
+    def _preview_unaffected(self):
+        """Whether no param the shown frame read has changed since"""
+        return self.rc_traces.unaffected(self._shown_key, self.changed,
+                                         self._preview_extra())
+
+    def _preview_figsize(self):
+        if self.render_pool is None and self.fig is not None:
+            return tuple(self.fig.get_size_inches())
+        return self.frame_view.figsize(self.preview_dpi)
+
+    def _render_changed(self):
+        if self.gallery:
+            return self._render_gallery()
+        if self._preview_unaffected():
+            logger.debug('Changed params are not read by the preview')
+            self.skipped_render_count += 1
+            return
+        self.tracer.forget_durations('render.')
+        serial = next(self._render_serials)
+        with self.tracer.span('render'):
+            key = self._preview_key()
+            with self.tracer.span('render.cache_lookup'):
+                frame = self.preview_cache.get(key)
+            if frame is not None:
+                logger.debug('Preview cache hit')
+                if self.render_pool is not None:
+                    # Superseded, like a cached gallery tile
+                    self.render_pool.cancel('preview')
+                    self.render_pool.cancel('draft')
+                self._shown_final_serial = serial
+                self.history.link_preview(key)
+                self.show_frame(frame, key)
+            elif self.render_pool is not None:
+                self.render_pool.cancel('draft')
+                self._submit_render(key, serial, self.changed,
+                                    self.preview_dpi)
+            else:
+                self._shown_final_serial = serial
+                self._shown_key = key
+                frame, reads = self._draw_preview()
+                self.rc_traces.record(key, self.changed, reads,
+                                      self._preview_extra())
+                self._update_no_effect()
+                self.preview_cache.put(key, frame)
+                self.history.link_preview(key)
+                self._record_startup_metric('time_to_first_preview')
+        self.update_status()
+
+    def _render_draft(self):
+        """
+        Render at draft_dpi with antialiasing and usetex off, shown until
+        the final render once edits settle.
+        """
+        if self.gallery:
+            # Tiles are small and rendered in parallel already
+            return self._render_changed()
+        if self._preview_unaffected():
+            return
+        if self._preview_key() in self.preview_cache:
+            return self._render_changed()
+        if self.render_pool is None and self.fig is not None and \
+                can_restyle(changed_keys(self._fig_changed, self.changed)):
+            # Restyling in place is cheaper than any draft
+            return self._render_changed()
+        self.tracer.forget_durations('render.')
+        serial = next(self._render_serials)
+        with self.tracer.span('render', kind='draft'):
+            if self.render_pool is not None:
+                self._submit_render(None, serial, draft_rc(self.changed),
+                                    self.draft_dpi, kind='draft')
+            else:
+                with self.tracer.span('render.draft'):
+                    frame = render_frame(draft_rc(self.changed),
+                                         self.preview_callback,
+                                         figsize=self._preview_figsize(),
+                                         dpi=self.draft_dpi, kind='draft')
+                self.show_frame(frame)
+        self.update_status()
+
+    def _submit_render(self, key, serial, changed, dpi, kind='final'):
+        submitted = time.time()
+        snapshot, extra = dict(changed), self._preview_extra()
+
+        def on_frame(frame):
+            self.tracer.add_span('render.background', submitted,
+                                 time.time() - submitted, job=frame.job_id,
+                                 kind=kind)
+            if kind == 'final' and frame.rc_reads is not None:
+                self.rc_traces.record(key, snapshot, frame.rc_reads, extra)
+            # Emitted from a pool thread, delivered on the GUI thread
+            self.sig_frame_ready.emit(key, frame, serial)
+        self.render_pool.submit(
+            changed,
+            self.preview_callback,
+            on_frame,
+            figsize=self.frame_view.figsize(self.preview_dpi),
+            dpi=dpi,
+            slot='draft' if kind == 'draft' else 'preview',
+            kind=kind,
+        )
+
+    def _frame_rendered(self, key, frame, serial):
+        if frame.kind == 'draft':
+            if serial < self._shown_final_serial:
+                logger.debug('Dropping draft older than the final frame')
+                frame.release()
+                return
+            self.show_frame(frame)
+        else:
+            self.preview_cache.put(key, frame)
+            if serial < self._shown_final_serial or \
+                    key != self._preview_key():
+                # Delivered before its slot was cancelled, e.g. when a
+                # cached state was shown meanwhile
+                logger.debug('Dropping outdated final frame')
+                frame.release()
+                return
+            self._shown_final_serial = serial
+            self.history.link_preview(key)
+            self._record_startup_metric('time_to_first_preview')
+            self.show_frame(frame, key)
+        self.update_status()
+
+    def _render_gallery(self):
+        """
+        Submit the tiles affected by the changes since their latest render,
+        each to its own pool slot so they render concurrently. Every tile
+        is rendered with all of self.changed.
+        """
+        self.tracer.forget_durations('render.')
+        with self.tracer.span('render', kind='gallery'):
+            changed = dict(self.changed)
+            for name, callback in self.gallery.items():
+                figsize = self.gallery_view.figsize(name, self.preview_dpi)
+                extra = (figsize, self.preview_dpi)
+                key = cache_key(changed, callback, *extra)
+                if self._tile_unaffected(name, callback, changed, extra):
+                    continue
+                self._tile_keys[name] = key
+                frame = self.preview_cache.get(key)
+                if frame is not None:
+                    self.render_pool.cancel('tile:' + name)
+                    self.show_tile(name, frame)
+                else:
+                    self._submit_tile(name, key, changed, callback, figsize)
+        self.update_status()
+
+    def _tile_unaffected(self, name, callback, changed, extra):
+        """
+        Whether rendering tile ``name`` with ``changed`` gives the frame of
+        its latest render: by the params that render read, or if it was not
+        traced, by the sample's declared dependencies.
+        """
+        last_key = self._tile_keys.get(name)
+        if last_key is None:
+            return False
+        if last_key == cache_key(changed, callback, *extra):
+            return True
+        if self.rc_traces.reads(last_key) is not None:
+            return self.rc_traces.unaffected(last_key, changed, extra)
+        untraced = self._untraced_tiles.get(name)
+        if untraced is None or untraced[0] != last_key or \
+                untraced[2] != extra:
+            # Not rendered yet, or rendered at another size
+            return False
+        return not may_read(callback, differing_params(untraced[1], changed))
+
+    def _submit_tile(self, name, key, changed, callback, figsize):
+        submitted = time.time()
+        extra = (figsize, self.preview_dpi)
+
+        def on_frame(frame):
+            self.tracer.add_span('render.background', submitted,
+                                 time.time() - submitted, job=frame.job_id,
+                                 kind='tile', tile=name)
+            if frame.rc_reads is not None:
+                self.rc_traces.record(key, changed, frame.rc_reads, extra)
+            else:
+                self._untraced_tiles[name] = (key, changed, extra)
+            # Emitted from a pool thread, delivered on the GUI thread
+            self.sig_tile_ready.emit(name, key, frame)
+        self.render_pool.submit(changed, callback, on_frame, figsize=figsize,
+                                dpi=self.preview_dpi, slot='tile:' + name)
+
+    def _tile_rendered(self, name, key, frame):
+        self.preview_cache.put(key, frame)
+        if self._tile_keys.get(name) != key:
+            # Superseded by a cache hit while rendering
+            frame.release()
             return
-        with matplotlib.rc_context(self.changed):
-            logger.debug('Updating plot')
-            self.fig = Figure()
-            if hasattr(self, 'fig_canvas'):
-                self.fig_widget.layout().removeWidget(self.fig_canvas)
-            self.fig_canvas = FigureCanvas(self.fig)
+        self.show_tile(name, frame)
+        self._update_no_effect()
+        self._record_startup_metric('time_to_first_preview')
+        self.update_status()
+
+    def show_tile(self, name, frame):
+        self.memory_tracker.track(frame, 'RenderedFrame')
+        self.gallery_view.set_frame(name, frame)
+
+    def update_status(self, *_stall):
+        timings = self.tracer.last_durations
+        stages = ['{} {:.0f}'.format(name.split('.', 1)[1], seconds * 1000)
+                  for name, seconds in sorted(timings.items())
+                  if name.startswith('render.')]
+        text = 'render {:.0f} ms ({})'.format(
+            timings.get('render', 0) * 1000, ', '.join(stages)
+        )
+        if self.memory_tracker.samples:
+            text += ' | rss {:.0f} MB'.format(
+                self.memory_tracker.samples[-1][2] / 2**20
+            )
+        stalls = self.stall_monitor.stalls
+        if stalls:
+            _timestamp, seconds, param = stalls[-1]
+            text += ' | {} stalls, last {:.0f} ms{}'.format(
+                len(stalls), seconds * 1000,
+                ' after changing {}'.format(param) if param else ''
+            )
+        self.status_label.setText(text)
+
+    def export_trace(self, path=None):
+        if path is None:
+            path = QtWidgets.QFileDialog.getSaveFileName(
+                caption='Export trace',
+                directory='mpl_style_builder_trace.json',
+                filter='Trace files (*.json)'
+            )
+            if isinstance(path, tuple):  # PyQt5: (filename, filter)
+                path = path[0]
+            if not path:
+                return
+        self.tracer.export(str(path))
+
+    def _update_no_effect(self):
+        """Mark the params not read by the shown frames in the param panel"""
+        if self.gallery:
+            keys = self._tile_keys.values()
+        else:
+            keys = [self._shown_key]
+        traced = [self.rc_traces.reads(key) for key in keys]
+        if traced and None not in traced:
+            read = frozenset().union(*traced)
+            self.param_model.set_no_effect(
+                param for param in self.params if param not in read
+            )
+
+    def show_frame(self, frame, key=None):
+        """
+        :param key: preview cache key of a final frame, None for drafts
+        """
+        self._shown_key = key
+        if key is not None:
+            self._update_no_effect()
+        self.memory_tracker.track(frame, 'RenderedFrame')
+        self.frame_view.set_frame(frame)
+        if self.fig is not None:
+            self.fig_canvas.hide()
+        self.frame_view.show()
+
+    def _show_canvas(self):
+        self.frame_view.hide()
+        self.frame_view.clear()
+        self.fig_canvas.show()
+
+    def _grab_canvas_frame(self):
+        self.fig_canvas.draw()
+        renderer = self.fig_canvas.get_renderer()
+        return RenderedFrame(int(renderer.width), int(renderer.height),
+                             bytes(self.fig_canvas.buffer_rgba()),
+                             dpi=self.fig.dpi)
+
+    def _restyle_in_place(self):
+        if self.fig is None:
+            return False
+        with self.tracer.span('render.restyle'):
+            restyled = restyle_figure(self.fig, self._fig_changed,
+                                      self.changed)
+        if not restyled:
+            return False
+        logger.debug('Restyled plot in place')
+        self._fig_changed = dict(self.changed)
+        self._show_canvas()
+        return True
+
+    def _draw_preview(self):
+        """
+        Bring self.fig up to date with self.changed, restyling it in place
+        if possible, and draw it within the rc overrides, which params like
+        axes.formatter.* are only read by when drawing.
+
+        :returns: (RenderedFrame, set of the rcParams read)
+        """
+        # Before entering the rc overrides, restyle_figure compares the old
+        # and new ones on top of the global rcParams
+        restyled = self._restyle_in_place()
+        span = self.tracer.span
+        with span('render.rc_context'):
+            rc_context = matplotlib.rc_context(known_rc(self.changed))
+            rc_context.__enter__()  # validates the changed rcParams
+        try:
+            with recording_rc_reads() as reads:
+                if restyled:
+                    # Restyled artists still depend on what creating them
+                    # read
+                    reads.update(self._fig_reads)
+                else:
+                    self._rebuild_figure()
+                    self._fig_reads = frozenset(reads)
+                with span('render.draw'):
+                    frame = self._grab_canvas_frame()
+        finally:
+            rc_context.__exit__(None, None, None)
+        return frame, reads
+
+    def _rebuild_figure(self):
+        """Re-run the plot callback on self.fig, within the rc overrides"""
+        span = self.tracer.span
+        logger.debug('Updating plot')
+        if self.fig is not None and \
+                self._fig_dpi == matplotlib.rcParams['figure.dpi']:
+            with span('render.figure'):
+                reset_figure(self.fig)
+        else:
+            self._replace_figure()
+        with span('render.plot_callback'):
+            self.preview_callback(self.fig)
+        self._fig_changed = dict(self.changed)
+        self._show_canvas()
+        self.memory_tracker.sample(self.render_scheduler.rendered_count)
+
+    def _replace_figure(self):
+        """Create self.fig and its canvas, freeing the previous ones"""
+        span = self.tracer.span
+        if self.fig_canvas is not None:
+            old_canvas, old_fig = self.fig_canvas, self.fig
+            self.fig_widget.layout().removeWidget(old_canvas)
+            old_canvas.setParent(None)
+            old_canvas.deleteLater()
+            old_fig.clear()
+        with span('render.figure'):
+            self.fig = self.memory_tracker.track(Figure(), 'Figure')
+            self._fig_dpi = matplotlib.rcParams['figure.dpi']
+        with span('render.canvas'):
+            self.fig_canvas = self.memory_tracker.track(
+                FigureCanvas(self.fig), 'FigureCanvas'
+            )
             self.fig_widget.layout().addWidget(self.fig_canvas)
-            self.plot_callback(self.fig)
+
+    def export_figure(self, path, dpi=None, figsize=None):
+        """
+        Render the plot with the current style at full fidelity, without
+        preview decimation, and save it to ``path``.
+        """
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        with matplotlib.rc_context(known_rc(self.changed)):
+            fig = Figure(figsize=figsize)
+            FigureCanvasAgg(fig)
+            self.plot_callback(fig)
+            fig.savefig(path, dpi=dpi)
+
+    def closeEvent(self, event):
+        if self.render_pool is not None:
+            self.render_pool.shutdown()
+        self._style_io.shutdown(wait=False)
+        self.stall_monitor.stop()
+        trace_path = os.environ.get('MPL_STYLE_BUILDER_TRACE')
+        if trace_path:
+            self.tracer.export(trace_path)
+        self.frame_view.clear()
+        if self.gallery_view is not None:
+            self.gallery_view.clear()
+        super(StyleBuilderMainWidget, self).closeEvent(event)
 
     def value_updated(self, name, value):
-        self.changed[name] = value
-        self.plot_with_changed()
+        try:
+            self.session.set(name, value)
+        except ValueError as exc:
+            logger.error('Invalid value for %s: %s', name, exc)
 
     def _create_user_stylelib_directory(self):
         user_mpl_dir = os.path.join(
@@ -310,62 +886,79 @@ class StyleBuilderMainWidget(QtWidgets.QWidget):
             ),
             filter=".mplstyle files (*.mplstyle)"
         )
+        if isinstance(filepath, tuple):  # PyQt5: (filename, filter)
+            filepath = filepath[0]
         if not filepath:
             logging.debug('No filepath chosen. Aborting save')
-        else:
-            filepath = str(filepath)
+            return
+        filepath = str(filepath)
         if not filepath.endswith('.mplstyle'):
             filepath = filepath + '.mplstyle'
-        lines = []
-        for param, value in self.changed.items():
-            if value and isinstance(value, str) and value.startswith('#'):
-                value = value[1:]
-            elif isinstance(value, list):
-                if self.params[param]['list_type'] == 'integer':
-                    value = map(int, value)
-                value = ', '.join(map(str, value))
-            lines.append('{}: {}'.format(param, value))
-
-        with open(filepath, 'w') as fh:
-            fh.write('\n'.join(lines))
+        text = self.session.to_mplstyle()
 
-        self.repopulate_stylelist()
+        def write_and_index():
+            write_text_atomic(filepath, text)
+            self.style_store.update_file(filepath)
+            return self.style_index.update_file(filepath)
+        self._in_style_io(write_and_index)
 
-    def reset_all(self):
-        self.prevent_figure_update = True
-        for param in list(self.changed):
-            self.reset_param(param)
-        self.prevent_figure_update = False
+    def batch_update(self):
+        """
+        Apply many param changes as one, rendered once, see
+        StyleSession.transaction
+        """
+        return self.session.transaction()
+
+    def audit_colors(self):
+        """Flag color params with poor contrast or colorblind safety"""
+        from mpl_style_builder.color_audit import (
+            audit_style,
+            color_params_of,
+            issues_by_param,
+        )
+        with self.tracer.span('color_audit'):
+            if self.color_params is None:
+                self.color_params = color_params_of(self.params)
+            issues = audit_style(self.changed, self.color_params)
+        self.param_model.set_warnings(issues_by_param(issues))
+
+    def _session_changed(self, touched):
+        self.param_model.refresh(touched)
+        if self.color_params is not None and (
+                'axes.prop_cycle' in touched or
+                any(param in self.color_params for param in touched)):
+            self.audit_colors()
+        self.stall_monitor.note_change(
+            touched[0] if len(touched) == 1 else
+            '{} params'.format(len(touched))
+        )
         self.plot_with_changed()
 
-    def reset_param(self, param):
-        self.prop_widgets[param].reset_value()
-        if param in self.changed:
-            self.changed.pop(param)
+    def reset_all(self):
+        self.session.reset_all()
 
-    def widget_from_prop(self, name, prop):
-        try:
-            widget = self.construct_widget(name, prop)
-        except Exception:
-            logger.exception('%s %s', name, prop)
-            raise
-        if prop.get('help'):
-            help_label = QtWidgets.QLabel('<b>Help:</b> ' + prop['help'])
-            help_label.setMinimumWidth(200)
-            help_label.setWordWrap(True)
-            widget.layout().addWidget(help_label, stretch=2)
-        button = QtWidgets.QPushButton(name)
-        button.setSizePolicy(QtWidgets.QSizePolicy.Maximum,
-                             QtWidgets.QSizePolicy.Maximum)
-        widget.layout().insertWidget(0, button)
-        button.clicked.connect(lambda: self.reset_param(name))
-        widget.sig_param_updated.connect(self.value_updated)
-        if hasattr(widget.layout, 'addStretch'):
-            widget.layout().addStretch()
+    def undo(self):
+        self._step_history(self.history.undo)
 
-        return widget
+    def redo(self):
+        self._step_history(self.history.redo)
+
+    def _step_history(self, step):
+        entry = step()
+        if entry is None:
+            return
+        logger.info('History %d/%d: %s', self.history.position,
+                    len(self.history.entries) - 1, entry.label)
+        if entry.preview_key is not None and \
+                entry.preview_key in self.preview_cache:
+            # States seen before are shown from the cache right away
+            self.render_scheduler.flush()
+
+    def reset_param(self, param):
+        self.session.reset(param)
 
     def construct_widget(self, name, prop):
+        # Used as editor factory by the param panel's delegate
         if prop['type'] == 'string':
             if len(prop.get('options', [])) > 0:
                 widget = ComboboxParam(name, prop)
@@ -395,7 +988,10 @@ def get_ipython_if_any():
 
 
 class MplStyleBuilder(object):
-    def __init__(self, plot_callback=None, call_exec=False, interactive=True):
+    def __init__(self, plot_callback=None, call_exec=False, interactive=True,
+                 min_frame_interval=40, background_render=False,
+                 preview_cache_dir=None, preview_decimation=None,
+                 settle_ms=None, render_server=None, gallery=None):
         if interactive:
             shell = get_ipython_if_any()
             if shell and not shell._inputhook.__module__.endswith('.qt'):
@@ -407,14 +1003,46 @@ class MplStyleBuilder(object):
         QtGui.qApp = self.app
         if plot_callback is None:
             plot_callback = default_sample_plot
-        self.builder = StyleBuilderMainWidget(plot_callback)
+        self.builder = StyleBuilderMainWidget(
+            plot_callback,
+            min_frame_interval=min_frame_interval,
+            background_render=background_render,
+            preview_cache_dir=preview_cache_dir,
+            preview_decimation=preview_decimation,
+            settle_ms=settle_ms,
+            render_server=render_server,
+            gallery=gallery,
+        )
         self.builder.build_tree()
         if call_exec:
             sys.exit(self.app.exec_())
 
 
-def main():
-    style_builder = MplStyleBuilder(call_exec=True, interactive=False)
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Build matplotlib styles interactively'
+    )
+    parser.add_argument('--background-render', action='store_true',
+                        help='render previews in worker processes')
+    parser.add_argument('--render-server', metavar='URL',
+                        help='render previews on a mpl-style-server, e.g. '
+                             'http://127.0.0.1:8765')
+    parser.add_argument('--gallery', nargs='*', metavar='SAMPLE',
+                        choices=list(SAMPLES),
+                        help='preview a gallery of samples (default: all) '
+                             'instead of a single plot')
+    args = parser.parse_args(argv)
+    gallery = args.gallery
+    if gallery is not None and not gallery:
+        gallery = list(SAMPLES)
+    style_builder = MplStyleBuilder(
+        call_exec=True,
+        interactive=False,
+        background_render=args.background_render,
+        render_server=args.render_server,
+        gallery=gallery,
+    )
     return style_builder
 
 
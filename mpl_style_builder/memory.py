@@ -0,0 +1,85 @@
+"""
+Tracking of process memory and of live preview objects over an editing
+session, to confirm that memory stays flat however many edits are made.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import sys
+import time
+import weakref
+from collections import deque
+
+import logging
+logger = logging.getLogger('memory')
+
+
+def current_rss_bytes():
+    """
+    Resident set size of this process, or its peak where the current one
+    is not available, or None.
+    """
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryTracker(object):
+    """
+    Keeps weak references to tracked objects, by kind, and samples the RSS
+    against a counter such as the number of renders.
+    """
+    def __init__(self, max_samples=10000):
+        self.samples = deque(maxlen=max_samples)  # (timestamp, count, rss)
+        self._live = {}  # kind -> WeakSet
+
+    def track(self, obj, kind=None):
+        kind = kind or type(obj).__name__
+        self._live.setdefault(kind, weakref.WeakSet()).add(obj)
+        return obj
+
+    def live_counts(self):
+        """:returns: {kind: number of tracked objects still alive}"""
+        return dict((kind, len(objs)) for kind, objs in self._live.items())
+
+    def sample(self, count):
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.samples.append((time.time(), count, rss))
+        return rss
+
+    def growth_per_count(self, last=None):
+        """
+        Least squares slope of RSS over the counter, in bytes, over the
+        ``last`` samples (default all); None with fewer than two samples.
+        """
+        samples = list(self.samples)[-last:] if last else list(self.samples)
+        if len(samples) < 2:
+            return None
+        counts = [count for _ts, count, _rss in samples]
+        mean_count = sum(counts) / len(counts)
+        mean_rss = sum(rss for _ts, _count, rss in samples) / len(samples)
+        variance = sum((count - mean_count) ** 2 for count in counts)
+        if not variance:
+            return None
+        return sum((count - mean_count) * (rss - mean_rss)
+                   for _ts, count, rss in samples) / variance
+
+    def report(self):
+        rss = [rss for _ts, _count, rss in self.samples]
+        return {
+            'samples': len(rss),
+            'rss_first': rss[0] if rss else None,
+            'rss_last': rss[-1] if rss else None,
+            'rss_max': max(rss) if rss else None,
+            'growth_per_count': self.growth_per_count(),
+            'live': self.live_counts(),
+        }
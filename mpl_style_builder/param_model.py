@@ -0,0 +1,280 @@
+"""
+Model/view based parameter panel.
+
+Instead of one ParamWidget per displayed param, the panel is a table over a
+model of the displayed param names. The ParamWidget matching the param
+type is only created as an editor for the row being edited and destroyed
+when editing moves on, so the number of live widgets stays constant no
+matter how many params are shown.
+"""
+from __future__ import print_function, division, unicode_literals
+
+from matplotlib.colors import to_rgba
+from matplotlib.backends.qt_compat import QtWidgets, QtCore, QtGui, is_pyqt5
+from matplotlib.backends.qt_editor.formlayout import to_qcolor
+
+import logging
+logger = logging.getLogger('param_model')
+
+if is_pyqt5():
+    from PyQt5.QtCore import pyqtSignal, Qt
+else:
+    from PyQt4.QtCore import pyqtSignal, Qt
+
+
+def format_value(value):
+    if isinstance(value, (list, tuple)):
+        return ', '.join(map(str, value))
+    return str(value)
+
+
+def same_value(prop, first, second):
+    """
+    Whether two values of a param are equal, allowing for how its editor
+    encodes them, e.g. ``'#000000ff'`` for ``'k'`` or ``'None'`` for None.
+    Floats are compared at the resolution of SliderParam.
+    """
+    if first == second:
+        return True
+    if prop['type'] == 'float':
+        try:
+            return '%.2f' % float(first) == '%.2f' % float(second)
+        except (TypeError, ValueError):
+            pass
+    elif prop['type'] == 'colorstring':
+        try:
+            return to_rgba(str(first)) == to_rgba(str(second))
+        except ValueError:
+            pass
+    return format_value(first) == format_value(second)
+
+
+class ParamTableModel(QtCore.QAbstractTableModel):
+    NAME, VALUE, HELP = range(3)
+    headers = ('Param (click to reset)', 'Value', 'Help')
+
+    sig_param_updated = pyqtSignal(object, object)
+    sig_reset_requested = pyqtSignal(object)
+
+    def __init__(self, params, changed, parent=None):
+        """
+        :param params: {name: prop}, the rcParams schema
+        :param changed: {name: value}, current overrides; read, not written
+        """
+        super(ParamTableModel, self).__init__(parent)
+        self.params = params
+        self.changed = changed
+        self.rows = []
+        self._row_of = {}
+        self.warnings = {}  # name -> [message], e.g. from the color audit
+        self.no_effect = frozenset()  # names the preview does not read
+
+    def set_rows(self, names):
+        self.beginResetModel()
+        self.rows = list(names)
+        self._row_of = dict((name, row) for row, name in enumerate(self.rows))
+        self.endResetModel()
+
+    def name_at(self, row):
+        return self.rows[row]
+
+    def value(self, name):
+        if name in self.changed:
+            return self.changed[name]
+        return self.params[name]['default']
+
+    def refresh(self, names=None):
+        """Signal views that the values of ``names`` (default all) changed."""
+        if names is None:
+            rows = range(len(self.rows))
+        else:
+            rows = [self._row_of[name] for name in names
+                    if name in self._row_of]
+        for row in rows:
+            self.dataChanged.emit(self.index(row, self.NAME),
+                                  self.index(row, self.HELP))
+
+    def set_warnings(self, warnings):
+        """
+        :param warnings: {name: [message]}, replacing the current ones
+        """
+        touched = set(warnings) | set(self.warnings)
+        self.warnings = warnings
+        self.refresh(touched)
+
+    def set_no_effect(self, names):
+        """
+        :param names: the params without visual effect on the preview,
+            replacing the current ones
+        """
+        names = frozenset(names)
+        touched = names.symmetric_difference(self.no_effect)
+        self.no_effect = names
+        self.refresh(touched)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == self.VALUE:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        name = self.rows[index.row()]
+        prop = self.params[name]
+        column = index.column()
+        if role == Qt.EditRole and column == self.VALUE:
+            return self.value(name)
+        if role == Qt.DisplayRole:
+            if column == self.NAME:
+                return name
+            elif column == self.VALUE:
+                return format_value(self.value(name))
+            elif column == self.HELP:
+                if name in self.warnings:
+                    return '\u26a0 {} {}'.format(
+                        '; '.join(self.warnings[name]), prop.get('help', '')
+                    )
+                if name in self.no_effect:
+                    return '(no visual effect) {}'.format(
+                        prop.get('help', '')
+                    )
+                return prop.get('help', '')
+        elif role == Qt.ToolTipRole:
+            lines = self.warnings.get(name, []) + [prop.get('help', '')]
+            if name in self.no_effect:
+                lines.append('Not read by the preview with the current style')
+            return '\n'.join(line for line in lines if line) or None
+        elif role == Qt.ForegroundRole and column != self.NAME \
+                and name in self.no_effect:
+            return QtGui.QColor(Qt.gray)
+        elif role == Qt.BackgroundRole and column == self.VALUE \
+                and name in self.warnings:
+            return QtGui.QColor(255, 225, 200)
+        elif role == Qt.FontRole and column == self.NAME \
+                and name in self.changed:
+            font = QtGui.QFont()
+            font.setBold(True)
+            return font
+        elif role == Qt.DecorationRole and column == self.VALUE \
+                and prop['type'] == 'colorstring':
+            return to_qcolor(str(self.value(name)))
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or index.column() != self.VALUE:
+            return False
+        name = self.rows[index.row()]
+        if same_value(self.params[name], self.value(name), value):
+            return True
+        self.sig_param_updated.emit(name, value)
+        self.refresh([name])
+        return True
+
+
+class ParamDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Edits the value column with the ParamWidget for the param's type, as
+    built by ``widget_factory(name, prop)``, and draws the name column as
+    a reset button.
+    """
+    row_height = 34
+
+    def __init__(self, widget_factory, parent=None):
+        super(ParamDelegate, self).__init__(parent)
+        self.widget_factory = widget_factory
+
+    def createEditor(self, parent, option, index):
+        if index.column() != ParamTableModel.VALUE:
+            return None
+        model = index.model()
+        name = model.name_at(index.row())
+        editor = self.widget_factory(name, model.params[name])
+        editor.setParent(parent)
+        editor.setAutoFillBackground(True)
+        editor.layout().setContentsMargins(2, 0, 2, 0)
+        # Commit on every change, e.g. while dragging a slider; renders are
+        # coalesced further down the line
+        editor.sig_param_updated.connect(
+            lambda _name, _value: self.commitData.emit(editor)
+        )
+        return editor
+
+    def setEditorData(self, editor, index):
+        value = index.data(Qt.EditRole)
+        editor.blockSignals(True)
+        try:
+            editor.set_value(value)
+        finally:
+            editor.blockSignals(False)
+
+    def setModelData(self, editor, model, index):
+        try:
+            value = editor.get_value()
+        except ValueError:
+            logger.error('Invalid value for %s', editor.name)
+            return
+        # Editors are committed whenever the current cell moves on, edited
+        # or not
+        if same_value(editor.props, index.data(Qt.EditRole), value):
+            return
+        model.setData(index, value, Qt.EditRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+    def sizeHint(self, option, index):
+        hint = super(ParamDelegate, self).sizeHint(option, index)
+        return QtCore.QSize(hint.width(), self.row_height)
+
+    def paint(self, painter, option, index):
+        if index.column() != ParamTableModel.NAME:
+            return super(ParamDelegate, self).paint(painter, option, index)
+        button = QtWidgets.QStyleOptionButton()
+        button.rect = option.rect.adjusted(1, 1, -1, -1)
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QtWidgets.QStyle.State_Enabled
+        font = index.data(Qt.FontRole)
+        if font is not None:
+            painter.save()
+            painter.setFont(font)
+        QtWidgets.QApplication.style().drawControl(
+            QtWidgets.QStyle.CE_PushButton, button, painter
+        )
+        if font is not None:
+            painter.restore()
+
+
+class ParamTableView(QtWidgets.QTableView):
+    def __init__(self, model, delegate, parent=None):
+        super(ParamTableView, self).__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(delegate)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.CurrentChanged |
+                             QtWidgets.QAbstractItemView.SelectedClicked)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.setWordWrap(True)
+        self.verticalHeader().hide()
+        self.verticalHeader().setDefaultSectionSize(delegate.row_height)
+        header = self.horizontalHeader()
+        header.setStretchLastSection(True)
+        header.resizeSection(ParamTableModel.NAME, 200)
+        header.resizeSection(ParamTableModel.VALUE, 280)
+        self.clicked.connect(self._clicked)
+
+    def _clicked(self, index):
+        if index.column() == ParamTableModel.NAME:
+            model = self.model()
+            model.sig_reset_requested.emit(model.name_at(index.row()))
@@ -0,0 +1,248 @@
+"""
+Cache of rendered preview frames keyed by the effective rc state.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import json
+import types
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+import matplotlib
+
+from mpl_style_builder.frames import RenderedFrame
+
+import logging
+logger = logging.getLogger('preview_cache')
+
+
+LOCAL_KEY_PREFIX = 'local-'
+
+
+def _callback_name(plot_callback):
+    return getattr(plot_callback, '__qualname__', None) \
+        or getattr(plot_callback, '__name__', None) \
+        or type(plot_callback).__name__
+
+
+def _callback_code(plot_callback):
+    """
+    Code object of a plot function, or of the function called by a
+    wrapper like DecimatingCallback or functools.partial
+    """
+    for candidate in (plot_callback,
+                      getattr(plot_callback, 'plot_callback', None),
+                      getattr(plot_callback, 'func', None),
+                      getattr(type(plot_callback), '__call__', None)):
+        code = getattr(candidate, '__code__', None)
+        if code is not None:
+            return code
+    return None
+
+
+def _hash_code(code, hasher):
+    hasher.update(code.co_code)
+    hasher.update(repr(code.co_names).encode('utf8'))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):  # nested functions, lambdas
+            _hash_code(const, hasher)
+        elif isinstance(const, frozenset):  # iterated in hash order
+            hasher.update(repr(sorted(map(repr, const))).encode('utf8'))
+        else:
+            hasher.update(repr(const).encode('utf8'))
+
+
+def is_process_local(plot_callback):
+    """
+    Whether the callback can only be told apart from others by its id(),
+    which is only stable for the lifetime of the process
+    """
+    return '<' in _callback_name(plot_callback)  # <lambda>, <locals>
+
+
+def callback_identity(plot_callback):
+    """
+    Stable name of a plot callback, including a digest of its code so that
+    editing the callback changes it. Lambdas and nested functions get their
+    id() appended, see is_process_local.
+    """
+    module = getattr(plot_callback, '__module__', None) or ''
+    identity = '{}.{}'.format(module, _callback_name(plot_callback))
+    code = _callback_code(plot_callback)
+    if code is not None:
+        hasher = hashlib.sha1()
+        _hash_code(code, hasher)
+        identity += '#' + hasher.hexdigest()[:12]
+    if is_process_local(plot_callback):
+        identity += '@{:x}'.format(id(plot_callback))
+    return identity
+
+
+def canonical_rc(changed):
+    return json.dumps(changed, sort_keys=True, separators=(',', ':'),
+                      default=repr)
+
+
+def cache_key(changed, plot_callback, *extra):
+    """
+    :param changed: dict, rc overrides
+    :param extra: anything else that affects the rendered frame, e.g. size
+    :returns: str, hex digest, prefixed with LOCAL_KEY_PREFIX for process
+        local callbacks; PreviewCache keeps such frames in memory only
+    """
+    hasher = hashlib.sha1()
+    for part in (matplotlib.__version__,
+                 callback_identity(plot_callback),
+                 canonical_rc(changed),
+                 repr(extra)):
+        hasher.update(part.encode('utf8'))
+        hasher.update(b'\0')
+    if is_process_local(plot_callback):
+        return LOCAL_KEY_PREFIX + hasher.hexdigest()
+    return hasher.hexdigest()
+
+
+class PreviewCache(object):
+    """
+    LRU of RenderedFrames bounded by ``max_bytes`` of pixel data, with an
+    optional write-through tier of raw frames in ``disk_dir`` bounded by
+    ``max_disk_bytes``. Frames of process local keys are not written to
+    disk, where they could be mistaken for another process's.
+    """
+    _header = struct.Struct('<IIf')  # width, height, dpi
+
+    def __init__(self, max_bytes=128 * 2**20, disk_dir=None,
+                 max_disk_bytes=1024 * 2**20):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir is not None and not os.path.isdir(disk_dir):
+            os.makedirs(disk_dir)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        return key in self._frames or (
+            self._on_disk(key) and os.path.exists(self._path(key))
+        )
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame
+        frame = self._read_disk(key)
+        with self._lock:
+            if frame is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, frame)
+            return frame
+
+    def put(self, key, frame):
+        """
+        Store a frame. Frames backed by shared memory are copied, so the
+        caller keeps owning (and eventually releasing) ``frame``.
+        """
+        frame = frame.detached()
+        with self._lock:
+            self._store(key, frame)
+        if self._on_disk(key):
+            self._write_disk(key, frame)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups
+                        else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._frames),
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+        }
+
+    def _store(self, key, frame):
+        if frame.nbytes > self.max_bytes:
+            return
+        if key in self._frames:
+            self.nbytes -= self._frames.pop(key).nbytes
+        self._frames[key] = frame
+        self.nbytes += frame.nbytes
+        while self.nbytes > self.max_bytes:
+            _key, evicted = self._frames.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _on_disk(self, key):
+        return self.disk_dir is not None and \
+            not key.startswith(LOCAL_KEY_PREFIX)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key + '.rgba')
+
+    def _read_disk(self, key):
+        if not self._on_disk(key):
+            return None
+        try:
+            with open(self._path(key), 'rb') as fh:
+                width, height, dpi = self._header.unpack(
+                    fh.read(self._header.size)
+                )
+                pixels = fh.read()
+            os.utime(self._path(key), None)  # mtime doubles as LRU stamp
+        except (IOError, OSError, struct.error):
+            return None
+        if len(pixels) != width * height * 4:
+            logger.warning('Corrupt cached preview %s', key)
+            return None
+        return RenderedFrame(width, height, pixels, dpi=dpi)
+
+    def _write_disk(self, key, frame):
+        path = self._path(key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as fh:
+                fh.write(self._header.pack(frame.width, frame.height,
+                                           frame.dpi or 0))
+                fh.write(frame.buffer)
+            os.replace(tmp_path, path)
+        except (IOError, OSError):
+            logger.exception('Could not write cached preview %s', key)
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.rgba'):
+                continue
+            stat = os.stat(os.path.join(self.disk_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _mtime, size, _name in entries)
+        for _mtime, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(os.path.join(self.disk_dir, name))
+            total -= size
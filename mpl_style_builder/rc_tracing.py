@@ -0,0 +1,118 @@
+"""
+Tracing of the rcParams read while a plot is created and drawn.
+
+Rendering is deterministic given the values of the params it reads: if no
+param a render read differs in a new set of rc overrides, rendering them
+gives the same frame and can be skipped. Most of the ~300 rcParams, like
+``savefig.*``, ``keymap.*`` or ``webagg.*``, are never read by a preview.
+
+Which params are read depends on their values, e.g. ``grid.*`` only with
+``axes.grid`` on, so a trace only holds for the rc overrides it was
+recorded with; RcTraces keeps them together. Code scanning all of
+rcParams, as boxplot() does for its ``boxplot.*props``, marks every param
+as read, which errs on the safe side.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import matplotlib
+
+import logging
+logger = logging.getLogger('rc_tracing')
+
+_recorders = []  # sets of params the active recordings add to
+_recorders_lock = threading.Lock()
+_original_getitem = None
+_MISSING = object()
+
+
+def _traced_getitem(self, key):
+    for reads in _recorders:
+        reads.add(key)
+    return _original_getitem(self, key)
+
+
+@contextmanager
+def recording_rc_reads(reads=None):
+    """
+    Record the rcParams read within the block, in any thread, into the
+    yielded set (``reads`` if given). rcParams are patched only while a
+    recording is active.
+
+    Enter it within rc_context(), which reads all of rcParams when it is
+    entered and left.
+    """
+    global _original_getitem
+    reads = set() if reads is None else reads
+    with _recorders_lock:
+        if not _recorders:
+            _original_getitem = matplotlib.RcParams.__getitem__
+            matplotlib.RcParams.__getitem__ = _traced_getitem
+        _recorders.append(reads)
+    try:
+        yield reads
+    finally:
+        with _recorders_lock:
+            for idx, recorder in enumerate(_recorders):
+                if recorder is reads:
+                    del _recorders[idx]
+                    break
+            if not _recorders:
+                matplotlib.RcParams.__getitem__ = _original_getitem
+
+
+def differing_params(old_changed, new_changed):
+    """
+    Params whose override differs between two sets of rc overrides. Cheaper
+    than restyle.changed_keys, but counts a param overridden with its
+    default as differing from one not overridden.
+    """
+    return set(param for param in set(old_changed) | set(new_changed)
+               if old_changed.get(param, _MISSING) !=
+               new_changed.get(param, _MISSING))
+
+
+class RcTraces(object):
+    """
+    Params read by recent renders, by the preview cache key of the render.
+    Safe to record into from render pool threads.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._traces = OrderedDict()  # key -> (changed, extra, reads)
+        self._lock = threading.Lock()
+
+    def record(self, key, changed, reads, extra=()):
+        """
+        :param changed: dict, the rc overrides rendered with
+        :param reads: iterable of the params read
+        :param extra: anything else the render depended on, e.g. its size
+        """
+        with self._lock:
+            self._traces.pop(key, None)
+            self._traces[key] = (dict(changed), extra, frozenset(reads))
+            while len(self._traces) > self.max_entries:
+                self._traces.popitem(last=False)
+
+    def reads(self, key):
+        """:returns: frozenset of the params read, or None if not traced"""
+        with self._lock:
+            trace = self._traces.get(key)
+        return None if trace is None else trace[2]
+
+    def unaffected(self, key, changed, extra=()):
+        """
+        Whether rendering with ``changed`` and ``extra`` gives the same
+        frame as the traced render ``key``: no param it read differs.
+        """
+        with self._lock:
+            trace = self._traces.get(key)
+        if trace is None:
+            return False
+        traced_changed, traced_extra, reads = trace
+        if traced_extra != extra:
+            return False
+        return reads.isdisjoint(differing_params(traced_changed, changed))
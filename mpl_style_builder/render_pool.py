@@ -0,0 +1,191 @@
+from __future__ import print_function, division, unicode_literals
+
+import json
+import itertools
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    from urllib.request import Request, urlopen
+except ImportError:  # Python 2
+    from urllib2 import Request, urlopen
+
+from mpl_style_builder.frames import RenderedFrame, render_to_shared_memory
+from mpl_style_builder.samples import callback_spec
+from mpl_style_builder.decimate import DecimatingCallback
+
+import logging
+logger = logging.getLogger('render_pool')
+
+
+class RenderWorkerPool(object):
+    """
+    Renders previews in worker processes.
+
+    Processes rather than threads since rcParams, and thereby rc_context,
+    is global to the process. Each job renders a snapshot of the rc
+    overrides into a shared memory block which the frame handed to
+    ``on_frame`` maps without copying.
+
+    Jobs are grouped in slots. Submitting to a slot cancels the job still
+    queued there, and the result of a job finishing after a newer job has
+    been submitted to the same slot is thrown away.
+    """
+    def __init__(self, max_workers=None):
+        self._executor = self._make_executor(max_workers)
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._latest = {}  # slot -> id of the newest job
+        self._queued = {}  # slot -> future of the newest job
+        self.discarded_count = 0
+
+    def submit(self, changed, plot_callback, on_frame, figsize=None,
+               dpi=None, slot='preview', kind='final'):
+        """
+        :param changed: dict, rc overrides; snapshotted at submit time
+        :param plot_callback: picklable (module level) callable taking a
+            Figure
+        :param on_frame: callable taking a RenderedFrame, called from a pool
+            thread - e.g. a Qt signal's emit
+        :param kind: str, RenderedFrame.kind of the resulting frame
+        :returns: int, job id
+        """
+        with self._lock:
+            job_id = next(self._job_ids)
+            previous = self._queued.get(slot)
+            if previous is not None and previous.cancel():
+                logger.debug('Cancelled queued render in slot %s', slot)
+            self._latest[slot] = job_id
+            future = self._start_job(dict(changed), plot_callback, figsize,
+                                     dpi)
+            self._queued[slot] = future
+        future.add_done_callback(
+            partial(self._job_done, slot, job_id, kind, on_frame)
+        )
+        return job_id
+
+    def cancel(self, slot):
+        """
+        Cancel the job queued in ``slot`` and discard the result of the one
+        running there, if any.
+        """
+        with self._lock:
+            queued = self._queued.pop(slot, None)
+            if queued is not None:
+                queued.cancel()
+            self._latest.pop(slot, None)
+
+    def _make_executor(self, max_workers):
+        return ProcessPoolExecutor(max_workers=max_workers)
+
+    def _start_job(self, changed, plot_callback, figsize, dpi):
+        """:returns: future of the job's result"""
+        return self._executor.submit(render_to_shared_memory, changed,
+                                     plot_callback, figsize, dpi)
+
+    def _frame_from_result(self, result, job_id, kind):
+        name, width, height, dpi, reads = result
+        return RenderedFrame.from_shared_memory(name, width, height,
+                                                dpi=dpi, kind=kind,
+                                                job_id=job_id, rc_reads=reads)
+
+    def is_latest(self, slot, job_id):
+        return self._latest.get(slot) == job_id
+
+    def _job_done(self, slot, job_id, kind, on_frame, future):
+        if future.cancelled():
+            return
+        try:
+            frame = self._frame_from_result(future.result(), job_id, kind)
+        except Exception:
+            logger.exception('Render job %s failed', job_id)
+            return
+        if not self.is_latest(slot, job_id):
+            logger.debug('Discarding superseded render job %s', job_id)
+            self.discarded_count += 1
+            frame.release()
+            return
+        on_frame(frame)
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            for future in self._queued.values():
+                future.cancel()
+            self._latest.clear()
+        self._executor.shutdown(wait=wait)
+
+
+class RemoteRenderPool(RenderWorkerPool):
+    """
+    Renders previews on a render server (see server.py) instead of local
+    worker processes, with the same slot semantics. Plot callbacks are
+    sent by name, so they must be samples or module level functions the
+    server may import; DecimatingCallbacks are sent as the callback they
+    wrap and their decimation options. Callbacks without a name are
+    rendered by local worker processes instead.
+    """
+    def __init__(self, url, max_connections=2, timeout=60):
+        super(RemoteRenderPool, self).__init__(max_workers=max_connections)
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._local_executor = None  # started on the first local job
+
+    def _make_executor(self, max_workers):
+        # Requests are made from threads
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+    def _start_job(self, changed, plot_callback, figsize, dpi):
+        job = {'rc': changed, 'format': 'rgba', 'dpi': dpi,
+               'figsize': figsize}
+        callback = plot_callback
+        if isinstance(callback, DecimatingCallback):
+            job['decimate'] = callback.method
+            job['decimate_factor'] = callback.factor
+            callback = callback.plot_callback
+        try:
+            job['callback'] = callback_spec(callback)
+            if job['callback'].startswith('__main__:'):
+                raise ValueError('{} cannot be imported by the server'
+                                 .format(job['callback']))
+        except ValueError as exc:
+            logger.debug('Rendering locally: %s', exc)
+            return self._start_local_job(changed, plot_callback, figsize,
+                                         dpi)
+        body = json.dumps(job, default=repr).encode('utf8')
+        return self._executor.submit(self._request, body)
+
+    def _start_local_job(self, changed, plot_callback, figsize, dpi):
+        if self._local_executor is None:
+            self._local_executor = ProcessPoolExecutor()
+        return self._local_executor.submit(render_to_shared_memory, changed,
+                                           plot_callback, figsize, dpi)
+
+    def _request(self, body):
+        request = Request(self.url + '/render', data=body,
+                          headers={'Content-Type': 'application/json'})
+        response = urlopen(request, timeout=self.timeout)
+        try:
+            headers = response.headers
+            reads = headers.get('X-Rc-Reads')
+            return (response.read(), int(headers['X-Width']),
+                    int(headers['X-Height']), float(headers['X-Dpi']),
+                    None if reads is None else
+                    frozenset(param for param in reads.split(',') if param))
+        finally:
+            response.close()
+
+    def _frame_from_result(self, result, job_id, kind):
+        if not isinstance(result[0], bytes):
+            # A local job's shared memory block
+            return super(RemoteRenderPool, self)._frame_from_result(
+                result, job_id, kind
+            )
+        pixels, width, height, dpi, reads = result
+        return RenderedFrame(width, height, pixels, dpi=dpi, kind=kind,
+                             job_id=job_id, rc_reads=reads)
+
+    def shutdown(self, wait=False):
+        super(RemoteRenderPool, self).shutdown(wait=wait)
+        if self._local_executor is not None:
+            self._local_executor.shutdown(wait=wait)
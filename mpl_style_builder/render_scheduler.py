@@ -0,0 +1,170 @@
+from __future__ import print_function, division, unicode_literals
+
+import time
+from contextlib import contextmanager
+
+from matplotlib.backends.qt_compat import QtCore
+
+import logging
+logger = logging.getLogger('render_scheduler')
+
+
+class RenderScheduler(QtCore.QObject):
+    """
+    Coalesces bursts of render requests into single renders.
+
+    Every request() only marks the preview as dirty. The render itself runs
+    from the event loop, at most once per ``min_interval_ms``, and always
+    renders whatever state is current at that moment - so any number of
+    requests arriving in between collapse into one render of the latest
+    state and stale intermediate states are never drawn.
+
+    With a ``draft_func``, renders made while requests keep arriving
+    within ``settle_ms`` of each other call draft_func instead, and once
+    requests have stopped for ``settle_ms`` one final render_func call
+    follows. A lone request renders with render_func right away.
+    """
+    IDLE = 'idle'
+    PENDING = 'pending'
+    RENDERING = 'rendering'
+
+    sig_rendered = QtCore.pyqtSignal(bool)  # whether the render was a draft
+
+    def __init__(self, render_func, min_interval_ms=40, parent=None,
+                 draft_func=None, settle_ms=300):
+        """
+        :param render_func: callable without arguments doing the actual render
+        :param min_interval_ms: int, minimum time between two render starts
+        :param draft_func: optional callable without arguments doing a
+            cheaper render while requests are streaming in
+        :param settle_ms: int, idle time after which a final render follows
+            drafts
+        """
+        super(RenderScheduler, self).__init__(parent)
+        self.render_func = render_func
+        self.min_interval_ms = min_interval_ms
+        self.state = self.IDLE
+        self.draft_func = draft_func
+        self.settle_ms = settle_ms
+        self.requested_count = 0
+        self.rendered_count = 0
+        self.draft_count = 0
+        self._dirty = False
+        self._final_due = False  # the latest render was a draft
+        self._streaming = False  # requests within settle_ms of each other
+        self._suspend_depth = 0
+        self._last_render_start = None
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._on_timeout)
+        self._settle_timer = QtCore.QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.timeout.connect(self._on_settled)
+
+    @property
+    def is_suspended(self):
+        return self._suspend_depth > 0
+
+    @property
+    def is_dirty(self):
+        return self._dirty
+
+    def request(self):
+        self.requested_count += 1
+        self._dirty = True
+        if self.draft_func is not None:
+            # Only a request following another one unsettled starts drafts
+            self._streaming = self._settle_timer.isActive()
+            self._settle_timer.start(self.settle_ms)
+        if self.is_suspended or self.state == self.RENDERING:
+            # Picked up when resuming or when the current render finishes
+            return
+        self._schedule()
+
+    def cancel(self):
+        """Drop any pending render."""
+        self._timer.stop()
+        self._settle_timer.stop()
+        self._streaming = False
+        self._dirty = False
+        self._final_due = False
+        if self.state == self.PENDING:
+            self.state = self.IDLE
+
+    def flush(self):
+        """
+        Render synchronously right away if a render, or the final render
+        following drafts, is pending.
+        """
+        self._timer.stop()
+        self._settle_timer.stop()
+        self._streaming = False
+        if (self._dirty or self._final_due) and not self.is_suspended \
+                and self.state != self.RENDERING:
+            self._render()
+
+    @contextmanager
+    def suspended(self):
+        """
+        Hold back renders while the block runs; requests made meanwhile
+        result in a single final render once the outermost block exits,
+        also when it exits with an exception.
+        """
+        self._suspend_depth += 1
+        if self._timer.isActive():
+            self._timer.stop()
+            self.state = self.IDLE
+        try:
+            yield self
+        finally:
+            self._suspend_depth -= 1
+            if not self.is_suspended:
+                self._settle_timer.stop()
+                self._streaming = False
+                if self._dirty or self._final_due:
+                    self._schedule()
+
+    def _schedule(self):
+        if self._timer.isActive():
+            return
+        self.state = self.PENDING
+        self._timer.start(self._delay_ms())
+
+    def _delay_ms(self):
+        if self._last_render_start is None:
+            return 0
+        elapsed_ms = (time.time() - self._last_render_start) * 1000
+        return max(0, int(self.min_interval_ms - elapsed_ms))
+
+    def _on_timeout(self):
+        if self.is_suspended:
+            self.state = self.IDLE
+            return
+        self._render()
+
+    def _on_settled(self):
+        self._streaming = False
+        if self._final_due and not self.is_suspended \
+                and self.state != self.RENDERING:
+            self._schedule()
+
+    def _render(self):
+        draft = self._streaming
+        self._dirty = False
+        self._final_due = draft
+        self.state = self.RENDERING
+        self._last_render_start = time.time()
+        try:
+            if draft:
+                self.draft_func()
+            else:
+                self.render_func()
+        except Exception:
+            logger.exception('Render failed')
+        finally:
+            self.state = self.IDLE
+            self.rendered_count += 1
+            self.draft_count += draft
+        self.sig_rendered.emit(draft)
+        if self._dirty and not self.is_suspended:
+            self._schedule()
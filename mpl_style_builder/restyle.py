@@ -0,0 +1,286 @@
+"""
+In-place restyling of an already drawn preview figure.
+
+Most rcParams are only read when an artist is created, which is why the
+preview normally re-runs the plot callback. For a number of common params
+the property they control is however easy to find and set on the existing
+artists - that is much cheaper than rebuilding the figure when the plot
+callback is heavy.
+
+Every restyler only touches artists whose property still equals the old rc
+value, i.e. artists that got the property from the rc defaults and not
+explicitly from the plot callback.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import matplotlib
+import matplotlib as mpl
+from matplotlib.colors import colorConverter
+from matplotlib.font_manager import FontProperties
+from matplotlib.lines import Line2D
+
+import logging
+logger = logging.getLogger('restyle')
+
+
+def known_rc(changed):
+    """
+    The rc overrides of params this matplotlib has; the schema may hold
+    params of other versions, which rc_context() raises KeyError for.
+    """
+    return dict((key, value) for key, value in changed.items()
+                if key in mpl.rcParams)
+
+
+def effective_rc(changed, keys):
+    """
+    Validated rc values of ``keys`` given the ``changed`` rc overrides,
+    None for keys this matplotlib does not have.
+
+    :returns: {str: object}
+    """
+    with matplotlib.rc_context(known_rc(changed)):
+        return dict((key, mpl.rcParams.get(key)) for key in keys)
+
+
+def changed_keys(old_changed, new_changed):
+    """
+    Keys whose effective value differs between two sets of rc overrides,
+    ignoring keys this matplotlib does not have.
+    """
+    candidates = set(key for key in set(old_changed) | set(new_changed)
+                     if key in mpl.rcParams)
+    old = effective_rc(old_changed, candidates)
+    new = effective_rc(new_changed, candidates)
+    return sorted(key for key in candidates if old[key] != new[key])
+
+
+def can_restyle(keys):
+    return all(key in RESTYLERS for key in keys)
+
+
+def restyle_figure(fig, old_changed, new_changed):
+    """
+    Bring ``fig``, drawn with ``old_changed``, up to date with
+    ``new_changed`` without re-running the plot callback.
+
+    :returns: bool, False if a changed param needs a full rebuild, in which
+        case the figure is left untouched.
+    """
+    keys = changed_keys(old_changed, new_changed)
+    if not can_restyle(keys):
+        logger.debug('Params need rebuild: %s',
+                     [key for key in keys if key not in RESTYLERS])
+        return False
+    old = effective_rc(old_changed, keys)
+    with matplotlib.rc_context(known_rc(new_changed)):
+        for key in keys:
+            logger.debug('Restyling %s: %s -> %s',
+                         key, old[key], mpl.rcParams[key])
+            RESTYLERS[key](fig, old[key], mpl.rcParams[key])
+    return True
+
+
+def _same_color(a, b):
+    try:
+        return colorConverter.to_rgba(a) == colorConverter.to_rgba(b)
+    except ValueError:
+        return False
+
+
+def _same_fontsize(points, rc_size):
+    return abs(points - FontProperties(size=rc_size).get_size_in_points()) \
+        < 1e-6
+
+
+def _same(a, b):
+    return a == b
+
+
+def _set_matching(artists, getter, setter, old, new, same=_same):
+    for artist in artists:
+        if same(getattr(artist, getter)(), old):
+            getattr(artist, setter)(new)
+
+
+def _data_lines(fig):
+    for ax in fig.axes:
+        for line in ax.get_lines():
+            yield line
+        legend = ax.get_legend()
+        if legend is not None:
+            for line in legend.get_lines():
+                yield line
+
+
+def _spines(fig):
+    for ax in fig.axes:
+        for spine in ax.spines.values():
+            yield spine
+
+
+def _titles(fig):
+    for ax in fig.axes:
+        yield ax.title
+        for attr in ('_left_title', '_right_title'):
+            if hasattr(ax, attr):
+                yield getattr(ax, attr)
+
+
+def _axis_labels(fig):
+    for ax in fig.axes:
+        yield ax.xaxis.label
+        yield ax.yaxis.label
+
+
+def _plain_texts(fig):
+    for text in _titles(fig):
+        yield text
+    for text in fig.texts:
+        yield text
+    for ax in fig.axes:
+        for text in ax.texts:
+            yield text
+        legend = ax.get_legend()
+        if legend is not None:
+            for text in legend.get_texts():
+                yield text
+
+
+def _line_prop(getter, setter, same=_same):
+    def restyle(fig, old, new):
+        _set_matching(_data_lines(fig), getter, setter, old, new, same)
+    return restyle
+
+
+def _text_prop(artists, getter, setter, same=_same):
+    def restyle(fig, old, new):
+        _set_matching(artists(fig), getter, setter, old, new, same)
+    return restyle
+
+
+def _same_linestyle(a, b):
+    return Line2D([], [], linestyle=a).get_linestyle() == \
+        Line2D([], [], linestyle=b).get_linestyle()
+
+
+# tick_params() kwarg -> (getter of the property from a Tick, comparison)
+TICK_PROPS = {
+    'grid_color': (lambda tick: tick.gridline.get_color(), _same_color),
+    'grid_linestyle': (lambda tick: tick.gridline.get_linestyle(),
+                       _same_linestyle),
+    'grid_linewidth': (lambda tick: tick.gridline.get_linewidth(), _same),
+    'grid_alpha': (lambda tick: tick.gridline.get_alpha(), _same),
+    'labelsize': (lambda tick: tick.label1.get_fontsize(), _same_fontsize),
+    'colors': (lambda tick: tick.tick1line.get_color(), _same_color),
+    'direction': (lambda tick: tick.get_tickdir(), _same),
+    'length': (lambda tick: tick.tick1line.get_markersize(), _same),
+    'width': (lambda tick: tick.tick1line.get_markeredgewidth(), _same),
+    'pad': (lambda tick: tick.get_pad(), _same),
+}
+
+
+def _tick_params(axis, which, kwarg):
+    """
+    Restyle the ticks of every axis whose ticks all still have the old
+    value, through tick_params() so that ticks created later get the new
+    one.
+    """
+    getter, same = TICK_PROPS[kwarg]
+    axis_names = ('x', 'y') if axis == 'both' else (axis,)
+    kinds = ('major', 'minor') if which == 'both' else (which,)
+
+    def restyle(fig, old, new):
+        for ax in fig.axes:
+            for name in axis_names:
+                ax_axis = getattr(ax, name + 'axis')
+                for kind in kinds:
+                    ticks = getattr(ax_axis, kind + 'Ticks')
+                    if all(same(getter(tick), old) for tick in ticks):
+                        ax.tick_params(axis=name, which=kind,
+                                       **{kwarg: new})
+    return restyle
+
+
+def _axes_facecolor(fig, old, new):
+    for ax in fig.axes:
+        if not _same_color(ax.patch.get_facecolor(), old):
+            continue
+        if hasattr(ax, 'set_facecolor'):
+            ax.set_facecolor(new)
+        else:  # matplotlib < 2.0
+            ax.set_axis_bgcolor(new)
+
+
+def _figure_prop(getter, setter):
+    def restyle(fig, old, new):
+        if _same_color(getattr(fig.patch, getter)(), old):
+            getattr(fig, setter)(new)
+    return restyle
+
+
+RESTYLERS = {
+    'lines.linewidth': _line_prop('get_linewidth', 'set_linewidth'),
+    'lines.linestyle': _line_prop('get_linestyle', 'set_linestyle',
+                                  _same_linestyle),
+    'lines.marker': _line_prop('get_marker', 'set_marker'),
+    'lines.markersize': _line_prop('get_markersize', 'set_markersize'),
+    'lines.markeredgewidth': _line_prop('get_markeredgewidth',
+                                        'set_markeredgewidth'),
+    'lines.antialiased': _line_prop('get_antialiased', 'set_antialiased'),
+    'axes.facecolor': _axes_facecolor,
+    'axes.edgecolor': _text_prop(_spines, 'get_edgecolor', 'set_edgecolor',
+                                 _same_color),
+    'axes.linewidth': _text_prop(_spines, 'get_linewidth', 'set_linewidth'),
+    'axes.titlesize': _text_prop(_titles, 'get_fontsize', 'set_fontsize',
+                                 _same_fontsize),
+    'axes.titleweight': _text_prop(_titles, 'get_fontweight',
+                                   'set_fontweight'),
+    'axes.labelsize': _text_prop(_axis_labels, 'get_fontsize', 'set_fontsize',
+                                 _same_fontsize),
+    'axes.labelweight': _text_prop(_axis_labels, 'get_fontweight',
+                                   'set_fontweight'),
+    'axes.labelcolor': _text_prop(_axis_labels, 'get_color', 'set_color',
+                                  _same_color),
+    'text.color': _text_prop(_plain_texts, 'get_color', 'set_color',
+                             _same_color),
+    'figure.facecolor': _figure_prop('get_facecolor', 'set_facecolor'),
+    'figure.edgecolor': _figure_prop('get_edgecolor', 'set_edgecolor'),
+    'grid.color': _tick_params('both', 'both', 'grid_color'),
+    'grid.linestyle': _tick_params('both', 'both', 'grid_linestyle'),
+    'grid.linewidth': _tick_params('both', 'both', 'grid_linewidth'),
+    'grid.alpha': _tick_params('both', 'both', 'grid_alpha'),
+}
+
+for _axis in ('x', 'y'):
+    RESTYLERS.update({
+        '%stick.labelsize' % _axis: _tick_params(_axis, 'both', 'labelsize'),
+        '%stick.color' % _axis: _tick_params(_axis, 'both', 'colors'),
+        '%stick.direction' % _axis: _tick_params(_axis, 'both', 'direction'),
+        '%stick.major.size' % _axis: _tick_params(_axis, 'major', 'length'),
+        '%stick.major.width' % _axis: _tick_params(_axis, 'major', 'width'),
+        '%stick.major.pad' % _axis: _tick_params(_axis, 'major', 'pad'),
+        '%stick.minor.size' % _axis: _tick_params(_axis, 'minor', 'length'),
+        '%stick.minor.width' % _axis: _tick_params(_axis, 'minor', 'width'),
+        '%stick.minor.pad' % _axis: _tick_params(_axis, 'minor', 'pad'),
+    })
+
+
+def reset_figure(fig):
+    """
+    Clear ``fig`` and re-apply the figure level rcParams, as creating a new
+    Figure would, except for size and dpi - so that one figure and its
+    canvas can be reused for every preview.
+    """
+    rc = mpl.rcParams
+    fig.clear()
+    fig.patch.set_facecolor(rc['figure.facecolor'])
+    fig.patch.set_edgecolor(rc['figure.edgecolor'])
+    fig.set_frameon(rc['figure.frameon'])
+    fig.subplotpars.update(**dict(
+        (key, rc['figure.subplot.' + key])
+        for key in ('left', 'bottom', 'right', 'top', 'wspace', 'hspace')
+    ))
+    fig.set_tight_layout(rc['figure.autolayout'])
+    if 'figure.constrained_layout.use' in rc:
+        fig.set_constrained_layout(rc['figure.constrained_layout.use'])
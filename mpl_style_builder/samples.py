@@ -0,0 +1,196 @@
+"""
+Sample plot callbacks used for previews. A plot callback takes a Figure
+and populates it.
+
+Samples declare the rcParams they read, by prefix, with @depends_on. The
+gallery preview re-renders a sample when a param its latest render read
+changed; the declarations stand in for renders that were not traced.
+
+Kept free of Qt so that render workers and batch jobs can import them.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import importlib
+from collections import OrderedDict
+
+
+# Read by any figure with axes, ticks and text
+COMMON_PREFIXES = ('axes.', 'figure.', 'font.', 'text.', 'mathtext.',
+                   'xtick.', 'ytick.', 'grid.', 'path.', 'agg.')
+
+
+def depends_on(*prefixes):
+    """Declare the rcParams, by prefix, a sample reads besides the common"""
+    def decorate(plot_callback):
+        plot_callback.depends_on = COMMON_PREFIXES + prefixes
+        return plot_callback
+    return decorate
+
+
+def may_read(plot_callback, params):
+    """
+    Whether ``plot_callback`` may read any of ``params``: always unless it
+    declares its dependencies. Only decides what to re-render; samples are
+    always rendered with all rc overrides.
+    """
+    prefixes = getattr(plot_callback, 'depends_on', None)
+    if prefixes is None:
+        return bool(params)
+    return any(param.startswith(prefixes) for param in params)
+
+
+@depends_on('lines.', 'markers.', 'legend.', 'patch.', 'date.')
+def default_sample_plot(fig):
+    from datetime import datetime
+    yvals = [0, 100,  10, 100,  10,  10]
+    xvals = list(map(
+        datetime.utcfromtimestamp,
+        [ 0,  30,  31,  45,  46, 300]
+    ))
+    ax = fig.add_subplot(121)
+    ax2 = fig.add_subplot(122)
+    ret = ax.plot([y**2 for y in range(9)],
+                  label='myline')
+    ax=fig.axes[0]
+#     ax.grid(True)
+    ax.legend()
+    ax.set_title('The graph title')
+    ax.set_xlabel('the xlabel')
+    ax2.plot(xvals, yvals)
+
+
+@depends_on('patch.', 'hatch.', 'errorbar.', 'lines.', 'legend.')
+def bar_sample_plot(fig):
+    ax = fig.add_subplot(111)
+    groups = ['A', 'B', 'C', 'D']
+    positions = range(len(groups))
+    ax.bar([pos - 0.2 for pos in positions], [3, 5, 2, 4], width=0.4,
+           yerr=[0.4, 0.6, 0.3, 0.5], label='first')
+    ax.bar([pos + 0.2 for pos in positions], [4, 3, 4, 2], width=0.4,
+           hatch='//', label='second')
+    ax.set_xticks(list(positions))
+    ax.set_xticklabels(groups)
+    ax.legend()
+    ax.set_title('Bars')
+
+
+@depends_on('scatter.', 'lines.', 'image.', 'patch.')
+def scatter_sample_plot(fig):
+    import numpy as np
+    rng = np.random.RandomState(0)
+    ax = fig.add_subplot(111)
+    x, y = rng.randn(2, 200)
+    ax.scatter(x, y, c=x * y, label='c mapped')
+    ax.scatter(x[:30] + 3, y[:30], marker='^', label='default color')
+    ax.set_title('Scatter')
+
+
+@depends_on('hist.', 'patch.', 'hatch.', 'legend.')
+def histogram_sample_plot(fig):
+    import numpy as np
+    rng = np.random.RandomState(1)
+    ax = fig.add_subplot(111)
+    ax.hist(rng.randn(1000), alpha=0.7, label='normal')
+    ax.hist(rng.randn(1000) * 0.5 + 1, histtype='step', label='step')
+    ax.legend()
+    ax.set_title('Histogram')
+
+
+@depends_on('image.', 'contour.')
+def image_sample_plot(fig):
+    import numpy as np
+    ax = fig.add_subplot(111)
+    x, y = np.meshgrid(np.linspace(-3, 3, 64), np.linspace(-3, 3, 64))
+    z = np.exp(-x ** 2 - y ** 2) - np.exp(-(x - 1) ** 2 - (y - 1) ** 2)
+    image = ax.imshow(z, extent=(-3, 3, -3, 3), origin='lower')
+    ax.contour(x, y, z, colors='k')
+    fig.colorbar(image, ax=ax)
+    ax.set_title('Image')
+
+
+@depends_on('polaraxes.', 'lines.', 'legend.', 'patch.')
+def polar_sample_plot(fig):
+    import numpy as np
+    ax = fig.add_subplot(111, projection='polar')
+    theta = np.linspace(0, 2 * np.pi, 200)
+    ax.plot(theta, 1 + 0.5 * np.sin(5 * theta), label='rose')
+    ax.fill(theta, 0.5 + 0.2 * np.cos(3 * theta), alpha=0.4)
+    ax.set_title('Polar')
+
+
+@depends_on('legend.', 'patch.', 'lines.')
+def text_sample_plot(fig):
+    ax = fig.add_subplot(111)
+    ax.plot([0, 1, 2], [0, 1, 0], label=r'$\alpha^2 + \beta_i$')
+    ax.annotate('annotation', xy=(1, 1), xytext=(1.4, 0.6),
+                arrowprops={'arrowstyle': '->'})
+    ax.text(0.05, 0.9, 'Text in axes\nsecond line', transform=ax.transAxes,
+            bbox={'boxstyle': 'round', 'alpha': 0.2})
+    ax.set_xlabel('x label')
+    ax.set_ylabel('y label')
+    ax.legend(loc='lower center', title='Legend title')
+    fig.suptitle('Figure title')
+    ax.set_title('Axes title')
+
+
+@depends_on('boxplot.', 'lines.', 'patch.')
+def boxplot_sample_plot(fig):
+    import numpy as np
+    rng = np.random.RandomState(2)
+    ax = fig.add_subplot(111)
+    data = [rng.randn(100) * scale for scale in (1, 2, 0.5)]
+    ax.boxplot(data)
+    ax.violinplot(data, positions=[4, 5, 6])
+    ax.set_title('Box and violin')
+
+
+SAMPLES = OrderedDict([
+    ('default', default_sample_plot),
+    ('bars', bar_sample_plot),
+    ('scatter', scatter_sample_plot),
+    ('histogram', histogram_sample_plot),
+    ('image', image_sample_plot),
+    ('polar', polar_sample_plot),
+    ('text', text_sample_plot),
+    ('boxplot', boxplot_sample_plot),
+])
+
+
+def resolve_callback(spec):
+    """
+    :param spec: str, name of a sample in SAMPLES or 'module:function'
+    :returns: plot callback
+    """
+    if spec in SAMPLES:
+        return SAMPLES[spec]
+    module_name, sep, func_name = spec.partition(':')
+    if not sep:
+        raise ValueError(
+            'Unknown sample {!r}, expected one of {} or module:function'
+            .format(spec, ', '.join(SAMPLES))
+        )
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def callback_name(spec):
+    """Short file-system friendly name for a callback spec"""
+    return spec.rpartition(':')[2]
+
+
+def callback_spec(plot_callback):
+    """
+    Inverse of resolve_callback: the sample name or 'module:function' of a
+    module level plot callback.
+
+    :raises ValueError: for callbacks that cannot be resolved by name, such
+        as lambdas and nested functions
+    """
+    for name, sample in SAMPLES.items():
+        if sample is plot_callback:
+            return name
+    module = getattr(plot_callback, '__module__', None)
+    qualname = getattr(plot_callback, '__qualname__', '')
+    if not module or not qualname or '<' in qualname or '.' in qualname:
+        raise ValueError('Plot callback {!r} is not a module level function'
+                         .format(plot_callback))
+    return '{}:{}'.format(module, qualname)
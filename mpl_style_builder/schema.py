@@ -0,0 +1,86 @@
+"""
+Loading of the rcParams schema (rcParams.yaml).
+
+Parsing the yaml is by far the most expensive part of starting up, so the
+parsed and flattened schema is cached as a pickle. The cache is valid as
+long as the yaml file's mtime and size and the matplotlib version are the
+ones it was written for.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import pickle
+from itertools import chain
+
+import matplotlib
+
+import logging
+logger = logging.getLogger('schema')
+
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'rcParams.yaml')
+
+
+def default_cache_dir():
+    return os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or
+        os.path.join(os.path.expanduser('~'), '.cache'),
+        'mpl_style_builder'
+    )
+
+
+def flatten(categorized_params):
+    return dict(chain.from_iterable(
+        [subdict.items() for subdict in categorized_params.values()]
+    ))
+
+
+def _cache_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime, stat.st_size,
+            matplotlib.__version__)
+
+
+def _cache_path(path, cache_dir):
+    return os.path.join(
+        cache_dir,
+        os.path.basename(path) + '.pickle'
+    )
+
+
+def parse_schema(path=DEFAULT_SCHEMA_PATH):
+    import yaml
+    with open(path) as fh:
+        return yaml.safe_load(fh)
+
+
+def load_schema(path=DEFAULT_SCHEMA_PATH, cache_dir=None):
+    """
+    :returns: (categorized_params, params)
+        categorized_params: {category: {paramname: prop}}
+        params: {paramname: prop}
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    key = _cache_key(path)
+    cache_path = _cache_path(path, cache_dir)
+    try:
+        with open(cache_path, 'rb') as fh:
+            cached_key, categorized_params, params = pickle.load(fh)
+        if cached_key == key:
+            return categorized_params, params
+        logger.debug('Schema cache outdated: %s', cache_path)
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+        logger.debug('No usable schema cache: %s', cache_path)
+
+    categorized_params = parse_schema(path)
+    params = flatten(categorized_params)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump((key, categorized_params, params), fh,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except (IOError, OSError):
+        logger.warning('Could not write schema cache %s', cache_path)
+    return categorized_params, params
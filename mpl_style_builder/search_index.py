@@ -0,0 +1,140 @@
+"""
+Search index over the param names (and help texts) of the rcParams schema.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+import logging
+logger = logging.getLogger('search_index')
+
+SEGMENT_SPLIT = re.compile(r'[._]')
+WORD_SPLIT = re.compile(r'\W+')
+
+# Scores per query token, summed over all tokens of a query
+EXACT_SEGMENT = 4
+SEGMENT_PREFIX = 3
+SUBSTRING = 2
+HELP_PREFIX = 1
+
+
+def _ngrams(text, n):
+    return set(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def _prefixed(sorted_words, prefix):
+    """All words in sorted_words starting with prefix"""
+    idx = bisect_left(sorted_words, prefix)
+    while idx < len(sorted_words) and sorted_words[idx].startswith(prefix):
+        yield sorted_words[idx]
+        idx += 1
+
+
+class ParamSearchIndex(object):
+    """
+    Every whitespace separated query token has to match a param, either as
+    substring of its name or, with ``include_help``, as prefix of a word in
+    its help text. Matches are ranked by how well the tokens match: whole
+    name segments (split on '.' and '_') before segment prefixes before
+    plain substrings before help text, then shorter names first.
+
+    Candidates come from an n-gram index over the names and, for the help
+    texts, a sorted word list searched by bisection. Matches are cached per
+    token, and a token extending a cached one (the typical keystroke) is
+    only checked against the cached token's matches.
+    """
+    max_ngram = 3
+    max_cached_tokens = 256
+
+    def __init__(self, params, include_help=True):
+        self.names = sorted(params)
+        self.include_help = include_help
+        self._segments = dict(
+            (name, SEGMENT_SPLIT.split(name.lower())) for name in self.names
+        )
+        self._ngrams = defaultdict(set)
+        self._help_words = {}
+        self._help_index = defaultdict(set)
+        for name in self.names:
+            lowered = name.lower()
+            for n in range(1, self.max_ngram + 1):
+                for gram in _ngrams(lowered, n):
+                    self._ngrams[gram].add(name)
+            if include_help:
+                words = set(WORD_SPLIT.split(
+                    (params[name].get('help') or '').lower()
+                )) - {''}
+                self._help_words[name] = words
+                for word in words:
+                    self._help_index[word].add(name)
+        self._sorted_help_words = sorted(self._help_index)
+        self._token_cache = {}
+
+    def search(self, query):
+        """
+        :returns: [str], matching param names, best match first
+        """
+        tokens = query.lower().split()
+        if not tokens:
+            return list(self.names)
+        matches = sorted((self._token_matches(token) for token in tokens),
+                         key=len)
+        scores = dict(matches[0])
+        for other in matches[1:]:
+            for name in list(scores):
+                if name in other:
+                    scores[name] += other[name]
+                else:
+                    del scores[name]
+        return sorted(scores, key=lambda name: (-scores[name], len(name),
+                                                name))
+
+    def _token_matches(self, token):
+        """{name: score} of the params matching one query token"""
+        if token in self._token_cache:
+            return self._token_cache[token]
+        narrower = max(
+            (cached for cached in self._token_cache
+             if token.startswith(cached)),
+            key=len,
+            default=None
+        )
+        if narrower is not None:
+            candidates = self._token_cache[narrower]
+        else:
+            candidates = self._candidates(token)
+        matches = {}
+        for name in candidates:
+            score = self._score(name, token)
+            if score:
+                matches[name] = score
+        if len(self._token_cache) >= self.max_cached_tokens:
+            self._token_cache.clear()
+        self._token_cache[token] = matches
+        return matches
+
+    def _candidates(self, token):
+        """Superset of the names the token can match"""
+        grams = _ngrams(token, min(len(token), self.max_ngram))
+        in_name = set.intersection(
+            *[self._ngrams.get(gram, set()) for gram in grams]
+        ) if grams else set()
+        if self.include_help:
+            for word in _prefixed(self._sorted_help_words, token):
+                in_name |= self._help_index[word]
+        return in_name
+
+    def _score(self, name, token):
+        segments = self._segments[name]
+        if token in segments:
+            return EXACT_SEGMENT
+        elif any(segment.startswith(token) for segment in segments):
+            return SEGMENT_PREFIX
+        elif token in name.lower():
+            return SUBSTRING
+        elif self.include_help and any(
+                word.startswith(token) for word in self._help_words[name]):
+            return HELP_PREFIX
+        return 0
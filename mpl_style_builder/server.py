@@ -0,0 +1,382 @@
+"""
+Local HTTP server rendering styles with sample plots, so that several
+editors can share one pool of warmed up render processes and one cache:
+
+    mpl-style-server --port 8765
+    mpl-style-builder --render-server http://127.0.0.1:8765
+
+POST /render takes a json object with keys
+
+- rc: {param: value}, the style delta
+- callback: name of a sample plot, see samples.SAMPLES
+- format: 'png', 'svg' or 'rgba' (raw pixels, with X-Width, X-Height,
+  X-Dpi and X-Rc-Reads, the comma separated rcParams read, response
+  headers)
+- dpi, figsize: optional
+- decimate, decimate_factor: optional, render with preview decimation,
+  see decimate.DecimatingCallback
+
+and returns the rendered image. Identical concurrent requests are rendered
+once and results are cached by a hash of their content. GET /health
+returns counters as json. The server only listens on loopback addresses.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import io
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import argparse
+import ipaddress
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from mpl_style_builder.frames import draw_figure
+from mpl_style_builder.samples import SAMPLES, resolve_callback
+from mpl_style_builder.decimate import METHODS, DecimatingCallback
+from mpl_style_builder.preview_cache import canonical_rc
+
+import logging
+logger = logging.getLogger('server')
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'rgba': 'application/octet-stream',
+}
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def render_bytes(rc, callback_spec, fmt, dpi=None, figsize=None,
+                 decimate=None):
+    """
+    Worker job.
+
+    :param decimate: (method, factor) of preview decimation, or None
+    :returns: (bytes, {header: value})
+    """
+    try:
+        callback = resolve_callback(callback_spec)
+    except (ImportError, AttributeError) as exc:
+        # A bad 'module:function' spec, reported like an unknown sample
+        raise ValueError('Cannot load callback {}: {}'.format(callback_spec,
+                                                              exc))
+    if decimate is not None:
+        callback = DecimatingCallback(callback, *decimate)
+    if fmt == 'rgba':
+        reads = set()
+        canvas = draw_figure(rc, callback, figsize, dpi, reads)
+        width, height = map(int, canvas.get_width_height())
+        return bytes(canvas.buffer_rgba()), {
+            'X-Width': width,
+            'X-Height': height,
+            'X-Dpi': canvas.figure.dpi,
+            'X-Rc-Reads': ','.join(sorted(reads)),
+        }
+    with matplotlib.rc_context(rc):
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+        callback(fig)
+        out = io.BytesIO()
+        fig.savefig(out, format=fmt, dpi=dpi)
+    return out.getvalue(), {}
+
+
+def _warm_up_worker():
+    """Worker initializer: import and exercise the render path once"""
+    draw_figure({}, SAMPLES['default'], figsize=(2, 2), dpi=20)
+
+
+def _ready():
+    return os.getpid()
+
+
+def render_key(rc, callback_spec, fmt, dpi, figsize, decimate=None):
+    hasher = hashlib.sha1()
+    for part in (matplotlib.__version__, canonical_rc(rc), callback_spec,
+                 fmt, repr(dpi), repr(figsize), repr(decimate)):
+        hasher.update(part.encode('utf8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class ResultCache(object):
+    """LRU of rendered results bounded by ``max_bytes`` of body data"""
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()  # key -> (body, headers)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        size = len(result[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._results:
+                return
+            self._results[key] = result
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _key, (body, _headers) = self._results.popitem(last=False)
+                self.nbytes -= len(body)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._results), 'bytes': self.nbytes,
+                'max_bytes': self.max_bytes}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super(RequestError, self).__init__(message)
+        self.status = status
+
+
+class RenderServer(object):
+    """
+    :param allow_modules: bool, also accept 'module:function' callbacks,
+        which makes the server import and run any module it is told to
+    """
+    def __init__(self, host='127.0.0.1', port=8765, max_workers=None,
+                 cache_bytes=256 * 2**20, allow_modules=False):
+        if not is_loopback(host):
+            raise ValueError('Refusing to listen on non-loopback host %s'
+                             % host)
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.allow_modules = allow_modules
+        self.cache = ResultCache(cache_bytes)
+        self.rendered_count = 0
+        self.merged_count = 0
+        self._inflight = {}  # key -> task rendering it
+        self._executor = None
+        self._server = None
+
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             initializer=_warm_up_worker)
+        # Spawn and warm up all workers before accepting requests
+        pids = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _ready)
+            for _ in range(self.max_workers)
+        ])
+        logger.info('%d render workers ready', len(set(pids)))
+        self._server = await asyncio.start_server(self._handle, self.host,
+                                                  self.port)
+        logger.info('Listening on http://%s:%d', self.host, self.port)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def render(self, rc, callback_spec, fmt, dpi=None, figsize=None,
+                     decimate=None):
+        """
+        :returns: (bytes, {header: value})
+        """
+        key = render_key(rc, callback_spec, fmt, dpi, figsize, decimate)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render_uncached(
+                key, rc, callback_spec, fmt, dpi, figsize, decimate
+            ))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _task: self._inflight.pop(key))
+        else:
+            self.merged_count += 1
+        # Shielded: a client disconnecting must not cancel the render for
+        # the others waiting on it
+        return await asyncio.shield(task)
+
+    async def _render_uncached(self, key, rc, callback_spec, fmt, dpi,
+                               figsize, decimate):
+        loop = asyncio.get_event_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._executor, render_bytes, rc, callback_spec, fmt, dpi,
+                figsize, decimate
+            )
+        except (ValueError, KeyError, TypeError) as exc:
+            logger.warning('Render %s of %s failed: %s', key[:12],
+                           callback_spec, exc)
+            raise
+        except Exception:
+            # Logged once here, whichever number of requests wait for it
+            logger.exception('Render %s of %s failed', key[:12],
+                             callback_spec)
+            raise
+        self.rendered_count += 1
+        self.cache.put(key, result)
+        return result
+
+    def stats(self):
+        return {
+            'workers': self.max_workers,
+            'rendered': self.rendered_count,
+            'merged': self.merged_count,
+            'inflight': len(self._inflight),
+            'cache': self.cache.stats(),
+        }
+
+    def _parse_render_request(self, body):
+        try:
+            request = json.loads(body.decode('utf8'))
+        except ValueError as exc:
+            raise RequestError(400, 'Invalid json: %s' % exc)
+        if not isinstance(request, dict):
+            raise RequestError(400, 'Expected a json object')
+        rc = request.get('rc') or {}
+        callback_spec = request.get('callback', 'default')
+        fmt = request.get('format', 'png')
+        dpi = request.get('dpi')
+        figsize = request.get('figsize')
+        if not isinstance(rc, dict):
+            raise RequestError(400, 'rc must be an object')
+        if fmt not in CONTENT_TYPES:
+            raise RequestError(400, 'Unsupported format: %s' % fmt)
+        if callback_spec not in SAMPLES and not self.allow_modules:
+            raise RequestError(400, 'Unknown sample: %s' % callback_spec)
+        if figsize is not None:
+            figsize = tuple(float(size) for size in figsize)
+        decimate = request.get('decimate')
+        if decimate is not None:
+            if decimate not in METHODS:
+                raise RequestError(400, 'Unknown decimation method: %s'
+                                   % decimate)
+            decimate = (decimate, float(request.get('decimate_factor', 4)))
+        return rc, callback_spec, fmt, dpi, figsize, decimate
+
+    async def _dispatch(self, method, path, body):
+        """
+        :returns: (status, content type, body, {header: value})
+        """
+        if path == '/health':
+            return (200, 'application/json',
+                    json.dumps(self.stats()).encode('utf8'), {})
+        if path != '/render':
+            raise RequestError(404, 'No such resource: %s' % path)
+        if method != 'POST':
+            raise RequestError(405, 'Use POST')
+        rc, callback_spec, fmt, dpi, figsize, decimate = \
+            self._parse_render_request(body)
+        try:
+            payload, headers = await self.render(rc, callback_spec, fmt,
+                                                 dpi, figsize, decimate)
+        except (ValueError, KeyError, TypeError) as exc:
+            # Invalid rc values or callback specs, raised in the worker
+            raise RequestError(400, str(exc))
+        return 200, CONTENT_TYPES[fmt], payload, headers
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            method, path, _version = \
+                request_line.decode('latin1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _sep, value = line.decode('latin1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(
+                int(headers.get('content-length', 0))
+            )
+            status, content_type, payload, extra = \
+                await self._dispatch(method, path.split('?', 1)[0], body)
+        except RequestError as exc:
+            status, content_type, extra = exc.status, 'text/plain', {}
+            payload = str(exc).encode('utf8')
+        except (ValueError, asyncio.IncompleteReadError):
+            status, content_type, extra = 400, 'text/plain', {}
+            payload = b'Malformed request'
+        except Exception as exc:
+            logger.error('Request failed: %r', exc)
+            status, content_type, extra = 500, 'text/plain', {}
+            payload = b'Internal server error, see the server log'
+        lines = ['HTTP/1.1 {} {}'.format(status, REASONS[status]),
+                 'Content-Type: {}'.format(content_type),
+                 'Content-Length: {}'.format(len(payload)),
+                 'Connection: close']
+        lines.extend('{}: {}'.format(name, value)
+                     for name, value in sorted(extra.items()))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin1'))
+        writer.write(payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve style previews to local editors'
+    )
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='loopback address to listen on')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='render processes (default: number of CPUs)')
+    parser.add_argument('--cache-mb', type=int, default=256)
+    parser.add_argument('--allow-modules', action='store_true',
+                        help="accept 'module:function' callbacks besides "
+                             "the samples")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)-6s [%(name)s]: '
+                               '%(message)s')
+    try:
+        server = RenderServer(args.host, args.port, max_workers=args.jobs,
+                              cache_bytes=args.cache_mb * 2**20,
+                              allow_modules=args.allow_modules)
+    except ValueError as exc:
+        parser.error(str(exc))
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+The style being edited, without any dependency on Qt.
+
+A StyleSession owns the param schema and the rc overrides made so far
+(``changed``), and validates, diffs and serializes them. The Qt editor is a
+view over a session; render servers and batch jobs can use one directly.
+"""
+from __future__ import print_function, division, unicode_literals
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import matplotlib as mpl
+
+from mpl_style_builder.schema import DEFAULT_SCHEMA_PATH, load_schema
+from mpl_style_builder.stylefile import (
+    convert_value,
+    rc_validator,
+    write_text_atomic,
+)
+from mpl_style_builder.validation import (
+    validate_style_dict,
+    format_diagnostic,
+    ERROR,
+)
+
+import logging
+logger = logging.getLogger('session')
+
+
+class ParamBatch(object):
+    """
+    Changes staged within StyleSession.transaction(); nothing touches
+    ``changed`` until the block exits without an exception.
+    """
+    def __init__(self, params):
+        self.params = params
+        self.updates = OrderedDict()  # param -> new value
+        self.resets = set()
+
+    def set(self, param, value):
+        """
+        :raises ValueError: for unknown params or invalid values, rolling
+            back the whole batch unless caught within the block
+        """
+        check_value(self.params, param, value)
+        self.resets.discard(param)
+        self.updates[param] = value
+
+    def reset(self, param):
+        self.updates.pop(param, None)
+        self.resets.add(param)
+
+    @property
+    def touched(self):
+        return list(self.updates) + sorted(self.resets)
+
+
+def check_value(params, param, value):
+    """
+    :raises ValueError: if ``param`` is neither in the schema nor known to
+        matplotlib, or ``value`` is invalid for it
+    """
+    if param not in params and rc_validator(param) is None:
+        raise ValueError('Unknown param: %s' % param)
+    convert_value(param, value)
+
+
+def format_style_value(prop, value):
+    """``value`` as written to a .mplstyle file"""
+    if value and isinstance(value, str) and value.startswith('#'):
+        return value[1:]
+    elif isinstance(value, list):
+        if prop.get('list_type') == 'integer':
+            value = map(int, value)
+        return ', '.join(map(str, value))
+    return value
+
+
+class StyleSession(object):
+    """
+    ``changed`` is only ever updated in place, so views may keep a
+    reference to it. Listeners, callables taking the list of params
+    touched, are called after every applied change.
+    """
+    def __init__(self, schema_path=DEFAULT_SCHEMA_PATH, cache_dir=None):
+        self.categorized_params, self.params = load_schema(schema_path,
+                                                           cache_dir)
+        self.changed = {}
+        self.listeners = []
+        self._batch = None
+
+    def default(self, param):
+        if param not in self.params:
+            # Known to the installed matplotlib only, see check_value
+            return mpl.rcParamsDefault[param]
+        return self.params[param]['default']
+
+    def value(self, param):
+        if param in self.changed:
+            return self.changed[param]
+        return self.default(param)
+
+    def set(self, param, value):
+        """
+        :raises ValueError: for unknown params or invalid values
+        """
+        if self._batch is not None:
+            return self._batch.set(param, value)
+        check_value(self.params, param, value)
+        self.changed[param] = value
+        self._notify([param])
+
+    def reset(self, param):
+        if self._batch is not None:
+            self._batch.reset(param)
+        elif param in self.changed:
+            del self.changed[param]
+            self._notify([param])
+
+    def reset_all(self):
+        with self.transaction() as batch:
+            for param in list(self.changed):
+                batch.reset(param)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Apply many param changes as one: within the block, stage them on
+        the yielded ParamBatch. On a clean exit they are applied to
+        ``changed`` together and listeners are notified once; if the block
+        raises, e.g. on an invalid value, none are applied. Nested blocks
+        join the outermost one.
+        """
+        if self._batch is not None:
+            yield self._batch
+            return
+        batch = self._batch = ParamBatch(self.params)
+        try:
+            yield batch
+        finally:
+            self._batch = None
+        touched = batch.touched
+        if not touched:
+            return
+        for param in batch.resets:
+            self.changed.pop(param, None)
+        self.changed.update(batch.updates)
+        self._notify(touched)
+
+    def _notify(self, touched):
+        for listener in self.listeners:
+            listener(touched)
+
+    def validate(self, rcparams, path=None):
+        """
+        :returns: [Diagnostic] for a {param: value} style
+        """
+        return validate_style_dict(rcparams, self.params, path=path)
+
+    def load_style(self, rcparams, name=None):
+        """
+        Apply a {param: value} style in one transaction, leaving out params
+        with errors, which are logged.
+
+        :returns: [param] applied
+        """
+        diagnostics = self.validate(rcparams, path=name)
+        for diagnostic in diagnostics:
+            logger.warning(format_diagnostic(diagnostic))
+        rejected = set(d.param for d in diagnostics if d.severity == ERROR)
+        applied = [param for param in rcparams if param not in rejected]
+        with self.transaction() as batch:
+            for param in applied:
+                logger.debug('Loaded from style %s: (%s: %s)',
+                             name, param, rcparams[param])
+                batch.set(param, rcparams[param])
+        return applied
+
+    def diff(self):
+        """
+        :returns: {param: (default, value)} of the changed params whose
+            value differs from the default
+        """
+        return dict((param, (self.default(param), value))
+                    for param, value in self.changed.items()
+                    if value != self.default(param))
+
+    def to_mplstyle(self, minimal=False):
+        """
+        :param minimal: bool, leave out changed params set to their default
+        :returns: str, the changed params in .mplstyle format
+        """
+        params = self.diff() if minimal else self.changed
+        lines = []
+        for param in sorted(params):
+            value = format_style_value(self.params.get(param, {}),
+                                       self.changed[param])
+            lines.append('{}: {}'.format(param, value))
+        return '\n'.join(lines)
+
+    def save(self, path, minimal=False):
+        write_text_atomic(path, self.to_mplstyle(minimal))
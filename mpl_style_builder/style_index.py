@@ -0,0 +1,197 @@
+"""
+Persistent index of the .mplstyle files in the style library directories.
+
+matplotlib.style.reload_library() re-reads and re-parses every style file.
+The index instead remembers mtime, size and content hash per file and only
+re-reads files whose mtime or size changed, and only re-parses those whose
+content hash changed as well.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import json
+import threading
+
+import matplotlib as mpl
+import matplotlib.style
+
+from mpl_style_builder.schema import default_cache_dir
+from mpl_style_builder.stylefile import (
+    parse_style_text,
+    read_style_bytes,
+    content_digest,
+    convert_value,
+)
+
+import logging
+logger = logging.getLogger('style_index')
+
+STYLE_EXTENSION = '.mplstyle'
+
+
+def library_dirs():
+    """Style directories in the order matplotlib reads them: later wins"""
+    user_dirs = getattr(mpl.style, 'USER_LIBRARY_PATHS', None)
+    if user_dirs is None:
+        # Before matplotlib 3.11 they are in matplotlib.style.core only,
+        # which is deprecated since
+        from matplotlib.style import core
+        user_dirs = core.USER_LIBRARY_PATHS
+    return [os.path.join(mpl.get_data_path(), 'stylelib')] + list(user_dirs)
+
+
+class StyleIndex(object):
+    """
+    Thread-safe: refresh() is meant to be run off the GUI thread while the
+    GUI reads from the index.
+    """
+    version = 1
+
+    def __init__(self, dirs=None, index_path=None):
+        self.dirs = list(dirs) if dirs is not None else library_dirs()
+        self.index_path = index_path or os.path.join(default_cache_dir(),
+                                                     'style_index.json')
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> entry dict
+        self._by_name = {}  # style name -> path
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path) as fh:
+                stored = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return
+        if stored.get('version') != self.version:
+            return
+        with self._lock:
+            self._entries = stored['entries']
+            self._rebuild_names()
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'version': self.version,
+                               'entries': self._entries})
+        directory = os.path.dirname(self.index_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp_path = '{}.{}.tmp'.format(self.index_path, os.getpid())
+        with open(tmp_path, 'w') as fh:
+            fh.write(data)
+        os.replace(tmp_path, self.index_path)
+
+    @property
+    def available(self):
+        with self._lock:
+            return sorted(self._by_name)
+
+    def path_of(self, name):
+        with self._lock:
+            return self._by_name.get(name)
+
+    def style_files(self):
+        """Paths of all indexed style files"""
+        with self._lock:
+            return sorted(self._entries)
+
+    def raw_params(self, name):
+        """
+        :returns: {param: raw string value} or None if no such style
+        """
+        with self._lock:
+            path = self._by_name.get(name)
+            if path is None:
+                return None
+            return dict(self._entries[path]['params'])
+
+    def get(self, name):
+        """
+        :returns: {param: validated value} or None if no such style;
+            params with invalid values are left out
+        """
+        raw = self.raw_params(name)
+        if raw is None:
+            return None
+        params = {}
+        for param, value in raw.items():
+            try:
+                params[param] = convert_value(param, value)
+            except ValueError as exc:
+                logger.warning('Skipping %s in style %s: %s',
+                               param, name, exc)
+        return params
+
+    def refresh(self):
+        """
+        Rescan the style directories, re-reading only changed files.
+
+        :returns: bool, whether anything changed
+        """
+        seen = set()
+        changed = False
+        for directory in self.dirs:
+            if not os.path.isdir(directory):
+                continue
+            for filename in os.listdir(directory):
+                if not filename.endswith(STYLE_EXTENSION):
+                    continue
+                path = os.path.join(directory, filename)
+                seen.add(path)
+                changed |= self.update_file(path, save=False)
+        with self._lock:
+            vanished = set(self._entries) - seen
+            for path in vanished:
+                del self._entries[path]
+            if vanished:
+                self._rebuild_names()
+        changed |= bool(vanished)
+        if changed:
+            self.save()
+        return changed
+
+    def update_file(self, path, save=True):
+        """
+        (Re-)index a single file, e.g. one just saved.
+
+        :returns: bool, whether the index changed
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry['mtime'] == stat.st_mtime \
+                and entry['size'] == stat.st_size:
+            return False
+        data = read_style_bytes(path)
+        digest = content_digest(data)
+        if entry is not None and entry['sha1'] == digest:
+            params = entry['params']
+        else:
+            logger.debug('Parsing style file %s', path)
+            entries, _malformed = parse_style_text(
+                data.decode('utf8', 'replace')
+            )
+            params = [[param, value] for _lineno, param, value in entries]
+        with self._lock:
+            self._entries[path] = {
+                'name': os.path.basename(path)[:-len(STYLE_EXTENSION)],
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'sha1': digest,
+                'params': params,
+            }
+            self._rebuild_names()
+        if save:
+            self.save()
+        return True
+
+    def _rebuild_names(self):
+        order = dict((directory, idx) for idx, directory in
+                     enumerate(self.dirs))
+        by_name = {}
+        for path in sorted(self._entries, key=lambda path: order.get(
+                os.path.dirname(path), -1)):
+            by_name[self._entries[path]['name']] = path
+        self._by_name = by_name
@@ -0,0 +1,345 @@
+"""
+SQLite store of the style library with every param and value broken out,
+to find styles by their params without parsing any files:
+
+    mpl-style-query 'font.size>12' 'axes.prop_cycle~1f77b4'
+
+A query is a list of conditions, all of which a style must meet:
+
+- ``param``: sets param at all
+- ``param=value``, ``param!=value``: value equality, ignoring whitespace,
+  case, quote style and a leading '#'; numerically for numbers
+- ``param>12``, ``param>=12``, ``param<12``, ``param<=12``: numeric
+- ``param~text``: value contains text, ignoring case
+
+Like the StyleIndex, the store is updated incrementally: only files whose
+mtime or size changed are read, and only those whose content hash changed
+are re-parsed.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import namedtuple
+
+from mpl_style_builder.schema import default_cache_dir
+from mpl_style_builder.style_index import library_dirs, STYLE_EXTENSION
+from mpl_style_builder.stylefile import (
+    parse_style_text,
+    read_style_bytes,
+    content_digest,
+)
+
+import logging
+logger = logging.getLogger('style_store')
+
+Condition = namedtuple('Condition', 'param op value')
+
+OPERATORS = ('>=', '<=', '!=', '=', '>', '<', '~')
+CONDITION_RE = re.compile(
+    r'^\s*([\w.\-]+)\s*(?:({})\s*(.*?))?\s*$'.format(
+        '|'.join(re.escape(op) for op in OPERATORS)
+    )
+)
+NUMERIC_OPERATORS = ('>=', '<=', '>', '<')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS params (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    param TEXT NOT NULL,
+    value TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    number REAL
+);
+CREATE INDEX IF NOT EXISTS params_by_norm ON params(param, norm);
+CREATE INDEX IF NOT EXISTS params_by_number ON params(param, number);
+CREATE INDEX IF NOT EXISTS params_by_path ON params(path);
+'''
+
+
+def normalize_value(value):
+    """Form of a raw value that equality conditions compare"""
+    norm = re.sub(r'\s+', '', value).replace('"', "'").lower()
+    return norm[1:] if norm.startswith('#') else norm
+
+
+def as_number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_condition(text):
+    """
+    :raises ValueError: if ``text`` is not a condition
+    """
+    match = CONDITION_RE.match(text)
+    if match is None:
+        raise ValueError('Invalid condition: %r' % text)
+    param, op, value = match.groups()
+    if op is not None and not value:
+        raise ValueError('Missing value in condition: %r' % text)
+    if op in NUMERIC_OPERATORS and as_number(value) is None:
+        raise ValueError('Expected a number in condition: %r' % text)
+    return Condition(param, op, value)
+
+
+def _split_query(text):
+    """Split at whitespace and commas outside of brackets and quotes"""
+    parts, current, depth, quote = [], [], 0, None
+    for char in text:
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif depth <= 0 and (char.isspace() or char == ','):
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append(''.join(current))
+    return [part for part in parts if part]
+
+
+def parse_query(text):
+    """
+    :param text: str, conditions separated by whitespace or commas
+    :returns: [Condition]
+    :raises ValueError: on invalid conditions
+    """
+    parts = _split_query(text)
+    if not parts:
+        raise ValueError('Empty query')
+    return [parse_condition(part) for part in parts]
+
+
+def _condition_sql(condition):
+    """:returns: (sql selecting paths, args)"""
+    param, op, value = condition
+    sql = 'SELECT path FROM params WHERE param = ?'
+    if op is None:
+        return sql, [param]
+    number = as_number(value)
+    if op in NUMERIC_OPERATORS:
+        return '{} AND number {} ?'.format(sql, op), [param, number]
+    if op == '~':
+        escaped = re.sub(r'([%_\\])', r'\\\1', value.lower())
+        return (sql + " AND lower(value) LIKE ? ESCAPE '\\'",
+                [param, '%{}%'.format(escaped)])
+    if number is not None:
+        test = 'number = ?'
+    else:
+        test, number = 'norm = ?', normalize_value(value)
+    if op == '!=':
+        test = 'NOT ({})'.format(test)
+    return '{} AND {}'.format(sql, test), [param, number]
+
+
+class StyleStore(object):
+    """
+    Safe to use from several threads, e.g. refreshed in a background thread
+    while queried from the GUI thread: each thread has its own connection,
+    and readers do not wait for writers.
+    """
+    version = 1
+
+    def __init__(self, db_path=None, dirs=None):
+        self.dirs = list(dirs) if dirs is not None else library_dirs()
+        self.db_path = db_path or os.path.join(default_cache_dir(),
+                                               'style_store.sqlite')
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._create()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            self._local.connection = connection
+        return connection
+
+    def _create(self):
+        connection = self._connection()
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.version:
+            with connection:
+                connection.execute('DROP TABLE IF EXISTS params')
+                connection.execute('DROP TABLE IF EXISTS files')
+                connection.execute(
+                    'PRAGMA user_version = {:d}'.format(self.version)
+                )
+        connection.executescript(SCHEMA)
+
+    def refresh(self):
+        """
+        Rescan the style directories, re-reading only changed files.
+
+        :returns: bool, whether anything changed
+        """
+        started = time.time()
+        connection = self._connection()
+        with self._write_lock, connection:
+            known = dict(
+                (path, (mtime, size, sha1)) for path, mtime, size, sha1 in
+                connection.execute('SELECT path, mtime, size, sha1 '
+                                   'FROM files')
+            )
+            seen = set()
+            changed = False
+            for directory in self.dirs:
+                if not os.path.isdir(directory):
+                    continue
+                for filename in os.listdir(directory):
+                    if not filename.endswith(STYLE_EXTENSION):
+                        continue
+                    path = os.path.join(directory, filename)
+                    seen.add(path)
+                    changed |= self._update(connection, path,
+                                            known.get(path))
+            vanished = set(known) - seen
+            connection.executemany('DELETE FROM files WHERE path = ?',
+                                   [(path,) for path in vanished])
+        logger.debug('Refreshed style store in %.3fs', time.time() - started)
+        return changed or bool(vanished)
+
+    def update_file(self, path):
+        """
+        (Re-)index a single file, e.g. one just saved.
+
+        :returns: bool, whether the store changed
+        """
+        connection = self._connection()
+        with self._write_lock, connection:
+            row = connection.execute(
+                'SELECT mtime, size, sha1 FROM files WHERE path = ?', (path,)
+            ).fetchone()
+            return self._update(connection, path, row)
+
+    def _update(self, connection, path, known):
+        """
+        :param known: (mtime, size, sha1) as stored, or None
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if known is not None and known[:2] == (stat.st_mtime, stat.st_size):
+            return False
+        data = read_style_bytes(path)
+        digest = content_digest(data)
+        name = os.path.basename(path)[:-len(STYLE_EXTENSION)]
+        if known is not None and known[2] == digest:
+            connection.execute(
+                'UPDATE files SET mtime = ?, size = ? WHERE path = ?',
+                (stat.st_mtime, stat.st_size, path)
+            )
+            return False
+        logger.debug('Parsing style file %s', path)
+        entries, _malformed = parse_style_text(data.decode('utf8', 'replace'))
+        connection.execute('DELETE FROM files WHERE path = ?', (path,))
+        connection.execute(
+            'INSERT INTO files (path, name, mtime, size, sha1) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (path, name, stat.st_mtime, stat.st_size, digest)
+        )
+        connection.executemany(
+            'INSERT INTO params (path, param, value, norm, number) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(path, param, value, normalize_value(value), as_number(value))
+             for _lineno, param, value in entries]
+        )
+        return True
+
+    def query(self, conditions):
+        """
+        :param conditions: [Condition] or a query string, see parse_query
+        :returns: [(style name, path)] of the styles meeting all conditions,
+            sorted by name
+        """
+        if not isinstance(conditions, (list, tuple)):
+            conditions = parse_query(conditions)
+        selects, args = [], []
+        for condition in conditions:
+            sql, condition_args = _condition_sql(condition)
+            selects.append(sql)
+            args.extend(condition_args)
+        sql = 'SELECT name, path FROM files WHERE path IN ({}) ' \
+              'ORDER BY name, path'.format(' INTERSECT '.join(selects))
+        return self._connection().execute(sql, args).fetchall()
+
+    def values(self, path, params=None):
+        """
+        :returns: [(param, raw value)] of a stored style file
+        """
+        sql = 'SELECT param, value FROM params WHERE path = ?'
+        args = [path]
+        if params:
+            sql += ' AND param IN ({})'.format(', '.join('?' * len(params)))
+            args.extend(params)
+        return self._connection().execute(sql, args).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Find styles in the style library by their params'
+    )
+    parser.add_argument('conditions', nargs='+',
+                        help="e.g. 'font.size>12' 'axes.prop_cycle~1f77b4' "
+                             "'lines.linestyle=--' 'axes.grid'")
+    parser.add_argument('-d', '--dir', action='append', dest='dirs',
+                        help='style directory (repeatable, default: the '
+                             'matplotlib style library)')
+    parser.add_argument('--db', default=None, help='store file')
+    parser.add_argument('--no-refresh', action='store_true',
+                        help='query the store as is')
+    parser.add_argument('--paths', action='store_true',
+                        help='print paths rather than style names')
+    parser.add_argument('-v', '--values', action='store_true',
+                        help='print the values of the queried params')
+    args = parser.parse_args(argv)
+    try:
+        conditions = [parse_condition(text) for text in args.conditions]
+    except ValueError as exc:
+        parser.error(str(exc))
+    store = StyleStore(db_path=args.db, dirs=args.dirs)
+    if not args.no_refresh:
+        store.refresh()
+    started = time.time()
+    matches = store.query(conditions)
+    elapsed = time.time() - started
+    params = sorted(set(condition.param for condition in conditions))
+    for name, path in matches:
+        print(path if args.paths else name)
+        if args.values:
+            for param, value in sorted(store.values(path, params)):
+                print('    {}: {}'.format(param, value))
+    print('{} styles in {:.1f} ms'.format(len(matches), elapsed * 1000),
+          file=sys.stderr)
+    return 0 if matches else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Reading .mplstyle files without validating them, and access to
+matplotlib's rcParams validators.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import io
+import os
+import hashlib
+
+import matplotlib as mpl
+import matplotlib.rcsetup
+
+import logging
+logger = logging.getLogger('stylefile')
+
+
+def strip_comment(line):
+    """Strip a trailing '#' comment, ignoring '#' inside quotes"""
+    quote = None
+    for idx, char in enumerate(line):
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '#':
+            return line[:idx].strip()
+    return line.strip()
+
+
+def parse_style_text(text):
+    """
+    :returns: ([(lineno, param, raw value)], [(lineno, line)])
+        params in file order, and lines that could not be parsed
+    """
+    entries = []
+    malformed = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        stripped = strip_comment(line)
+        if not stripped:
+            continue
+        param, sep, value = stripped.partition(':')
+        if not sep or not param.strip():
+            malformed.append((lineno, line))
+            continue
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+            value = value[1:-1]
+        entries.append((lineno, param.strip(), value))
+    return entries, malformed
+
+
+def read_style_bytes(path):
+    with open(path, 'rb') as fh:
+        return fh.read()
+
+
+def content_digest(data, *extra):
+    hasher = hashlib.sha1(data)
+    for part in extra:
+        hasher.update(b'\0')
+        hasher.update(str(part).encode('utf8'))
+    return hasher.hexdigest()
+
+
+def read_style_file(path):
+    """
+    :returns: (entries, malformed) as for parse_style_text
+    """
+    with io.open(path, encoding='utf8') as fh:
+        return parse_style_text(fh.read())
+
+
+def rc_validator(param):
+    """matplotlib's validator for ``param``, or None if there is none"""
+    validators = getattr(mpl.rcsetup, '_validators', None)
+    if validators is not None:
+        return validators.get(param)
+    default_params = getattr(mpl.rcsetup, 'defaultParams', {})
+    return default_params.get(param, (None, None))[1]
+
+
+def convert_value(param, value):
+    """
+    Validate and convert a (raw string) value like matplotlib does when
+    loading a style.
+
+    :raises ValueError: on invalid values
+    """
+    validator = rc_validator(param)
+    if validator is None:
+        return value
+    try:
+        return validator(value)
+    except (ValueError, TypeError, RuntimeError) as exc:
+        raise ValueError(str(exc))
+
+
+def write_text_atomic(path, text):
+    """
+    Write via a temporary file in the same directory, so that readers
+    never see a partially written file.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with io.open(tmp_path, 'w', encoding='utf8') as fh:
+        fh.write(text)
+    os.replace(tmp_path, path)
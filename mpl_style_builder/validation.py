@@ -0,0 +1,230 @@
+"""
+Validation of styles against the rcParams schema and matplotlib's
+validators, for single styles as well as whole style libraries:
+
+    mpl-style-validate ~/.config/matplotlib/stylelib house-styles/ --json
+
+Results are cached per file content, so re-validating an unchanged library
+only hashes its files.
+"""
+from __future__ import print_function, division, unicode_literals
+
+import os
+import sys
+import json
+import difflib
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib as mpl
+
+from mpl_style_builder import schema
+from mpl_style_builder.stylefile import (
+    parse_style_text,
+    read_style_bytes,
+    content_digest,
+    convert_value,
+    rc_validator,
+)
+
+import logging
+logger = logging.getLogger('validation')
+
+ERROR = 'error'
+WARNING = 'warning'
+
+Diagnostic = namedtuple(
+    'Diagnostic',
+    ['path', 'line', 'param', 'value', 'severity', 'code', 'message']
+)
+
+
+def format_diagnostic(diagnostic):
+    location = diagnostic.path or '<style>'
+    if diagnostic.line is not None:
+        location += ':{}'.format(diagnostic.line)
+    return '{}: {} [{}] {}'.format(location, diagnostic.severity,
+                                   diagnostic.code, diagnostic.message)
+
+
+def check_param(param, value, params, path=None, line=None):
+    """
+    Diagnostics for one param/value pair, where value is either a raw
+    string from a style file or an already converted value.
+
+    :param params: {paramname: prop}, the schema
+    :returns: [Diagnostic]
+    """
+    def diagnostic(severity, code, message):
+        return Diagnostic(path, line, param, str(value), severity, code,
+                          message)
+
+    diagnostics = []
+    if param not in params:
+        if rc_validator(param) is None:
+            message = 'unknown param {!r}'.format(param)
+            suggestions = difflib.get_close_matches(
+                param, set(params) | set(mpl.rcParams), n=3
+            )
+            if suggestions:
+                message += ', did you mean {}?'.format(
+                    ' or '.join(suggestions)
+                )
+            return [diagnostic(ERROR, 'unknown-param', message)]
+        # The schema was generated for another matplotlib version
+        diagnostics.append(diagnostic(
+            WARNING, 'not-in-schema', '{} is not in the param schema, but '
+            'known to matplotlib {}'.format(param, mpl.__version__)
+        ))
+    try:
+        converted = convert_value(param, value)
+    except ValueError as exc:
+        return diagnostics + [diagnostic(
+            ERROR, 'invalid-value',
+            'invalid value {!r} for {}: {}'.format(value, param, exc)
+        )]
+    options = params.get(param, {}).get('options')
+    if options and str(converted) not in map(str, options):
+        diagnostics.append(diagnostic(
+            WARNING, 'unknown-option', '{!r} is not one of the known '
+            'options for {}: {}'.format(converted, param, ', '.join(options))
+        ))
+    return diagnostics
+
+
+def validate_text(text, params, path=None):
+    """
+    :returns: [Diagnostic], for the contents of a style file
+    """
+    entries, malformed = parse_style_text(text)
+    diagnostics = [
+        Diagnostic(path, lineno, None, line.strip(), ERROR, 'syntax',
+                   'expected "param: value"')
+        for lineno, line in malformed
+    ]
+    first_seen = {}
+    for lineno, param, value in entries:
+        if param in first_seen:
+            diagnostics.append(Diagnostic(
+                path, lineno, param, value, WARNING, 'duplicate-param',
+                '{} already set on line {}'.format(param, first_seen[param])
+            ))
+        first_seen.setdefault(param, lineno)
+        diagnostics.extend(check_param(param, value, params, path, lineno))
+    return sorted(diagnostics, key=lambda d: (d.line or 0, d.code))
+
+
+def validate_style_dict(rcparams, params, path=None):
+    """
+    :returns: [Diagnostic], for a {param: value} style, e.g. an entry of
+        matplotlib.style.library
+    """
+    diagnostics = []
+    for param, value in sorted(rcparams.items()):
+        diagnostics.extend(check_param(param, value, params, path))
+    return diagnostics
+
+
+def _validate_file_job(path, schema_path):
+    _categorized, params = schema.load_schema(schema_path)
+    with open(path, 'rb') as fh:
+        text = fh.read().decode('utf8', 'replace')
+    return [tuple(d) for d in validate_text(text, params, path)]
+
+
+def find_style_files(paths):
+    """Expand directories to the .mplstyle files below them"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith('.mplstyle'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def validate_files(paths, schema_path=schema.DEFAULT_SCHEMA_PATH,
+                   max_workers=None, cache_dir=None):
+    """
+    Validate many style files in parallel.
+
+    :param cache_dir: directory of per-content cached results, defaults to
+        a directory in the user cache dir
+    :returns: {path: [Diagnostic]}
+    """
+    cache_dir = cache_dir or os.path.join(schema.default_cache_dir(),
+                                          'validation')
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # Results depend on the schema and the validators as much as on the file
+    schema_stamp = os.stat(schema_path).st_mtime, mpl.__version__
+    results = {}
+    todo = {}
+    for path in find_style_files(paths):
+        try:
+            digest = content_digest(read_style_bytes(path), *schema_stamp)
+        except (IOError, OSError) as exc:
+            results[path] = [Diagnostic(path, None, None, None, ERROR,
+                                        'unreadable', str(exc))]
+            continue
+        cache_path = os.path.join(cache_dir, digest + '.json')
+        try:
+            with open(cache_path) as fh:
+                results[path] = [Diagnostic(*[path] + d[1:])
+                                 for d in json.load(fh)]
+            continue
+        except (IOError, OSError, ValueError):
+            todo[path] = cache_path
+    if todo:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = dict(
+                (path, executor.submit(_validate_file_job, path, schema_path))
+                for path in todo
+            )
+            for path, future in futures.items():
+                diagnostics = [Diagnostic(*d) for d in future.result()]
+                results[path] = diagnostics
+                tmp_path = '{}.{}.tmp'.format(todo[path], os.getpid())
+                with open(tmp_path, 'w') as fh:
+                    json.dump([list(d) for d in diagnostics], fh)
+                os.replace(tmp_path, todo[path])
+    logger.debug('Validated %d files, %d from cache',
+                 len(results), len(results) - len(todo))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Validate .mplstyle files against the rcParams schema'
+    )
+    parser.add_argument('paths', nargs='+',
+                        help='.mplstyle files or directories of them')
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--json', action='store_true',
+                        help='print diagnostics as json')
+    parser.add_argument('--strict', action='store_true',
+                        help='fail on warnings too')
+    args = parser.parse_args(argv)
+    results = validate_files(args.paths, max_workers=args.jobs,
+                             cache_dir=args.cache_dir)
+    diagnostics = [d for path in sorted(results) for d in results[path]]
+    if args.json:
+        json.dump([d._asdict() for d in diagnostics], sys.stdout, indent=1)
+        print()
+    else:
+        for diagnostic in diagnostics:
+            print(format_diagnostic(diagnostic))
+        print('{} files, {} errors, {} warnings'.format(
+            len(results),
+            sum(d.severity == ERROR for d in diagnostics),
+            sum(d.severity == WARNING for d in diagnostics),
+        ))
+    failing = (ERROR, WARNING) if args.strict else (ERROR,)
+    return 1 if any(d.severity in failing for d in diagnostics) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
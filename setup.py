@@ -1,5 +1,8 @@
 from __future__ import division, print_function
 
+import os
+import sys
+
 from setuptools import setup
 
 VERSION = '0.1.0'
@@ -62,6 +65,22 @@ pre_dependencies = [
 
 from setuptools.command.install import install
 from setuptools.command.develop import develop
+from setuptools.command.build_py import build_py
+from setuptools.command.sdist import sdist
+
+
+def generate_schema():
+    """
+    Regenerate mpl_style_builder/rcParams.yaml unless it already is for the
+    installed matplotlib. Without matplotlib or pyyaml in the build
+    environment, the packaged schema is kept.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        import transform_rcparams
+        transform_rcparams.generate_schema()
+    except ImportError as exc:
+        print('WARNING: keeping the packaged rcParams schema: %s' % exc)
 
 class PreInstallHook(install):
     def run(self):
@@ -75,6 +94,18 @@ class PreDevelopHook(develop):
         develop.run(self)
 
 
+class SchemaBuildPyHook(build_py):
+    def run(self):
+        generate_schema()
+        build_py.run(self)
+
+
+class SchemaSdistHook(sdist):
+    def run(self):
+        generate_schema()
+        sdist.run(self)
+
+
 setup(
     name="mpl_style_builder",
     version=VERSION,
@@ -86,6 +117,9 @@ setup(
     packages=[
         'mpl_style_builder'
     ],
+    package_data={
+        'mpl_style_builder': ['rcParams.yaml'],
+    },
     install_requires=[
         'matplotlib>=1.5.0', # maybe higher required TODO: test
         'pyyaml'
@@ -95,10 +129,18 @@ setup(
     cmdclass={
         'install': PreInstallHook, # TODO verify behaviour
         'develop': PreDevelopHook, # TODO verify behaviour
+        'build_py': SchemaBuildPyHook,
+        'sdist': SchemaSdistHook,
     },
     entry_points={
         'console_scripts': [
             'mpl-style-builder=mpl_style_builder.main:main',
+            'mpl-style-gallery=mpl_style_builder.batch:main',
+            'mpl-style-validate=mpl_style_builder.validation:main',
+            'mpl-style-server=mpl_style_builder.server:main',
+            'mpl-style-query=mpl_style_builder.style_store:main',
+            'mpl-style-audit=mpl_style_builder.color_audit:main',
+            'mpl-style-diff=mpl_style_builder.image_diff:main',
         ],
     },
 )
@@ -0,0 +1,30 @@
+from __future__ import print_function, division, unicode_literals
+
+import matplotlib as mpl
+
+from mpl_style_builder.color_audit import (
+    CONTRAST_RULES, PROP_CYCLE, audit_style, color_params_of
+)
+
+
+def test_contrast_rules_use_known_color_params():
+    color_params = color_params_of({})  # a schema without any colors
+    for background, foregrounds, _minimum in CONTRAST_RULES:
+        for param in (background,) + foregrounds:
+            if param != PROP_CYCLE and param in mpl.rcParams:
+                assert param in color_params
+    assert PROP_CYCLE not in color_params
+    assert 'my.color' in color_params_of({'my.color': {'type':
+                                                       'colorstring'}})
+
+
+def test_audit_style():
+    color_params = color_params_of({})
+    assert not [issue for issue in audit_style({}, color_params)
+                if issue.second == 'figure.facecolor']
+    issues = audit_style({'figure.facecolor': 'black',
+                          'axes.titlecolor': 'white'}, color_params)
+    flagged = set(issue.first for issue in issues
+                  if issue.second == 'figure.facecolor')
+    assert {'text.color', 'axes.labelcolor', 'xtick.color'} <= flagged
+    assert 'axes.titlecolor' not in flagged
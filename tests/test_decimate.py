@@ -0,0 +1,160 @@
+from __future__ import print_function, division, unicode_literals
+
+import pickle
+
+import numpy as np
+import pytest
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from mpl_style_builder.decimate import (
+    minmax_indices, lttb_indices, grid_indices, decimated_plotting,
+    DecimatingCallback
+)
+
+N = 100000
+
+
+def axes():
+    fig = Figure(figsize=(4, 3), dpi=50)  # about 150 pixels wide axes
+    FigureCanvasAgg(fig)
+    return fig.add_subplot(111)
+
+
+def walk(n=N, seed=0):
+    return np.random.RandomState(seed).standard_normal(n).cumsum()
+
+
+def plot_walk(fig):
+    fig.add_subplot(111).plot(walk())
+
+
+def test_minmax_keeps_the_envelope():
+    x, y = np.arange(N), walk()
+    keep = minmax_indices(x, y, 100)
+    assert len(keep) <= 4 * 100
+    assert (np.diff(keep) > 0).all()
+    assert keep[0] == 0 and keep[-1] == N - 1
+    for chunk in np.array_split(np.arange(N), 10):
+        assert y[chunk].max() == y[keep[np.isin(keep, chunk)]].max()
+        assert y[chunk].min() == y[keep[np.isin(keep, chunk)]].min()
+
+
+def test_lttb():
+    x, y = np.arange(N, dtype=float), walk()
+    keep = lttb_indices(x, y, 300)
+    assert len(keep) == 300
+    assert keep[0] == 0 and keep[-1] == N - 1
+    assert (np.diff(keep) > 0).all()
+    assert (lttb_indices(x[:10], y[:10], 300) == np.arange(10)).all()
+
+
+def test_grid_keeps_one_point_per_cell():
+    rng = np.random.RandomState(0)
+    x, y = rng.uniform(0, 1, N), rng.uniform(0, 1, N)
+    x[:2], y[:2] = (0, 1), (0, 1)
+
+    def cells(indices):
+        return list(zip((x[indices] * 9).astype(int),
+                        (y[indices] * 9).astype(int)))
+    keep = grid_indices(x, y, 10, 10)
+    assert len(set(cells(keep))) == len(keep)
+    assert set(cells(keep)) == set(cells(np.arange(N)))
+
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+def test_decimated_plotting_reduces_long_lines(method):
+    ax = axes()
+    y = walk()
+    with decimated_plotting(method):
+        line, = ax.plot(y, 'r-')
+    xdata, ydata = line.get_xdata(), line.get_ydata()
+    assert 100 < len(ydata) < 2000
+    assert line.get_color() == 'r'
+    assert (ydata == y[xdata]).all()
+    if method == 'minmax':
+        assert ydata.min() == y.min() and ydata.max() == y.max()
+
+
+def test_decimated_plotting_leaves_other_lines_alone():
+    ax = axes()
+    y = walk()
+    unsorted_x = np.random.RandomState(1).permutation(N)
+    gappy = y.copy()
+    gappy[N // 2] = np.nan
+    with decimated_plotting():
+        short, = ax.plot(y[:100])
+        unsorted, = ax.plot(unsorted_x, y)
+        gaps, = ax.plot(gappy)
+        labelled, = ax.plot('t', 'v', data={'t': np.arange(N), 'v': y})
+    for line in (unsorted, gaps, labelled):
+        assert len(line.get_ydata()) == N
+    assert len(short.get_ydata()) == 100
+
+
+def test_decimated_scatter():
+    ax = axes()
+    rng = np.random.RandomState(0)
+    x, y = rng.uniform(0, 1, N), rng.uniform(0, 1, N)
+    with decimated_plotting():
+        reduced = ax.scatter(x, y)
+        colored = ax.scatter(x, y, c=y)
+    assert len(reduced.get_offsets()) < N // 2
+    assert len(colored.get_offsets()) == N
+
+
+def test_axes_methods_are_restored():
+    plot, scatter = Axes.plot, Axes.scatter
+    with pytest.raises(ZeroDivisionError):
+        with decimated_plotting('lttb'):
+            assert Axes.plot is not plot
+            1 / 0
+    assert (Axes.plot, Axes.scatter) == (plot, scatter)
+    with pytest.raises(ValueError):
+        with decimated_plotting('every-other'):
+            pass
+
+
+def test_decimating_callback():
+    callback = pickle.loads(pickle.dumps(DecimatingCallback(plot_walk)))
+    fig = Figure(figsize=(4, 3), dpi=50)
+    FigureCanvasAgg(fig)
+    callback(fig)
+    assert len(fig.axes[0].lines[0].get_ydata()) < 2000
+    assert callback.__qualname__ == 'decimated[minmax](plot_walk)'
+    assert DecimatingCallback(plot_walk, 'lttb').__qualname__ != \
+        callback.__qualname__
+
+
+@pytest.mark.parametrize('sequence', [list, tuple, np.asarray])
+def test_decimated_plotting_of_sequences(sequence):
+    ax = axes()
+    y = walk()
+    with decimated_plotting():
+        line, = ax.plot(sequence(range(N)), sequence(y))
+        single, = ax.plot(sequence(y))
+    for reduced in (line, single):
+        assert len(reduced.get_ydata()) < 2000
+        assert reduced.get_ydata().max() == y.max()
+
+
+def test_decimated_plotting_of_datetimes():
+    ax = axes()
+    x = np.datetime64('2020-01-01') + np.arange(N).astype('timedelta64[s]')
+    y = walk()
+    with decimated_plotting():
+        line, = ax.plot(x, y)
+    xdata = np.asarray(line.get_xdata())
+    assert len(xdata) < 2000
+    assert xdata.dtype == x.dtype
+    assert xdata[0] == x[0] and xdata[-1] == x[-1]
+
+
+def test_pandas_objects_are_left_alone():
+    pd = pytest.importorskip('pandas')
+    ax = axes()
+    series = pd.Series(walk(), index=np.arange(N) * 2)
+    with decimated_plotting():
+        line, = ax.plot(series)
+    assert len(line.get_ydata()) == N
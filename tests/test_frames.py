@@ -0,0 +1,23 @@
+from __future__ import print_function, division, unicode_literals
+
+from concurrent.futures import ProcessPoolExecutor
+
+from mpl_style_builder.frames import RenderedFrame, render_to_shared_memory
+
+
+def plot(fig):
+    fig.add_subplot(111).plot([1, 2, 3])
+
+
+def test_shared_memory_outlives_the_worker():
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        name, width, height, dpi, reads = executor.submit(
+            render_to_shared_memory, {'lines.linewidth': 3}, plot, (2, 2), 20
+        ).result()
+    # The worker has exited without unlinking the block
+    frame = RenderedFrame.from_shared_memory(name, width, height, dpi=dpi)
+    assert (width, height, dpi) == (40, 40, 20)
+    assert len(frame.to_bytes()) == width * height * 4
+    assert 'lines.linewidth' in reads
+    frame.release()
+    assert not frame.is_shared
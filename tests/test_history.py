@@ -0,0 +1,192 @@
+from __future__ import print_function, division, unicode_literals
+
+import random
+
+import pytest
+
+from mpl_style_builder.history import PersistentMap, StyleHistory
+from mpl_style_builder.session import StyleSession
+
+
+class CollidingKey(object):
+    """Key with a chosen hash, to force trie collisions"""
+    def __init__(self, name, key_hash):
+        self.name = name
+        self.key_hash = key_hash
+
+    def __hash__(self):
+        return self.key_hash
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.name == other.name
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'CollidingKey({!r}, {})'.format(self.name, self.key_hash)
+
+
+def test_set_get_delete():
+    empty = PersistentMap()
+    first = empty.set('lines.linewidth', 2.0)
+    second = first.set('axes.grid', True)
+    assert len(empty) == 0 and 'lines.linewidth' not in empty
+    assert len(first) == 1 and first['lines.linewidth'] == 2.0
+    assert second.to_dict() == {'lines.linewidth': 2.0, 'axes.grid': True}
+    third = second.delete('lines.linewidth')
+    assert third.to_dict() == {'axes.grid': True}
+    assert second.to_dict() == {'lines.linewidth': 2.0, 'axes.grid': True}
+    with pytest.raises(KeyError):
+        third['lines.linewidth']
+    assert third.get('lines.linewidth', 'missing') == 'missing'
+
+
+def test_unchanged_updates_return_same_map():
+    state = PersistentMap.from_dict({'a': 1, 'b': 2})
+    assert state.set('a', 1) is state
+    assert state.delete('missing') is state
+
+
+def test_full_hash_collisions():
+    keys = [CollidingKey(name, 42) for name in 'abcd']
+    state = PersistentMap()
+    for idx, key in enumerate(keys):
+        state = state.set(key, idx)
+    assert len(state) == 4
+    assert [state[key] for key in keys] == [0, 1, 2, 3]
+    state = state.set(keys[1], 'replaced')
+    assert len(state) == 4 and state[keys[1]] == 'replaced'
+    for key in keys[:3]:
+        state = state.delete(key)
+    assert state.to_dict() == {keys[3]: 3}
+    assert state.delete(keys[3]).to_dict() == {}
+
+
+def test_partial_hash_collisions():
+    # Equal in the lowest 5 and 10 bits, so they share trie levels
+    keys = [CollidingKey('a', 1), CollidingKey('b', 1 + 32),
+            CollidingKey('c', 1 + 32 * 32), CollidingKey('d', 1 + 32 * 33)]
+    state = PersistentMap()
+    for idx, key in enumerate(keys):
+        state = state.set(key, idx)
+    assert dict(state.items()) == dict(zip(keys, range(4)))
+    state = state.delete(keys[0]).delete(keys[2])
+    assert state.to_dict() == {keys[1]: 1, keys[3]: 3}
+    assert keys[0] not in state and keys[3] in state
+
+
+def test_matches_dict_under_random_updates():
+    rng = random.Random(1)
+    # Few distinct hashes, so buckets and shared levels are common
+    keys = [CollidingKey(str(idx), rng.randrange(64)) for idx in range(300)]
+    expected, state, snapshots = {}, PersistentMap(), []
+    for step in range(3000):
+        key = rng.choice(keys)
+        if rng.random() < 0.3:
+            expected.pop(key, None)
+            state = state.delete(key)
+        else:
+            expected[key] = step
+            state = state.set(key, step)
+        if step % 500 == 0:
+            snapshots.append((state, dict(expected)))
+    assert state.to_dict() == expected and len(state) == len(expected)
+    for snapshot, snapshot_expected in snapshots:
+        assert snapshot.to_dict() == snapshot_expected
+
+
+def test_structural_sharing():
+    state = PersistentMap.from_dict(dict(('param%d' % idx, idx)
+                                         for idx in range(2000)))
+    updated = state.set('param7', 'new')
+    old_children, new_children = state._root.entries, \
+        updated._root.entries
+    assert len(old_children) == len(new_children) == 32
+    shared = sum(old is new for old, new in zip(old_children, new_children))
+    assert shared == 31
+    assert state['param7'] == 7
+
+
+def test_diff():
+    state = PersistentMap.from_dict(dict(('param%d' % idx, idx)
+                                         for idx in range(500)))
+    other = state.set('param1', 'x').delete('param2').set('added', 0)
+    assert state.diff(other) == {'param1', 'param2', 'added'}
+    assert other.diff(state) == {'param1', 'param2', 'added'}
+    assert state.diff(state) == set()
+
+
+@pytest.fixture(scope='module')
+def schema_cache(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('schema_cache'))
+
+
+@pytest.fixture
+def session(schema_cache):
+    return StyleSession(cache_dir=schema_cache)
+
+
+def test_undo_redo(session):
+    history = StyleHistory(session, merge_seconds=0)
+    session.set('lines.linewidth', 2.0)
+    session.set('axes.grid', True)
+    session.reset('lines.linewidth')
+    assert [entry.label for entry in history.entries] == \
+        ['start', 'lines.linewidth', 'axes.grid', 'lines.linewidth']
+    assert history.undo().label == 'axes.grid'
+    assert session.changed == {'lines.linewidth': 2.0, 'axes.grid': True}
+    history.undo()
+    history.undo()
+    assert session.changed == {}
+    assert not history.can_undo() and history.undo() is None
+    history.redo()
+    assert session.changed == {'lines.linewidth': 2.0}
+    history.go_to(len(history.entries) - 1)
+    assert session.changed == {'axes.grid': True}
+    assert not history.can_redo() and history.redo() is None
+
+
+def test_new_change_truncates_redo_branch(session):
+    history = StyleHistory(session, merge_seconds=0)
+    session.set('lines.linewidth', 2.0)
+    session.set('axes.grid', True)
+    history.undo()
+    assert history.can_redo()
+    session.set('font.size', 14.0)
+    assert [entry.label for entry in history.entries] == \
+        ['start', 'lines.linewidth', 'font.size']
+    assert not history.can_redo()
+    assert session.changed == {'lines.linewidth': 2.0, 'font.size': 14.0}
+
+
+def test_merges_repeated_changes_of_a_param(session):
+    history = StyleHistory(session, merge_seconds=60)
+    for width in (1.5, 2.0, 2.5):
+        session.set('lines.linewidth', width)
+    session.set('axes.grid', True)
+    assert [entry.label for entry in history.entries] == \
+        ['start', 'lines.linewidth', 'axes.grid']
+    history.undo()
+    assert session.changed == {'lines.linewidth': 2.5}
+    history.undo()
+    assert session.changed == {}
+
+
+def test_transaction_is_one_entry(session):
+    history = StyleHistory(session, merge_seconds=0)
+    with session.transaction() as batch:
+        batch.set('lines.linewidth', 2.0)
+        batch.set('axes.grid', True)
+    assert [entry.label for entry in history.entries] == \
+        ['start', '2 params']
+    history.undo()
+    assert session.changed == {}
+    assert len(history.entries) == 2
+
+
+def test_unchanged_value_is_not_recorded(session):
+    history = StyleHistory(session, merge_seconds=0)
+    session.set('lines.linewidth', 2.0)
+    session.set('lines.linewidth', 2.0)
+    assert len(history.entries) == 2
@@ -0,0 +1,126 @@
+from __future__ import print_function, division, unicode_literals
+
+import json
+
+import numpy as np
+
+from mpl_style_builder.frames import RenderedFrame
+from mpl_style_builder.image_diff import (
+    composite_on_white, delta_e_map, ssim, changed_blocks, block_regions,
+    compare_frames, comparison_json, Comparison, JND_DELTA_E
+)
+
+
+def frame(pixels):
+    height, width = pixels.shape[:2]
+    return RenderedFrame(width, height, pixels.astype(np.uint8).tobytes())
+
+
+def blank(height=40, width=50):
+    return np.full((height, width, 4), 255, dtype=np.uint8)
+
+
+def test_composite_on_white():
+    rgba = np.array([[0, 0, 0, 255], [0, 0, 0, 0], [0, 0, 0, 128]],
+                    dtype=np.uint8)
+    assert composite_on_white(rgba).tolist() == [
+        [0, 0, 0], [255, 255, 255], [127, 127, 127]
+    ]
+    opaque = np.array([[10, 20, 30, 255]], dtype=np.uint8)
+    assert composite_on_white(opaque).tolist() == [[10, 20, 30]]
+
+
+def test_delta_e():
+    rgb = np.array([[0, 0, 0], [255, 0, 0], [30, 30, 31]], dtype=np.uint8)
+    assert np.allclose(delta_e_map(rgb, rgb), 0)
+    white = np.full_like(rgb, 255)
+    delta_e = delta_e_map(rgb, white)
+    assert np.isclose(delta_e[0], 100, atol=0.1)  # L* 0 against 100
+    assert (delta_e > JND_DELTA_E).all()
+    near = rgb.copy()
+    near[2, 2] = 30
+    assert delta_e_map(rgb, near)[2] < JND_DELTA_E
+
+
+def test_ssim():
+    rng = np.random.RandomState(0)
+    gray = rng.randint(0, 256, (30, 30))
+    assert np.isclose(ssim(gray, gray), 1)
+    assert ssim(gray, 255 - gray) < 0
+    noisy = np.clip(gray + rng.randint(-20, 21, gray.shape), 0, 255)
+    assert 0 < ssim(gray, noisy) < 1
+
+
+def test_changed_blocks_and_regions():
+    delta_e = np.zeros((40, 50))
+    delta_e[0, 0] = 10
+    delta_e[0, 17] = 10
+    delta_e[20, 17] = 10
+    delta_e[39, 49] = 10  # a separate region
+    delta_e[39, 0] = JND_DELTA_E  # not above the threshold
+    blocks = changed_blocks(delta_e, block=16)
+    assert blocks.shape == (3, 4)
+    assert blocks.sum() == 4
+    assert block_regions(blocks, 16, delta_e.shape) == [
+        (0, 0, 32, 32), (48, 32, 50, 40)
+    ]
+
+
+def test_compare_frames():
+    baseline = blank()
+    changed = blank()
+    changed[5:10, 30:35, :3] = 0
+    alpha_only = blank()
+    alpha_only[..., :3] = 0
+    alpha_only[..., 3] = 0  # transparent black composites to white
+    pairs = [
+        (frame(baseline), frame(baseline)),
+        (frame(baseline), frame(changed)),
+        (frame(baseline), frame(alpha_only)),
+        (frame(baseline), frame(blank(30, 50))),
+    ]
+    same, different, invisible, resized = compare_frames(
+        pairs, block=16, keep_heatmaps=True
+    )
+    assert not same['changed'] and same['ssim'] == 1
+    assert same['regions'] == []
+    assert different['changed']
+    assert different['ssim'] < 1
+    assert different['regions'] == [(16, 0, 48, 16)]
+    assert np.isclose(different['changed_fraction'], 25 / (40 * 50))
+    assert different['heatmap'].shape == (40, 50)
+    assert not invisible['changed']
+    assert invisible['max_delta_e'] == 0
+    assert resized['changed'] and resized['regions'] == [(0, 0, 50, 40)]
+
+
+def test_compare_frames_in_chunks():
+    baseline = blank()
+    pairs = []
+    for idx in range(5):
+        changed = blank()
+        changed[idx, idx, :3] = 0
+        pairs.append((frame(baseline), frame(changed)))
+    expected = compare_frames(pairs, block=16)
+    chunked = compare_frames(pairs, block=16, chunk_size=2)
+    for result, reference in zip(chunked, expected):
+        assert result['changed']
+        assert result['regions'] == reference['regions'] == [(0, 0, 16, 16)]
+        assert result['ssim'] == reference['ssim']
+
+
+def test_comparison_json():
+    baseline, changed = blank(), blank()
+    changed[10:20, 10:20, :3] = 0
+    results = compare_frames([(frame(baseline), frame(changed)),
+                              (frame(baseline), frame(blank(30, 50)))],
+                             keep_heatmaps=True)
+    fields = [json.loads(json.dumps(
+        comparison_json(Comparison('house', 'default', **result)),
+        allow_nan=False
+    )) for result in results]
+    assert all(field['heatmap'] is None for field in fields)
+    assert fields[0]['max_delta_e'] > JND_DELTA_E
+    assert fields[1]['max_delta_e'] is None
+    assert fields[1]['mean_delta_e'] is None
+    assert fields[1]['regions'] == [[0, 0, 50, 40]]
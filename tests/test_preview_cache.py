@@ -0,0 +1,127 @@
+from __future__ import print_function, division, unicode_literals
+
+import os
+
+from mpl_style_builder.frames import RenderedFrame
+from mpl_style_builder.preview_cache import (
+    PreviewCache, cache_key, callback_identity, is_process_local,
+    LOCAL_KEY_PREFIX
+)
+
+
+def plot(fig):
+    fig.add_subplot(111).plot([1, 2, 3])
+
+
+def other_plot(fig):
+    fig.add_subplot(111).bar([1, 2, 3], [3, 2, 1])
+
+
+def frame(fill, width=4, height=2):
+    return RenderedFrame(width, height,
+                         bytes(bytearray([fill]) * (width * height * 4)),
+                         dpi=72)
+
+
+def test_cache_key():
+    key = cache_key({'lines.linewidth': 2.0, 'axes.grid': True}, plot)
+    assert key == cache_key({'axes.grid': True, 'lines.linewidth': 2.0},
+                            plot)
+    assert key != cache_key({'lines.linewidth': 3.0, 'axes.grid': True},
+                            plot)
+    assert key != cache_key({'lines.linewidth': 2.0, 'axes.grid': True},
+                            other_plot)
+    assert key != cache_key({'lines.linewidth': 2.0, 'axes.grid': True},
+                            plot, (6, 4))
+
+
+def edited_plot(linewidth):
+    """A plot function named like the module's own, with another body"""
+    namespace = {'__name__': __name__}
+    exec('def plot(fig):\n'
+         '    fig.add_subplot(111).plot([1, 2, 3], lw={})\n'.format(linewidth),
+         namespace)
+    return namespace['plot']
+
+
+def test_callback_identity():
+    assert callback_identity(plot).startswith(
+        'tests.test_preview_cache.plot#'
+    )
+    assert callback_identity(edited_plot(1)) == \
+        callback_identity(edited_plot(1))
+    assert callback_identity(edited_plot(1)) != \
+        callback_identity(edited_plot(2))
+    assert callback_identity(edited_plot(1)) != callback_identity(plot)
+    first, second = (lambda fig: None), (lambda fig: None)
+    assert callback_identity(first) != callback_identity(second)
+    assert not is_process_local(plot) and is_process_local(first)
+    assert not cache_key({}, plot).startswith(LOCAL_KEY_PREFIX)
+    assert cache_key({}, first).startswith(LOCAL_KEY_PREFIX)
+
+
+def test_lru_eviction():
+    cache = PreviewCache(max_bytes=2 * frame(0).nbytes)
+    for key in 'abc':
+        cache.put(key, frame(ord(key)))
+    assert 'a' not in cache and len(cache) == 2
+    assert cache.get('b').to_bytes() == frame(ord('b')).to_bytes()
+    cache.put('d', frame(ord('d')))  # evicts c, b was used more recently
+    assert 'b' in cache and 'c' not in cache
+    assert cache.get('c') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 1, 2)
+    assert stats['bytes'] == 2 * frame(0).nbytes
+    assert stats['hit_rate'] == 0.5
+
+
+def test_oversized_frames_are_not_cached():
+    cache = PreviewCache(max_bytes=frame(0).nbytes)
+    cache.put('small', frame(0))
+    cache.put('large', frame(0, width=8))
+    assert 'small' in cache and 'large' not in cache
+
+
+def test_disk_tier(tmpdir):
+    disk_dir = str(tmpdir.join('previews'))
+    cache = PreviewCache(disk_dir=disk_dir)
+    cache.put('a', frame(1))
+    restarted = PreviewCache(disk_dir=disk_dir)
+    assert 'a' in restarted and len(restarted) == 0
+    restored = restarted.get('a')
+    assert (restored.width, restored.height, restored.dpi) == (4, 2, 72)
+    assert restored.to_bytes() == frame(1).to_bytes()
+    assert restarted.stats()['disk_hits'] == 1
+    assert len(restarted) == 1
+
+
+def test_process_local_keys_stay_in_memory(tmpdir):
+    disk_dir = str(tmpdir)
+    cache = PreviewCache(disk_dir=disk_dir)
+    key = cache_key({}, lambda fig: None)
+    cache.put(key, frame(1))
+    assert key in cache
+    assert os.listdir(disk_dir) == []
+    assert key not in PreviewCache(disk_dir=disk_dir)
+
+
+def test_disk_tier_is_trimmed_oldest_first(tmpdir):
+    disk_dir = str(tmpdir)
+    entry_bytes = PreviewCache._header.size + frame(0).nbytes
+    cache = PreviewCache(disk_dir=disk_dir, max_disk_bytes=2 * entry_bytes)
+    cache.put('a', frame(1))
+    cache.put('b', frame(2))
+    os.utime(os.path.join(disk_dir, 'a.rgba'), (1000, 1000))
+    os.utime(os.path.join(disk_dir, 'b.rgba'), (2000, 2000))
+    cache.put('c', frame(3))
+    assert sorted(os.listdir(disk_dir)) == ['b.rgba', 'c.rgba']
+
+
+def test_corrupt_disk_entry_is_a_miss(tmpdir):
+    disk_dir = str(tmpdir)
+    PreviewCache(disk_dir=disk_dir).put('a', frame(1))
+    with open(os.path.join(disk_dir, 'a.rgba'), 'ab') as fh:
+        fh.write(b'garbage')
+    cache = PreviewCache(disk_dir=disk_dir)
+    assert cache.get('a') is None
+    assert cache.stats()['misses'] == 1
@@ -0,0 +1,81 @@
+from __future__ import print_function, division, unicode_literals
+
+import threading
+
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from mpl_style_builder.rc_tracing import (
+    recording_rc_reads, differing_params, RcTraces
+)
+
+
+def test_recording_rc_reads():
+    getitem = matplotlib.RcParams.__getitem__
+    with recording_rc_reads() as reads:
+        matplotlib.rcParams['lines.linewidth']
+        matplotlib.rcParams['lines.color']
+    assert reads == {'lines.linewidth', 'lines.color'}
+    assert matplotlib.RcParams.__getitem__ is getitem
+    matplotlib.rcParams['lines.marker']
+    assert 'lines.marker' not in reads
+
+
+def test_nested_and_threaded_recordings():
+    getitem = matplotlib.RcParams.__getitem__
+    with recording_rc_reads() as outer:
+        with recording_rc_reads() as inner:
+            thread = threading.Thread(
+                target=lambda: matplotlib.rcParams['axes.grid']
+            )
+            thread.start()
+            thread.join()
+        matplotlib.rcParams['axes.facecolor']
+        assert matplotlib.RcParams.__getitem__ is not getitem
+    assert matplotlib.RcParams.__getitem__ is getitem
+    assert 'axes.grid' in inner and 'axes.grid' in outer
+    assert 'axes.facecolor' in outer and 'axes.facecolor' not in inner
+
+
+def test_drawing_reads_only_some_params():
+    with matplotlib.rc_context({'axes.grid': False}):
+        with recording_rc_reads() as reads:
+            fig = Figure()
+            FigureCanvasAgg(fig)
+            fig.add_subplot(111).plot([1, 2, 3])
+            fig.canvas.draw()
+    assert {'lines.linewidth', 'axes.facecolor'} <= reads
+    assert 'webagg.port' not in reads
+    assert not any(param.startswith('keymap.') for param in reads)
+
+
+def test_differing_params():
+    assert differing_params(
+        {'a': 1, 'b': 2, 'c': 3}, {'a': 1, 'b': 20, 'd': 4}
+    ) == {'b', 'c', 'd'}
+    assert differing_params({}, {}) == set()
+
+
+def test_rc_traces():
+    traces = RcTraces()
+    assert traces.reads('key') is None
+    assert not traces.unaffected('key', {})
+    traces.record('key', {'lines.linewidth': 2}, ['lines.linewidth'],
+                  extra=(6, 4))
+    assert traces.reads('key') == frozenset(['lines.linewidth'])
+    assert traces.unaffected('key', {'lines.linewidth': 2,
+                                     'savefig.dpi': 300}, (6, 4))
+    assert not traces.unaffected('key', {'lines.linewidth': 3}, (6, 4))
+    assert not traces.unaffected('key', {}, (6, 4))
+    assert not traces.unaffected('key', {'lines.linewidth': 2}, (8, 4))
+
+
+def test_rc_traces_are_bounded():
+    traces = RcTraces(max_entries=2)
+    for key in 'abc':
+        traces.record(key, {}, [key])
+    traces.record('b', {}, ['b'])  # refreshed, so c goes next
+    traces.record('d', {}, ['d'])
+    assert traces.reads('a') is None and traces.reads('c') is None
+    assert traces.reads('b') == frozenset('b')
@@ -0,0 +1,180 @@
+from __future__ import print_function, division, unicode_literals
+
+import time
+
+import pytest
+from matplotlib.backends.qt_compat import QtCore
+
+from mpl_style_builder import render_scheduler
+from mpl_style_builder.render_scheduler import RenderScheduler
+
+
+class FakeClock(object):
+    """Stands in for the time module, so min_interval_ms is deterministic"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtCore.QCoreApplication.instance() or \
+        QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(render_scheduler, 'time', clock)
+    return clock
+
+
+def run_events(app):
+    for _ in range(5):
+        app.processEvents()
+
+
+def test_requests_coalesce_into_one_render_of_the_latest_state(app, clock):
+    state = {'value': None}
+    rendered = []
+    scheduler = RenderScheduler(lambda: rendered.append(state['value']),
+                                min_interval_ms=0)
+    for value in range(10):
+        state['value'] = value
+        scheduler.request()
+    assert scheduler.state == RenderScheduler.PENDING
+    assert scheduler.is_dirty
+    run_events(app)
+    assert rendered == [9]
+    assert scheduler.state == RenderScheduler.IDLE
+    assert (scheduler.requested_count, scheduler.rendered_count) == (10, 1)
+
+
+def test_min_interval_between_renders(app, clock):
+    rendered = []
+    scheduler = RenderScheduler(lambda: rendered.append(clock.now),
+                                min_interval_ms=10000)
+    scheduler.request()
+    run_events(app)
+    clock.now += 0.01
+    scheduler.request()
+    run_events(app)
+    # The second render waits for the rest of the interval...
+    assert rendered == [1000.0]
+    assert scheduler.state == RenderScheduler.PENDING
+    # ...unless flushed
+    scheduler.flush()
+    assert rendered == [1000.0, 1000.01]
+    scheduler.flush()
+    assert len(rendered) == 2
+
+
+def test_request_during_render_renders_again(app, clock):
+    rendered = []
+
+    def render():
+        rendered.append(scheduler.state)
+        if len(rendered) == 1:
+            scheduler.request()
+            scheduler.request()
+    scheduler = RenderScheduler(render, min_interval_ms=0)
+    scheduler.request()
+    run_events(app)
+    assert rendered == [RenderScheduler.RENDERING] * 2
+
+
+def test_suspended_renders_once_after_the_outermost_block(app, clock):
+    rendered = []
+    scheduler = RenderScheduler(lambda: rendered.append(True),
+                                min_interval_ms=0)
+    with scheduler.suspended():
+        scheduler.request()
+        with scheduler.suspended():
+            scheduler.request()
+        run_events(app)
+        assert not rendered
+    run_events(app)
+    assert rendered == [True]
+
+    with pytest.raises(RuntimeError):
+        with scheduler.suspended():
+            scheduler.request()
+            raise RuntimeError
+    run_events(app)
+    assert rendered == [True, True]
+
+
+def test_cancel(app, clock):
+    rendered = []
+    scheduler = RenderScheduler(lambda: rendered.append(True),
+                                min_interval_ms=0)
+    scheduler.request()
+    scheduler.cancel()
+    run_events(app)
+    assert not rendered
+    assert scheduler.state == RenderScheduler.IDLE
+    assert not scheduler.is_dirty
+
+
+def test_failing_render_does_not_stop_the_scheduler(app, clock):
+    rendered = []
+
+    def render():
+        rendered.append(True)
+        if len(rendered) == 1:
+            raise ValueError('broken plot')
+    scheduler = RenderScheduler(render, min_interval_ms=0)
+    scheduler.request()
+    run_events(app)
+    assert scheduler.state == RenderScheduler.IDLE
+    scheduler.request()
+    run_events(app)
+    assert len(rendered) == 2
+
+
+def drafting_scheduler(rendered, settle_ms=50):
+    return RenderScheduler(lambda: rendered.append('final'),
+                           min_interval_ms=0, settle_ms=settle_ms,
+                           draft_func=lambda: rendered.append('draft'))
+
+
+def test_lone_request_renders_final_without_draft(app, clock):
+    rendered = []
+    scheduler = drafting_scheduler(rendered)
+    scheduler.request()
+    run_events(app)
+    time.sleep(0.1)
+    run_events(app)
+    assert rendered == ['final']
+    assert scheduler.draft_count == 0
+
+
+def test_streaming_requests_draft_then_render_final(app, clock):
+    rendered = []
+    scheduler = drafting_scheduler(rendered)
+    scheduler.request()
+    run_events(app)
+    scheduler.request()
+    run_events(app)
+    scheduler.request()
+    run_events(app)
+    assert rendered == ['final', 'draft', 'draft']
+    time.sleep(0.1)  # settle
+    run_events(app)
+    assert rendered == ['final', 'draft', 'draft', 'final']
+    assert (scheduler.rendered_count, scheduler.draft_count) == (4, 2)
+
+
+def test_flush_renders_final_after_drafts(app, clock):
+    rendered = []
+    scheduler = drafting_scheduler(rendered, settle_ms=10000)
+    scheduler.request()
+    scheduler.request()
+    run_events(app)
+    assert rendered == ['draft']
+    scheduler.flush()
+    assert rendered == ['draft', 'final']
+    scheduler.flush()
+    assert rendered == ['draft', 'final']
@@ -0,0 +1,40 @@
+from __future__ import print_function, division, unicode_literals
+
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from mpl_style_builder.restyle import restyle_figure
+
+
+def figure(changed, plot):
+    with matplotlib.rc_context(changed):
+        fig = Figure(figsize=(3, 2), dpi=50)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        plot(ax)
+        fig.canvas.draw()
+    return fig
+
+
+def test_linestyle_given_by_name():
+    fig = figure({'lines.linestyle': 'dashed'},
+                 lambda ax: (ax.plot([1, 2]), ax.plot([2, 1], ':')))
+    assert restyle_figure(fig, {'lines.linestyle': 'dashed'},
+                          {'lines.linestyle': '-.'})
+    default, dotted = fig.axes[0].get_lines()
+    assert default.get_linestyle() == '-.'
+    assert dotted.get_linestyle() == ':'
+
+
+def test_ticks_styled_by_the_callback_are_kept():
+    def plot(ax):
+        ax.plot([1, 2, 3])
+        ax.xaxis.get_major_ticks()[1].tick1line.set_color('red')
+    fig = figure({}, plot)
+    assert restyle_figure(fig, {}, {'xtick.color': 'blue', 'ytick.color':
+                                    'green'})
+    ax = fig.axes[0]
+    assert ax.xaxis.get_major_ticks()[1].tick1line.get_color() == 'red'
+    assert all(tick.tick1line.get_color() == 'green'
+               for tick in ax.yaxis.get_major_ticks())
@@ -0,0 +1,68 @@
+from __future__ import print_function, division, unicode_literals
+
+from mpl_style_builder.search_index import ParamSearchIndex
+
+PARAMS = {
+    'lines.linewidth': {'help': 'line width in points'},
+    'lines.linestyle': {'help': 'solid line'},
+    'axes.linewidth': {'help': 'edge linewidth'},
+    'xtick.major.width': {'help': 'major tick width in points'},
+    'xtick.minor.width': {'help': 'minor tick width in points'},
+    'font.size': {'help': 'default font size in points'},
+    'axes.titlesize': {'help': 'fontsize of the axes title'},
+}
+
+
+def brute_force(params, query):
+    """Names matching every token as name substring or help word prefix"""
+    def matches(name, token):
+        words = (params[name].get('help') or '').lower().split()
+        return token in name.lower() or \
+            any(word.startswith(token) for word in words)
+    return set(name for name in params
+               if all(matches(name, token) for token in query.lower().split()))
+
+
+def test_empty_query_lists_all():
+    assert ParamSearchIndex(PARAMS).search('  ') == sorted(PARAMS)
+
+
+def test_ranking():
+    index = ParamSearchIndex(PARAMS)
+    # Whole segment, then segment prefix, then substring, then help text
+    assert index.search('size') == ['font.size', 'axes.titlesize']
+    assert index.search('linewidth') == ['axes.linewidth',
+                                         'lines.linewidth']
+    assert index.search('wid')[-1] == 'lines.linewidth'
+    assert index.search('points')[0] == 'font.size'
+
+
+def test_all_tokens_must_match():
+    index = ParamSearchIndex(PARAMS)
+    assert index.search('xtick width') == ['xtick.major.width',
+                                           'xtick.minor.width']
+    assert index.search('xtick maj') == ['xtick.major.width']
+    assert index.search('xtick nothing') == []
+
+
+def test_without_help():
+    index = ParamSearchIndex(PARAMS, include_help=False)
+    assert index.search('points') == []
+    assert index.search('font') == ['font.size']
+
+
+def test_matches_brute_force_while_typing():
+    index = ParamSearchIndex(PARAMS)
+    for query in ('l', 'li', 'lin', 'line', 'lines', 'lines.', 'lines.w',
+                  'x', 'xt', 'xtick', 'xtick m', 'xtick mi', 'p', 'po',
+                  'a', 'ax', 'axes t'):
+        assert set(index.search(query)) == brute_force(PARAMS, query), query
+
+
+def test_token_cache_is_bounded():
+    index = ParamSearchIndex(PARAMS)
+    index.max_cached_tokens = 4
+    for query in ('a', 'b', 'c', 'd', 'e', 'f'):
+        index.search(query)
+    assert len(index._token_cache) <= 4
+    assert index.search('font') == ['font.size', 'axes.titlesize']
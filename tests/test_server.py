@@ -0,0 +1,87 @@
+from __future__ import print_function, division, unicode_literals
+
+import json
+import asyncio
+
+import pytest
+
+from mpl_style_builder.server import RenderServer, render_bytes
+
+
+def broken_plot(fig):
+    raise RuntimeError('secret detail')
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode('utf8') if body is not None else b''
+    writer.write('{} {} HTTP/1.1\r\nContent-Length: {}\r\n\r\n'.format(
+        method, path, len(payload)).encode('latin1') + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _sep, content = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), content
+
+
+def run_with_server(test, **kwargs):
+    async def main():
+        server = RenderServer(port=0, max_workers=1, **kwargs)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await test(server, port)
+        finally:
+            server._server.close()
+            server._executor.shutdown()
+    return asyncio.run(main())
+
+
+def test_render_bytes():
+    png, headers = render_bytes({}, 'default', 'png', dpi=20,
+                                figsize=(2, 2))
+    assert png.startswith(b'\x89PNG') and headers == {}
+    pixels, headers = render_bytes({'lines.linewidth': 3}, 'default',
+                                   'rgba', dpi=20, figsize=(2, 2))
+    assert len(pixels) == headers['X-Width'] * headers['X-Height'] * 4
+    assert 'lines.linewidth' in headers['X-Rc-Reads'].split(',')
+    for spec in ('no_such_module:plot', 'os:no_such_function', 'bogus'):
+        with pytest.raises(ValueError):
+            render_bytes({}, spec, 'png')
+
+
+def test_requests():
+    async def test(server, port):
+        render = {'callback': 'default', 'dpi': 20, 'figsize': [2, 2]}
+        results = await asyncio.gather(*[
+            request(port, 'POST', '/render', render) for _ in range(3)
+        ])
+        assert all(status == 200 for status, _content in results)
+        assert len(set(content for _status, content in results)) == 1
+        assert (server.rendered_count, server.merged_count) == (1, 2)
+        status, _content = await request(port, 'POST', '/render', render)
+        assert status == 200 and server.cache.hits == 1
+
+        status, content = await request(port, 'GET', '/health')
+        assert status == 200 and json.loads(content.decode())['rendered'] == 1
+        assert (await request(port, 'GET', '/nowhere'))[0] == 404
+        assert (await request(port, 'GET', '/render'))[0] == 405
+        for body in ({'callback': 'os:getcwd'},
+                     {'rc': {'lines.linewidth': 'thick'}},
+                     {'format': 'gif'},
+                     {'decimate': 'every-other'}):
+            assert (await request(port, 'POST', '/render', body))[0] == 400
+    run_with_server(test)
+
+
+def test_module_callbacks():
+    async def test(server, port):
+        for spec in ('no_such_module:plot', 'os:no_such_function'):
+            status, content = await request(port, 'POST', '/render',
+                                            {'callback': spec})
+            assert status == 400 and spec.encode() in content
+        status, content = await request(
+            port, 'POST', '/render', {'callback': __name__ + ':broken_plot'}
+        )
+        assert status == 500 and b'secret' not in content
+    run_with_server(test, allow_modules=True)
@@ -0,0 +1,39 @@
+from __future__ import print_function, division, unicode_literals
+
+import os
+
+import matplotlib.style
+
+from mpl_style_builder.style_index import StyleIndex, library_dirs
+
+
+def test_library_dirs(tmpdir):
+    dirs = library_dirs()
+    assert os.path.isfile(os.path.join(dirs[0], 'ggplot.mplstyle'))
+    index = StyleIndex(index_path=str(tmpdir.join('index.json')))
+    index.refresh()
+    public = set(name for name in index.available
+                 if not name.startswith('_'))
+    assert public == set(matplotlib.style.available)
+
+
+def test_refresh(tmpdir):
+    base, user = tmpdir.mkdir('base'), tmpdir.mkdir('user')
+    base.join('house.mplstyle').write('lines.linewidth: 1\n')
+    base.join('dark.mplstyle').write('axes.facecolor: black\n')
+    user.join('house.mplstyle').write('lines.linewidth: 2\n')
+    index_path = str(tmpdir.join('index.json'))
+    index = StyleIndex([str(base), str(user)], index_path)
+    assert index.refresh()
+    assert index.available == ['dark', 'house']
+    assert index.get('house') == {'lines.linewidth': 2.0}  # later dir wins
+    assert not index.refresh()
+
+    base.join('dark.mplstyle').remove()
+    user.join('house.mplstyle').write('lines.linewidth: thick\n')
+    assert index.refresh()
+    assert index.available == ['house']
+    assert index.raw_params('house') == {'lines.linewidth': 'thick'}
+    assert index.get('house') == {}  # invalid values are left out
+    assert StyleIndex([str(base), str(user)], index_path).available == \
+        ['house']
@@ -0,0 +1,124 @@
+from __future__ import print_function, division, unicode_literals
+
+import os
+
+import pytest
+
+from mpl_style_builder.style_store import (
+    StyleStore,
+    Condition,
+    parse_condition,
+    parse_query,
+    normalize_value,
+)
+
+STYLES = {
+    'big': 'font.size: 14\naxes.grid: True\n'
+           "axes.prop_cycle: cycler('color', ['1f77b4', 'ff7f0e'])\n",
+    'small': 'font.size: 9\naxes.facecolor: EEEEEE\n',
+    'dashed': 'lines.linestyle: --\nfont.size: 12.0\n',
+}
+
+
+def write_style(directory, name, text):
+    path = os.path.join(directory, name + '.mplstyle')
+    with open(path, 'w') as fh:
+        fh.write(text)
+    return path
+
+
+@pytest.fixture
+def style_dir(tmp_path):
+    directory = tmp_path / 'styles'
+    directory.mkdir()
+    for name, text in STYLES.items():
+        write_style(str(directory), name, text)
+    return str(directory)
+
+
+@pytest.fixture
+def store(tmp_path, style_dir):
+    store = StyleStore(db_path=str(tmp_path / 'store.sqlite'),
+                       dirs=[style_dir])
+    assert store.refresh()
+    return store
+
+
+def names(matches):
+    return [name for name, _path in matches]
+
+
+def test_parse_condition():
+    assert parse_condition('axes.grid') == Condition('axes.grid', None, None)
+    assert parse_condition(' font.size >= 12 ') == \
+        Condition('font.size', '>=', '12')
+    assert parse_condition('lines.linestyle=--') == \
+        Condition('lines.linestyle', '=', '--')
+    for invalid in ('font.size>', 'font.size>big', '=12'):
+        with pytest.raises(ValueError):
+            parse_condition(invalid)
+
+
+def test_parse_query_keeps_brackets_together():
+    conditions = parse_query("font.size>12, axes.prop_cycle~'1f77b4' "
+                             "axes.prop_cycle=cycler('color', ['r', 'g'])")
+    assert [condition.param for condition in conditions] == \
+        ['font.size', 'axes.prop_cycle', 'axes.prop_cycle']
+    assert conditions[2].value == "cycler('color', ['r', 'g'])"
+    with pytest.raises(ValueError):
+        parse_query('  ')
+
+
+def test_normalize_value():
+    assert normalize_value('#EEEEEE') == 'eeeeee'
+    assert normalize_value('cycler("color", [ "r" ])') == \
+        "cycler('color',['r'])"
+
+
+def test_presence_and_numeric_queries(store):
+    assert names(store.query('font.size')) == ['big', 'dashed', 'small']
+    assert names(store.query('axes.grid')) == ['big']
+    assert names(store.query('font.size>12')) == ['big']
+    assert names(store.query('font.size>=12')) == ['big', 'dashed']
+    assert names(store.query('font.size<12')) == ['small']
+    assert names(store.query('font.size=12')) == ['dashed']
+    assert names(store.query('font.size!=12')) == ['big', 'small']
+
+
+def test_text_queries(store):
+    assert names(store.query('axes.facecolor=eeeeee')) == ['small']
+    assert names(store.query('axes.facecolor=#eeeeee')) == ['small']
+    assert names(store.query('lines.linestyle=--')) == ['dashed']
+    assert names(store.query('axes.prop_cycle~FF7F0E')) == ['big']
+    assert names(store.query('axes.prop_cycle~%')) == []
+
+
+def test_conditions_are_combined(store):
+    assert names(store.query('font.size>=9 axes.grid')) == ['big']
+    assert names(store.query('font.size axes.facecolor')) == ['small']
+    assert names(store.query([Condition('font.size', '<', '0')])) == []
+
+
+def test_values(store, style_dir):
+    path = os.path.join(style_dir, 'big.mplstyle')
+    assert dict(store.values(path, ['font.size', 'axes.grid'])) == \
+        {'font.size': '14', 'axes.grid': 'True'}
+
+
+def test_incremental_refresh(store, style_dir):
+    assert not store.refresh()
+    path = write_style(style_dir, 'small', 'font.size: 20\n')
+    os.utime(path, (1, 1))  # mtime differs from the stored one
+    write_style(style_dir, 'new', 'axes.grid: False\n')
+    os.remove(os.path.join(style_dir, 'dashed.mplstyle'))
+    assert store.refresh()
+    assert names(store.query('font.size>12')) == ['big', 'small']
+    assert names(store.query('axes.grid')) == ['big', 'new']
+    assert names(store.query('lines.linestyle')) == []
+
+
+def test_update_file(store, style_dir):
+    path = write_style(style_dir, 'saved', 'font.size: 30\n')
+    assert store.update_file(path)
+    assert not store.update_file(path)
+    assert names(store.query('font.size>20')) == ['saved']
@@ -0,0 +1,137 @@
+from __future__ import print_function, division, unicode_literals
+
+import os
+
+import pytest
+
+from mpl_style_builder import validation
+from mpl_style_builder.validation import (
+    ERROR, WARNING, check_param, validate_text, validate_style_dict,
+    validate_files
+)
+from mpl_style_builder.session import StyleSession
+
+PARAMS = {
+    'lines.linewidth': {'type': 'float'},
+    'lines.linestyle': {'type': 'string'},
+    'font.style': {'type': 'string',
+                   'options': ['normal', 'italic', 'oblique']},
+}
+
+SCHEMA = """\
+lines:
+  lines.linewidth: {default: 1.0, type: float}
+  lines.linestyle: {default: '-', type: string}
+"""
+
+
+def codes(diagnostics):
+    return [(d.line, d.param, d.severity, d.code) for d in diagnostics]
+
+
+def test_check_param():
+    assert check_param('lines.linewidth', '2.5', PARAMS) == []
+    assert check_param('lines.linewidth', 2.5, PARAMS) == []
+    unknown, = check_param('lines.linewidht', '2', PARAMS)
+    assert (unknown.severity, unknown.code) == (ERROR, 'unknown-param')
+    assert 'did you mean lines.linewidth or' in unknown.message
+    invalid, = check_param('lines.linewidth', 'thick', PARAMS, 'a.mplstyle',
+                           3)
+    assert invalid[:5] == ('a.mplstyle', 3, 'lines.linewidth', 'thick',
+                           ERROR)
+    assert invalid.code == 'invalid-value'
+    option, = check_param('font.style', 'slanted', PARAMS)
+    assert (option.severity, option.code) == (WARNING, 'unknown-option')
+    assert check_param('font.style', 'italic', PARAMS) == []
+
+
+def test_params_missing_from_the_schema():
+    # Known to matplotlib, but not to this schema
+    missing, = check_param('axes.titlelocation', 'left', PARAMS)
+    assert (missing.severity, missing.code) == (WARNING, 'not-in-schema')
+    assert codes(check_param('axes.titlelocation', 'middle', PARAMS)) == [
+        (None, 'axes.titlelocation', WARNING, 'not-in-schema'),
+        (None, 'axes.titlelocation', ERROR, 'invalid-value'),
+    ]
+    unknown, = check_param('axes.titlelocaton', 'left', PARAMS)
+    assert unknown.code == 'unknown-param'
+    assert 'did you mean axes.titlelocation' in unknown.message
+
+
+def test_session_loads_params_missing_from_the_schema(tmpdir):
+    schema_path = tmpdir.join('rcParams.yaml')
+    schema_path.write(SCHEMA)
+    session = StyleSession(str(schema_path), cache_dir=str(tmpdir))
+    applied = session.load_style({'lines.linewidth': 2,
+                                  'axes.titlelocation': 'left',
+                                  'axes.titlelocaton': 'left'})
+    assert sorted(applied) == ['axes.titlelocation', 'lines.linewidth']
+    assert session.value('axes.titlelocation') == 'left'
+    assert session.diff()['axes.titlelocation'] == ('center', 'left')
+    assert session.to_mplstyle() == \
+        'axes.titlelocation: left\nlines.linewidth: 2'
+    with pytest.raises(ValueError):
+        session.set('axes.titlelocaton', 'left')
+
+
+def test_validate_text():
+    text = '\n'.join([
+        '# house style',
+        'lines.linewidth: 2  # thicker',
+        'lines.linestyle "--"',
+        'font.style: slanted',
+        'lines.linewidth: 3',
+    ])
+    assert codes(validate_text(text, PARAMS)) == [
+        (3, None, ERROR, 'syntax'),
+        (4, 'font.style', WARNING, 'unknown-option'),
+        (5, 'lines.linewidth', WARNING, 'duplicate-param'),
+    ]
+
+
+def test_validate_style_dict():
+    diagnostics = validate_style_dict(
+        {'lines.linewidth': 'thick', 'lines.linestyle': '--'}, PARAMS
+    )
+    assert codes(diagnostics) == [
+        (None, 'lines.linewidth', ERROR, 'invalid-value')
+    ]
+
+
+def test_validate_files_caches_results(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join('cache')))
+    schema_path = tmpdir.join('rcParams.yaml')
+    schema_path.write(SCHEMA)
+    library = tmpdir.mkdir('stylelib')
+    library.join('good.mplstyle').write('lines.linewidth: 2\n')
+    library.join('bad.mplstyle').write('lines.linewidth: thick\n')
+    library.join('notes.txt').write('not a style\n')
+    cache_dir = str(tmpdir.join('validation'))
+    results = validate_files([str(library)], str(schema_path),
+                             max_workers=1, cache_dir=cache_dir)
+    good = os.path.join(str(library), 'good.mplstyle')
+    bad = os.path.join(str(library), 'bad.mplstyle')
+    assert sorted(results) == [bad, good]
+    assert results[good] == []
+    assert codes(results[bad]) == [(1, 'lines.linewidth', ERROR,
+                                    'invalid-value')]
+    assert len(os.listdir(cache_dir)) == 2
+
+    def no_workers(*args, **kwargs):
+        raise AssertionError('cached results were validated again')
+    monkeypatch.setattr(validation, 'ProcessPoolExecutor', no_workers)
+    assert validate_files([str(library)], str(schema_path),
+                          cache_dir=cache_dir) == results
+
+
+def test_main_exit_status(tmpdir, monkeypatch, capsys):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join('cache')))
+    style = tmpdir.join('a.mplstyle')
+    cache_dir = str(tmpdir.join('validation'))
+    args = [str(style), '--cache-dir', cache_dir, '-j', '1']
+    style.write('lines.linewidth: 2\nlines.linewidth: 3\n')
+    assert validation.main(args) == 0
+    assert validation.main(args + ['--strict']) == 1
+    style.write('lines.linewidth: thick\n')
+    assert validation.main(args) == 1
+    assert 'invalid-value' in capsys.readouterr().out
@@ -1,9 +1,130 @@
+"""
+Build-time generator of mpl_style_builder/rcParams.yaml, the schema of
+params, types, options and help texts the style builder consumes.
+
+Types and options are derived from the validators in matplotlib.rcsetup,
+help texts are scraped from an rc template file. The schema's first line
+records the matplotlib version it was generated for, and it is only
+regenerated when that differs from the installed version (or on --force):
+
+    python transform_rcparams.py [--force] [--rcfile FILE] [--output FILE]
+"""
 from __future__ import print_function, division, unicode_literals
 
+import os
+import re
+import sys
+import argparse
 from numbers import Number
 from collections import defaultdict, OrderedDict
 
 import matplotlib as mpl
+import matplotlib.rcsetup
+
+try:
+    from enum import Enum
+except ImportError:  # Python 2 without enum34, no enum params either
+    Enum = ()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(HERE, 'mpl_style_builder', 'rcParams.yaml')
+FALLBACK_RCFILE = os.path.join(HERE, 'matplotlibrc2.0.org')
+VERSION_STAMP = '# generated for matplotlib {}\n'
+
+BOOL_VALIDATORS = {'validate_bool', 'validate_bool_maybe_none'}
+FLOAT_VALIDATORS = {
+    'validate_float', 'validate_int', 'validate_float_or_None',
+    'validate_int_or_None', 'validate_dpi',
+}
+COLOR_VALIDATORS = {
+    'validate_color', 'validate_color_or_auto', 'validate_color_or_inherit',
+    'validate_color_for_prop_cycle',
+}
+LIST_VALIDATORS = {
+    'validate_floatlist': 'float',
+    'validate_nseq_float': 'float',
+    'validate_intlist': 'integer',
+    'validate_nseq_int': 'integer',
+    'validate_stringlist': 'string',
+    'validate_colorlist': 'string',
+}
+
+
+def get_validator(key):
+    validators = getattr(mpl.rcsetup, '_validators', None)
+    if validators is not None:
+        return validators.get(key)
+    default_params = getattr(mpl.rcsetup, 'defaultParams', {})
+    return default_params.get(key, (None, None))[1]
+
+
+def validator_name(validator):
+    name = getattr(validator, '__name__', None)
+    if name is None:
+        name = type(validator).__name__
+    # functools.partial(validate_nseq_float, n) and friends
+    func = getattr(validator, 'func', None)
+    if func is not None:
+        name = getattr(func, '__name__', name)
+    return name
+
+
+def validator_options(validator):
+    """
+    Valid choices of a ValidateInStrings-like validator, or of an enum
+    validating its own values like CapStyle, else None
+    """
+    if isinstance(validator, type) and issubclass(validator, Enum):
+        return sorted(str(member.value) for member in validator)
+    valid = getattr(validator, 'valid', None)
+    if isinstance(valid, dict):
+        return sorted(set(map(str, valid.values())))
+    return None
+
+
+def describe_param(key, default):
+    """
+    :returns: paramdict
+        {'type': str, 'default': obj, ['list_type': str], ['options': [str]]}
+    """
+    if isinstance(default, Enum):
+        # e.g. CapStyle.butt, which yaml.safe_dump cannot represent
+        default = default.value
+    validator = get_validator(key)
+    name = validator_name(validator) if validator is not None else ''
+    options = validator_options(validator) if validator is not None else None
+    if options is not None:
+        if str(default) not in options:
+            options.append(str(default))
+        return {'type': 'string', 'default': str(default), 'options': options}
+    elif name in BOOL_VALIDATORS and isinstance(default, bool):
+        return {'type': 'bool', 'default': default}
+    elif name in FLOAT_VALIDATORS and isinstance(default, Number):
+        return {'type': 'float', 'default': default}
+    elif name in COLOR_VALIDATORS and isinstance(default, str):
+        return {'type': 'colorstring', 'default': default}
+    elif name in LIST_VALIDATORS and isinstance(default, (list, tuple)):
+        return {'type': 'list', 'list_type': LIST_VALIDATORS[name],
+                'default': list(default)}
+    return describe_by_value(key, default)
+
+
+def describe_by_value(key, value):
+    """Fallback guessing the type from the default value"""
+    if isinstance(value, bool):
+        return {'type': 'bool', 'default': value}
+    elif isinstance(value, Number):
+        return {'type': 'float', 'default': value}
+    elif isinstance(value, str):
+        return {'type': 'string', 'default': value, 'options': []}
+    elif isinstance(value, (list, tuple)) and all(
+            isinstance(x, (Number, str)) for x in value):
+        list_type = 'float' if (value and isinstance(value[0], Number)) \
+            else 'string'
+        return {'type': 'list', 'list_type': list_type, 'default': list(value)}
+    elif value is None:
+        return {'type': None, 'default': value}
+    return {'type': 'string', 'default': str(value), 'options': []}
 
 
 def get_rcparams_types(rcfile):
@@ -16,26 +137,14 @@ def get_rcparams_types(rcfile):
             {'type': str,
             'list_type': str,
             'default': str,
-            'options': str}
+            'options': str,
+            'help': str}
     """
-    rc = dict(mpl.rcParams)
-    helps = scrape_help_for_param(rcfile)
-    for k,v in rc.items():
-        if isinstance(v, bool):
-            rc[k] = {'type': 'bool', 'default': v}
-        elif isinstance(v, Number):
-            rc[k] = {'type': 'float', 'default': v}
-        elif isinstance(v, str):
-            rc[k] = {'type': 'colorstring' if 'color' in k else 'string',
-                     'default': v,
-                     'options': []}
-        elif isinstance(v, list):
-            list_type = 'float' if (v and isinstance(v[0], Number)) else 'string'
-            rc[k] = {'type': 'list', 'list_type': list_type, 'default': v}
-        elif v is None:
-            rc[k] = {'type': None, 'default': v}
-        else:
-            rc[k] = {'type': 'string', 'default': v}
+    defaults = dict(mpl.rcParamsDefault)
+    helps = scrape_help_for_param(rcfile, known_params=set(defaults))
+    rc = {}
+    for k, v in defaults.items():
+        rc[k] = describe_param(k, v)
         if k in helps:
             rc[k]['help'] = helps[k]
     return rc
@@ -51,31 +160,99 @@ def categorize_rc_params(rc):
     return by_category
 
 
-def scrape_help_for_param(rcfile):
+PARAM_LINE = re.compile(
+    r'^#(?P<param>[A-Za-z_][\w.\-]*)\s*:[^#]*(?:#\s*(?P<help>.*?))?\s*$'
+)
+CONTINUATION_LINE = re.compile(r'^\s+#\s*(?P<help>.*?)\s*$')
+
+
+def scrape_help_for_param(rcfile, known_params=None):
     """
     Reads a matplotlib rcfile and returns any documentation found
-    for them as a dictionary. 
+    for them as a dictionary.
 
-    It uses regex to extract all multiline comments following params
-    that starts on the same line as the param. 
-    
+    Single pass over the lines: a commented out param line starts a param,
+    its trailing comment and the indented comment lines directly following
+    it make up the help text.
+
+    :param known_params: set of param names, other params are skipped
     :returns: {str: str}
         {paramname: helptext}
-    
     """
-    discard_falsy = lambda seq: [x for x in seq if x]
-    with open(rcfile) as fh:
-        contents = fh.read()
-    wo_comments = re.sub(r'^#[# \n].*', '', contents, flags=re.MULTILINE)
-    wo_lead_hash = re.sub(r'^#', r'\n', wo_comments, flags=re.M)
-    raw_param_lines = discard_falsy(wo_lead_hash.split('\n\n'))
     helps = {}
-    for line in raw_param_lines:
-        parts = discard_falsy(line.split('#'))
-        param = parts[0].split(':')[0].strip()
-        if not param:
-            print('Empty param: %s' %line.replace('\n', '\\n'))
-            continue
-        helps[param] = ' '.join(map(str.strip, parts[1:]))
-    return helps
+    current = None
+    with open(rcfile) as fh:
+        for line in fh:
+            param_match = PARAM_LINE.match(line)
+            if param_match:
+                param = param_match.group('param')
+                if known_params is not None and param not in known_params:
+                    current = None
+                    continue
+                current = param
+                helps[param] = [param_match.group('help') or '']
+                continue
+            continuation = CONTINUATION_LINE.match(line)
+            if current is not None and continuation:
+                helps[current].append(continuation.group('help'))
+            else:
+                current = None
+    return dict(
+        (param, ' '.join(part for part in parts if part))
+        for param, parts in helps.items()
+    )
+
+
+def default_rcfile():
+    template = os.path.join(mpl.get_data_path(), 'matplotlibrc')
+    return template if os.path.exists(template) else FALLBACK_RCFILE
+
+
+def is_up_to_date(output):
+    try:
+        with open(output) as fh:
+            return fh.readline() == VERSION_STAMP.format(mpl.__version__)
+    except (IOError, OSError):
+        return False
+
+
+def generate_schema(output=DEFAULT_OUTPUT, rcfile=None, force=False):
+    """
+    Write the categorized schema to ``output`` unless it already is
+    generated for the installed matplotlib version.
+
+    :returns: bool, whether the schema was (re)generated
+    """
+    if not force and is_up_to_date(output):
+        return False
+    import yaml
+    rc = get_rcparams_types(rcfile or default_rcfile())
+    categorized = dict(
+        (category, dict(params))
+        for category, params in categorize_rc_params(rc).items()
+    )
+    tmp_output = output + '.tmp'
+    with open(tmp_output, 'w') as fh:
+        fh.write(VERSION_STAMP.format(mpl.__version__))
+        yaml.safe_dump(categorized, fh, default_flow_style=None)
+    os.replace(tmp_output, output)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rcfile', help='rc template to scrape help from, '
+                        "defaults to matplotlib's own template")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--force', action='store_true',
+                        help='regenerate even if up to date')
+    args = parser.parse_args(argv)
+    if generate_schema(args.output, args.rcfile, args.force):
+        print('Generated {} for matplotlib {}'.format(args.output,
+                                                      mpl.__version__))
+    else:
+        print('{} is up to date'.format(args.output))
+
 
+if __name__ == '__main__':
+    sys.exit(main())